@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Sequence
+
+from telegram import InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+from assets import AssetManifest
+from file_ids import FileIdCache, is_stale_file_id
+
+logger = logging.getLogger(__name__)
+
+ALBUM_SIZE = 4
+
+
+def resolve_album(base_dir: str, manifest: AssetManifest) -> List[str]:
+    resolved = []
+    for i in range(1, ALBUM_SIZE + 1):
+        # Некоторые файлы могут быть .jpeg — подменяем при отсутствии .jpg
+        for ext in (".jpg", ".jpeg"):
+            path = os.path.join(base_dir, f"{i}{ext}")
+            if path in manifest:
+                resolved.append(path)
+                break
+    return resolved
+
+
+class Album:
+    def __init__(self, paths: List[str], caption: str) -> None:
+        self.paths = paths
+        self.caption = caption
+        self.media: Optional[List[InputMediaPhoto]] = None
+        self.upload: Optional[asyncio.Future] = None
+
+    def set_file_ids(self, file_ids: Sequence[str]) -> None:
+        self.media = [
+            InputMediaPhoto(media=file_id, caption=self.caption if idx == 0 else None)
+            for idx, file_id in enumerate(file_ids)
+        ]
+
+
+class ArtistAlbums:
+    def __init__(
+        self,
+        images_dir: str,
+        artists: Dict[str, Dict[str, str]],
+        manifest: AssetManifest,
+        file_ids: FileIdCache,
+    ) -> None:
+        self._file_ids = file_ids
+        self.artists = artists
+        self._albums: Dict[str, Album] = {}
+        for slug, meta in artists.items():
+            paths = resolve_album(os.path.join(images_dir, meta["dir"]), manifest)
+            if not paths:
+                logger.error("Нет изображений для автора %s в %s", slug, meta["dir"])
+                continue
+            self._albums[slug] = Album(paths, f"Работы {meta['title_gen']}")
+
+    async def load(self) -> None:
+        for album in self._albums.values():
+            file_ids = [await self._file_ids.get(path) for path in album.paths]
+            if all(file_ids):
+                album.set_file_ids(file_ids)
+            else:
+                # Ещё не загруженный альбом — заранее в кэш содержимого, чтобы первое нажатие не ждало диск
+                try:
+                    for path in album.paths:
+                        await self._file_ids.read(path)
+                except OSError as exc:
+                    # Файл удалили после сканирования: альбом прочитается при нажатии, если файл вернут
+                    logger.warning("Не удалось заранее прочитать альбом: %s", exc)
+
+    async def send(self, message: Message, slug: str) -> bool:
+        album = self._albums.get(slug)
+        if album is None:
+            return False
+        if album.media is not None:
+            try:
+                await message.reply_media_group(media=album.media)
+                return True
+            except BadRequest as exc:
+                if not is_stale_file_id(exc):
+                    raise
+                logger.warning("file_id альбома %s больше не действительны: %s", slug, exc.message)
+                album.media = None
+                for path in album.paths:
+                    await self._file_ids.invalidate(path)
+        if album.upload is not None:
+            # Параллельные нажатия ждут одну загрузку и отправляют уже по file_id
+            await asyncio.shield(album.upload)
+            return await self.send(message, slug)
+        album.upload = asyncio.get_running_loop().create_future()
+        # Заявка на загрузку — по первому файлу: альбом целиком мог уже загрузить другой процесс
+        claimed = False
+        try:
+            claimed = await self._file_ids.acquire(album.paths[0]) is None
+            file_ids = [await self._file_ids.get(path) for path in album.paths]
+            if all(file_ids):
+                album.set_file_ids(file_ids)
+            else:
+                contents = [await self._file_ids.read(path) for path in album.paths]
+                sent = await message.reply_media_group(
+                    media=[
+                        InputMediaPhoto(
+                            media=content, filename=filename, caption=album.caption if idx == 0 else None
+                        )
+                        for idx, (content, filename) in enumerate(contents)
+                    ]
+                )
+                file_ids = [msg.photo[-1].file_id for msg in sent]
+                for path, file_id in zip(album.paths, file_ids):
+                    await self._file_ids.put(path, file_id)
+                album.set_file_ids(file_ids)
+                return True
+        finally:
+            if claimed:
+                await self._file_ids.release(album.paths[0])
+            album.upload.set_result(None)
+            album.upload = None
+        return await self.send(message, slug)
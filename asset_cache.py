@@ -0,0 +1,75 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+# Содержимое загружаемых фото в памяти, в пределах бюджета в байтах. Читается с диска в потоке, так что
+# цикл событий не ждёт диск даже при промахе. Хранится неизменяемый bytes: PTB кладёт его в InputFile,
+# а httpx — в тело запроса как есть, без копий; файловый объект или mmap PTB всё равно вычитал бы
+# в новый bytes на каждую отправку.
+
+ASSET_CACHE_BYTES = int(os.getenv("ASSET_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Файл больше четверти бюджета не кэшируется: один такой вытеснил бы много горячих
+_MAX_ENTRY_SHARE = 4
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+class AssetBytesCache:
+    def __init__(self, budget: int = ASSET_CACHE_BYTES) -> None:
+        self.budget = budget
+        # (путь, sha256 исходника) -> содержимое; путь оптимизированной копии уже содержит хэш,
+        # а у оригинала изменившееся содержимое даёт новый ключ
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        # Чтения в потоке: параллельные промахи по тому же файлу ждут одно
+        self._loading: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.resident = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def read(self, path: str, digest: str) -> bytes:
+        key = (path, digest)
+        content = self._entries.get(key)
+        if content is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return content
+        self.misses += 1
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = self._loading[key] = asyncio.ensure_future(asyncio.to_thread(_read, path))
+            loading.add_done_callback(lambda _: self._loading.pop(key, None))
+        content = await asyncio.shield(loading)
+        self._store(key, content)
+        return content
+
+    def _store(self, key: Tuple[str, str], content: bytes) -> None:
+        if key in self._entries or len(content) * _MAX_ENTRY_SHARE > self.budget:
+            return
+        self._entries[key] = content
+        self.resident += len(content)
+        while self.resident > self.budget:
+            _, evicted = self._entries.popitem(last=False)
+            self.resident -= len(evicted)
+            self.evictions += 1
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 3),
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "resident_bytes": self.resident,
+            "budget_bytes": self.budget,
+        }
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Снимок манифеста на диске: после перезапуска и в каждом процессе-обработчике хэшируются
+# только файлы, изменившиеся с момента снимка
+MANIFEST_PATH = os.getenv(
+    "ASSET_MANIFEST_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "manifest.json"),
+)
+
+
+@dataclass(frozen=True)
+class Asset:
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    width: Optional[int]
+    height: Optional[int]
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            pos += 1 if marker == 0xFF else 2
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+        # SOF0..SOF15, кроме DHT/JPG/DAC
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[pos + 5 : pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_size(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and data[12:16] == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _describe(path: str, st: os.stat_result) -> Asset:
+    with open(path, "rb") as fh:
+        data = fh.read()
+    size = image_size(data)
+    return Asset(
+        path=path,
+        size=st.st_size,
+        mtime_ns=st.st_mtime_ns,
+        sha256=hashlib.sha256(data).hexdigest(),
+        width=size[0] if size else None,
+        height=size[1] if size else None,
+    )
+
+
+class AssetManifest:
+    def __init__(self, root: str) -> None:
+        self.root = os.path.abspath(root)
+        self._assets: Dict[str, Asset] = {}
+
+    def scan(self) -> Tuple[int, int, int]:
+        # Перехэшируются только новые и изменившиеся файлы; словарь подменяется целиком,
+        # поэтому обработчики на event loop всегда видят согласованный снимок.
+        assets: Dict[str, Asset] = {}
+        added = changed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                    known = self._assets.get(path)
+                    if known and known.size == st.st_size and known.mtime_ns == st.st_mtime_ns:
+                        assets[path] = known
+                        continue
+                    assets[path] = _describe(path, st)
+                except OSError as exc:
+                    logger.warning("Не удалось прочитать %s: %s", path, exc)
+                    continue
+                if known:
+                    changed += 1
+                else:
+                    added += 1
+        removed = len(self._assets.keys() - assets.keys())
+        self._assets = assets
+        return added, changed, removed
+
+    def load(self, path: str) -> int:
+        # Загруженные записи проверяются следующим scan() по размеру и mtime
+        try:
+            with open(path, encoding="utf-8") as fh:
+                assets = [Asset(**entry) for entry in json.load(fh)]
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, TypeError) as exc:
+            logger.warning("Снимок манифеста %s не прочитан: %s", path, exc)
+            return 0
+        self._assets = {asset.path: asset for asset in assets if asset.path.startswith(self.root + os.sep)}
+        return len(self._assets)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Снимок пишут несколько процессов: у каждого свой временный файл, замена атомарна
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump([asdict(asset) for asset in self._assets.values()], fh)
+        os.replace(tmp, path)
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self._assets.get(os.path.abspath(path))
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._assets
+
+    def assets(self) -> List[Asset]:
+        return list(self._assets.values())
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def total_size(self) -> int:
+        return sum(asset.size for asset in self._assets.values())
+
+    def missing(self, paths: Iterable[str]) -> List[str]:
+        return sorted({path for path in paths if path not in self})
@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set
+
+from telegram import Bot, Update
+
+from processing import update_chat_id
+
+# Очередь обновлений, накопившаяся, пока бот не работал. Перед запуском приёма она выбирается
+# целиком через getUpdates и разбирается: старые сообщения и inline-запросы выбрасываются,
+# из нажатий одного чата остаётся последнее, остальное подаётся в обработку с ограниченной
+# скоростью вперемешку со свежими обновлениями. Если из чата уже пришло свежее обновление,
+# его отложенные обновления больше не нужны.
+
+logger = logging.getLogger(__name__)
+
+_PAGE = 100
+
+
+def _age(update: Update, now: datetime.datetime) -> Optional[float]:
+    message = update.effective_message
+    if update.callback_query is None and message is not None and message.date is not None:
+        return (now - message.date).total_seconds()
+    # У нажатий даты нет: дата сообщения с кнопками говорит только о том, когда показали меню
+    return None
+
+
+class Backlog:
+    def __init__(self, max_age: float = 300, rate: float = 20) -> None:
+        self.max_age = max_age
+        self.rate = rate
+        self._pending: Deque[Update] = deque()
+        self._last_id: Optional[int] = None
+        # Чаты, из которых после запуска уже пришло свежее обновление
+        self._fresh: Set[int] = set()
+        self.received = 0
+        self.expired = 0
+        self.merged = 0
+        self.superseded = 0
+        self.fed = 0
+
+    async def drain(self, bot: Bot, allowed_updates: Optional[Sequence[str]] = None) -> int:
+        # Webhook мешает getUpdates; run_webhook поставит его заново, start_polling и так снимает
+        await bot.delete_webhook(drop_pending_updates=False)
+        offset = 0
+        updates: List[Update] = []
+        while True:
+            page = await bot.get_updates(
+                offset=offset, limit=_PAGE, timeout=0, allowed_updates=allowed_updates
+            )
+            if not page:
+                break
+            updates.extend(page)
+            offset = page[-1].update_id + 1
+            if len(page) < _PAGE:
+                break
+        if updates:
+            # Подтверждаем выбранное: вызов с offset = последний + 1 снимает всё до него с сервера,
+            # а то, что пришло за это время, достанется обычному приёму
+            await bot.get_updates(offset=offset, limit=1, timeout=0, allowed_updates=allowed_updates)
+            self._last_id = updates[-1].update_id
+        self.received = len(updates)
+        self._pending = deque(self.plan(updates))
+        return len(self._pending)
+
+    def plan(self, updates: List[Update], now: Optional[datetime.datetime] = None) -> List[Update]:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        latest_press: Dict[int, int] = {}
+        for update in updates:
+            chat_id = update_chat_id(update)
+            if update.callback_query is not None and chat_id is not None:
+                latest_press[chat_id] = update.update_id
+        kept = []
+        for update in updates:
+            if update.inline_query is not None:
+                # Ответ на inline-запрос Telegram ждёт секунды — из очереди он уже бесполезен
+                self.expired += 1
+                continue
+            age = _age(update, now)
+            if age is not None and age > self.max_age:
+                self.expired += 1
+                continue
+            chat_id = update_chat_id(update)
+            if update.callback_query is not None and latest_press.get(chat_id) != update.update_id:
+                self.merged += 1
+                continue
+            kept.append(update)
+        return kept
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def seen(self, update: Update) -> None:
+        if self._pending and self._last_id is not None and update.update_id > self._last_id:
+            chat_id = update_chat_id(update)
+            if chat_id is not None:
+                self._fresh.add(chat_id)
+
+    async def feed(self, queue: "asyncio.Queue[object]", busy: Optional[Callable[[], bool]] = None) -> None:
+        # busy() — обработка занята целиком: очередь ждёт, свежие обновления идут первыми
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate if self.rate > 0 else 0
+        next_at = loop.time()
+        while self._pending:
+            while busy is not None and busy():
+                await asyncio.sleep(interval or 0.01)
+                next_at = max(next_at, loop.time())
+            # Ровный темп без накопления погрешности sleep
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_at += interval
+            update = self._pending.popleft()
+            if update_chat_id(update) in self._fresh:
+                self.superseded += 1
+                continue
+            await queue.put(update)
+            self.fed += 1
+        self._fresh.clear()
+        logger.info(
+            "Очередь после простоя разобрана: обработано %d, устарело после свежих обновлений %d",
+            self.fed,
+            self.superseded,
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "received": self.received,
+            "expired": self.expired,
+            "merged": self.merged,
+            "superseded": self.superseded,
+            "fed": self.fed,
+            "pending": self.pending,
+        }
@@ -0,0 +1,112 @@
+import asyncio
+import builtins
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from asset_cache import AssetBytesCache
+from assets import AssetManifest
+from file_ids import FileIdCache
+
+# Сколько event loop простаивает из-за диска, пока пользователи жмут кнопки с фото, на медленном хранилище
+# (каждое открытие файла из images/ ждёт DISK_DELAY секунд): чтение файла прямо в обработчике, как было до
+# кэша, против чтения в потоке без кэша (ASSET_CACHE_BYTES=0) и с кэшем. Каждое нажатие — новая загрузка,
+# то есть худший случай, когда file_id переиспользовать нельзя.
+#   python bench_asset_cache.py
+
+IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+DISK_DELAY = float(os.getenv("DISK_DELAY", "0.02"))
+USERS = 40
+TAPS = 10
+# Отправка фото в Telegram и пауза между нажатиями
+SEND = 0.03
+PAUSE = 0.05
+# Задержка тика больше этой считается блокировкой цикла
+BLOCKED = 0.005
+
+
+def _ms(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50": round(samples[len(samples) // 2] * 1000, 2),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1000, 2),
+        "max": round(samples[-1] * 1000, 2),
+    }
+
+
+async def _run(manifest: AssetManifest, budget: Optional[int]) -> Dict[str, Any]:
+    # budget=None — чтение прямо в обработчике, без потока и без кэша
+    files = FileIdCache(
+        os.path.join(tempfile.mkdtemp(prefix="bench-assets-"), "file_ids.sqlite3"),
+        manifest=manifest,
+        contents=AssetBytesCache(budget or 0),
+    )
+    paths = sorted(asset.path for asset in manifest.assets())
+    rnd = random.Random(1)
+    opens = 0
+    lags: List[float] = []
+    running = True
+    original_open = builtins.open
+
+    def slow_open(path: Any, *args: Any, **kwargs: Any) -> Any:
+        nonlocal opens
+        if isinstance(path, str) and path.startswith(IMAGES):
+            opens += 1
+            time.sleep(DISK_DELAY)
+        return original_open(path, *args, **kwargs)
+
+    async def ticker() -> None:
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    async def user() -> None:
+        for _ in range(TAPS):
+            path = rnd.choice(paths)
+            if budget is None:
+                with open(files.upload_path(path), "rb") as fh:
+                    fh.read()
+            else:
+                await files.read(path)
+            await asyncio.sleep(SEND + PAUSE)
+
+    builtins.open = slow_open
+    try:
+        tick = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(USERS)))
+        elapsed = time.perf_counter() - started
+        running = False
+        await tick
+    finally:
+        builtins.open = original_open
+        files.close()
+    return {
+        "seconds": round(elapsed, 2),
+        "disk_opens": opens,
+        "loop_blocked_s": round(sum(lag for lag in lags if lag > BLOCKED), 2),
+        "loop_lag_ms": _ms(lags),
+        "contents": files.contents.stats() if budget is not None else None,
+    }
+
+
+def main() -> None:
+    manifest = AssetManifest(IMAGES)
+    manifest.scan()
+    report: Dict[str, Any] = {
+        "disk_delay_ms": DISK_DELAY * 1000,
+        "uploads": USERS * TAPS,
+        "images": len(manifest),
+        "images_bytes": manifest.total_size(),
+    }
+    for name, budget in (("on_loop", None), ("thread_no_cache", 0), ("cache", AssetBytesCache().budget)):
+        report[name] = asyncio.run(_run(manifest, budget))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
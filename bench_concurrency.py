@@ -0,0 +1,33 @@
+import json
+from typing import Any, Dict
+
+from loadtest import run_subprocess
+
+# p99 задержки нажатия при 500 одновременных пользователях: обновления по одному (как было до
+# PerChatUpdateProcessor) против MAX_CONCURRENT_UPDATES=64. Каждый прогон — отдельный процесс loadtest.py.
+#   python bench_concurrency.py
+
+USERS = 500
+LATENCY_MS = 20
+SESSION = ["guide", "guide:avant", "guide:avant:shabolovka_museum"]
+
+
+def main() -> None:
+    report: Dict[str, Any] = {"users": USERS, "latency_ms": LATENCY_MS, "session": SESSION}
+    for name, concurrency in (("sequential", 1), ("concurrent", 64)):
+        result = run_subprocess(
+            ["--users", str(USERS), "--latency-ms", str(LATENCY_MS), "--concurrency", str(concurrency)],
+            trace=[SESSION],
+        )
+        report[name] = {
+            "max_concurrent_updates": concurrency,
+            "seconds": result["seconds"],
+            "throughput_taps_per_s": result["throughput_taps_per_s"],
+            "end_to_end_p99_ms": result["end_to_end_p99_ms"],
+            "handler_latency_ms": result["handler_latency_ms"],
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from telegram import Bot
+
+from assets import AssetManifest
+from derivatives import Derivatives
+from fake_bot_api import FakeBotAPI
+
+# Сколько занимает загрузка фото в Telegram: оригиналы из images/ против оптимизированных копий
+# (Derivatives, до 1280 px) на канале UPLOAD_BANDWIDTH байт в секунду. Каждое изображение загружается
+# по одному разу и по очереди, так что время — это время самой загрузки. Копии собираются заново
+# во временном каталоге, их сборка тоже замеряется.
+#   python bench_derivatives.py
+
+IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+LATENCY = 0.03
+# Примерно 8 Мбит/с от сервера бота до Telegram
+UPLOAD_BANDWIDTH = int(os.getenv("UPLOAD_BANDWIDTH", "1000000"))
+
+
+def _ms(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50": round(samples[len(samples) // 2] * 1000, 1),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1000, 1),
+        "max": round(samples[-1] * 1000, 1),
+    }
+
+
+async def _upload(bot: Bot, paths: List[str]) -> Dict[str, Any]:
+    times: List[float] = []
+    uploaded = 0
+    for chat_id, path in enumerate(paths, 1):
+        with open(path, "rb") as fh:
+            content = fh.read()
+        uploaded += len(content)
+        started = time.perf_counter()
+        await bot.send_photo(chat_id, content, filename=os.path.basename(path))
+        times.append(time.perf_counter() - started)
+    return {"bytes": uploaded, "seconds": round(sum(times), 2), "per_upload_ms": _ms(times)}
+
+
+async def run() -> Dict[str, Any]:
+    manifest = AssetManifest(IMAGES)
+    manifest.scan()
+    derivatives = Derivatives(manifest, tempfile.mkdtemp(prefix="bench-derivatives-"))
+    started = time.perf_counter()
+    build = derivatives.build()
+    build_seconds = time.perf_counter() - started
+    originals = sorted(asset.path for asset in manifest.assets())
+
+    api = FakeBotAPI(latency=LATENCY, upload_bandwidth=UPLOAD_BANDWIDTH)
+    await api.start()
+    bot = Bot("1:x", base_url=f"{api.url}/bot", base_file_url=f"{api.url}/file/bot")
+    await bot.initialize()
+    try:
+        report: Dict[str, Any] = {
+            "images": len(originals),
+            "upload_bandwidth": UPLOAD_BANDWIDTH,
+            "build": {
+                "seconds": round(build_seconds, 2),
+                "built": build.built,
+                "failed": build.failed,
+                "saved_bytes": build.saved_bytes,
+            },
+            "originals": await _upload(bot, originals),
+            "derivatives": await _upload(bot, [derivatives.resolve(path) for path in originals]),
+        }
+    finally:
+        await bot.shutdown()
+        await api.stop()
+    report["upload_time_saved"] = round(
+        1 - report["derivatives"]["seconds"] / report["originals"]["seconds"], 3
+    )
+    return report
+
+
+def main() -> None:
+    print(json.dumps(asyncio.run(run()), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import asyncio
+import contextlib
+import json
+import sys
+import time
+from typing import Any, Callable, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+from metrics import BotMetrics, InstrumentedRequest
+
+# Во что обходятся метрики на одно обновление: таймер маршрута (METRICS.track) и обёртка вызова Bot API
+# (InstrumentedRequest) против того же кода без них. Скрипт завершается с ошибкой, если накладные
+# расходы на обновление больше BUDGET_US микросекунд.
+#   python bench_metrics.py
+
+CALLS = 100_000
+# Лучший из REPEAT замеров, как в timeit: остальные искажены соседними процессами
+REPEAT = 15
+# Обновление — один маршрут и два вызова Bot API (ответ на нажатие и правка экрана)
+API_CALLS_PER_UPDATE = 2
+BUDGET_US = 5.0
+
+
+class _NoopRequest(BaseRequest):
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Any = None, **kwargs: Any) -> Tuple[int, bytes]:
+        return 200, b'{"ok":true,"result":true}'
+
+
+def _time_calls(fn: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        fn()
+    return time.perf_counter() - started
+
+
+async def _time_requests(request: BaseRequest) -> float:
+    url = "http://127.0.0.1/bot123:x/answerCallbackQuery"
+    data = RequestData()
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        await request.do_request(url, "POST", request_data=data)
+    return time.perf_counter() - started
+
+
+def _overhead_us(run: Callable[[Any], float], bare: Any, instrumented: Any) -> float:
+    # Замеры чередуются, чтобы помехи доставались обоим поровну
+    bare_s = instrumented_s = float("inf")
+    for _ in range(REPEAT):
+        bare_s = min(bare_s, run(bare))
+        instrumented_s = min(instrumented_s, run(instrumented))
+    return (instrumented_s - bare_s) / CALLS * 1e6
+
+
+def main() -> None:
+    metrics = BotMetrics()
+    null = contextlib.nullcontext()
+
+    def bare() -> None:
+        with null:
+            pass
+
+    def tracked() -> None:
+        with metrics.track("guide:<section>:<slug>"):
+            pass
+
+    route_us = _overhead_us(_time_calls, bare, tracked)
+    inner = _NoopRequest()
+    api_us = _overhead_us(
+        lambda request: asyncio.run(_time_requests(request)), inner, InstrumentedRequest(inner, metrics)
+    )
+    per_update = route_us + api_us * API_CALLS_PER_UPDATE
+    report = {
+        "route_timer_us": round(route_us, 3),
+        "api_call_us": round(api_us, 3),
+        "per_update_us": round(per_update, 3),
+        "budget_us": BUDGET_US,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if per_update > BUDGET_US:
+        sys.exit("Метрики стоят обновлению больше бюджета")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import json
+import random
+import time
+from typing import Dict, List
+
+from geo import GridIndex, haversine_m
+
+# Поиск ближайших мест среди 50 000 случайных точек в пределах Москвы: GridIndex против перебора
+# всех точек по haversine. Заодно проверяется, насколько расходятся ответы: сетка сравнивает расстояния
+# в плоской проекции, так что почти равноудалённые точки могут поменяться местами.
+#   python bench_nearby.py
+
+POINTS = 50_000
+QUERIES = 100
+K = 5
+# Примерно МКАД
+LAT = (55.57, 55.91)
+LON = (37.37, 37.85)
+
+
+def _ms(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50": round(samples[len(samples) // 2] * 1000, 3),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1000, 3),
+    }
+
+
+def main() -> None:
+    rnd = random.Random(1)
+    points = [(i, (rnd.uniform(*LAT), rnd.uniform(*LON))) for i in range(POINTS)]
+    started = time.perf_counter()
+    index = GridIndex(points)
+    build = time.perf_counter() - started
+    grid, brute = [], []
+    error_m = 0.0
+    for _ in range(QUERIES):
+        location = (rnd.uniform(*LAT), rnd.uniform(*LON))
+        started = time.perf_counter()
+        found = index.nearest(location, K)
+        grid.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        expected = sorted((haversine_m(location, point), key) for key, point in points)[:K]
+        brute.append(time.perf_counter() - started)
+        error_m = max(error_m, *(abs(got[0] - want[0]) for got, want in zip(sorted(found), expected)))
+    report = {
+        "points": POINTS,
+        "k": K,
+        "index_build_ms": round(build * 1000, 1),
+        "grid": _ms(grid),
+        "brute_force": _ms(brute),
+        "max_distance_error_m": round(error_m, 2),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
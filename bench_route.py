@@ -0,0 +1,50 @@
+import json
+import random
+import sys
+import time
+
+from itinerary import RoutePlanner
+
+# Построение пешего маршрута по 30 местам: каждый прогон — новый набор из POOL мест, так что кэш
+# решений не помогает. Скрипт завершается с ошибкой, если p99 дольше BUDGET_MS.
+#   python bench_route.py
+
+POOL = 300
+PLACES = 30
+RUNS = 100
+BUDGET_MS = 50.0
+LAT = (55.70, 55.80)
+LON = (37.52, 37.72)
+
+
+def main() -> None:
+    rnd = random.Random(1)
+    points = [(f"place:{i}", (rnd.uniform(*LAT), rnd.uniform(*LON))) for i in range(POOL)]
+    started = time.perf_counter()
+    planner = RoutePlanner(points)
+    build = time.perf_counter() - started
+    keys = [key for key, _ in points]
+    samples = []
+    for _ in range(RUNS):
+        picked = rnd.sample(keys, PLACES)
+        started = time.perf_counter()
+        order, _ = planner.plan(picked)
+        samples.append(time.perf_counter() - started)
+        assert sorted(order) == sorted(picked)
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99)] * 1000
+    report = {
+        "places": PLACES,
+        "matrix_build_ms": round(build * 1000, 1),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+        "p99_ms": round(p99, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+        "budget_ms": BUDGET_MS,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if p99 > BUDGET_MS:
+        sys.exit("Маршрут по 30 местам строится дольше бюджета")
+
+
+if __name__ == "__main__":
+    main()
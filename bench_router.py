@@ -0,0 +1,69 @@
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import catalog
+from bot import CATALOG_PATH, compile_content
+
+# Стоимость выбора обработчика нажатия: таблица Router против прежней цепочки сравнений из on_callback
+# (data == ... и data.startswith(...) по порядку веток). Цепочка собирается настоящим кодом с if, как была,
+# по разделам текущего каталога; прогоняются все callback_data с кнопок и неизвестная строка.
+#   python bench_router.py
+
+ROUNDS = 20_000
+
+
+def _old_chain(sections: List[Dict[str, Any]]) -> Callable[[str], int]:
+    checks = ["data == 'back'", "data == 'info:moscow'", "data == 'artists'", "data == 'guide'"]
+    for section in sections:
+        checks.append(f"data == 'guide:{section['slug']}'")
+        checks.append(f"data.startswith('guide:{section['slug']}:')")
+    checks += ["data.startswith('artist:')", "data == 'authors'"]
+    source = "def dispatch(data):\n"
+    for branch, check in enumerate(checks):
+        source += f"    if {check}:\n        return {branch}\n"
+    source += "    return -1\n"
+    namespace: Dict[str, Any] = {}
+    exec(source, namespace)
+    return namespace["dispatch"]
+
+
+def _per_call_ns(fn: Callable[[str], Any], data: List[str]) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for item in data:
+            fn(item)
+    return (time.perf_counter() - started) / (ROUNDS * len(data)) * 1e9
+
+
+def main() -> None:
+    raw = catalog.load(CATALOG_PATH)
+    content = compile_content(raw)
+    data = sorted(
+        {
+            button.callback_data
+            for screen in content.screens.screens()
+            if screen.markup is not None
+            for row in screen.markup.inline_keyboard
+            for button in row
+            if isinstance(button.callback_data, str)
+        }
+        | {f"save:{key}" for key in content.places}
+        | {"authors", "no-such-button"}
+    )
+    old = _old_chain(raw["guide"])
+    new = content.router.resolve
+    report = {
+        "callbacks": len(data),
+        "mean_ns": {"old": round(_per_call_ns(old, data), 1), "router": round(_per_call_ns(new, data), 1)},
+        # Худшие для цепочки строки: последняя ветка и промах
+        "worst_ns": {
+            item: {"old": round(_per_call_ns(old, [item]), 1), "router": round(_per_call_ns(new, [item]), 1)}
+            for item in ("authors", "no-such-button")
+        },
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
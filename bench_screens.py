@@ -0,0 +1,91 @@
+import json
+import tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+import catalog
+from bot import (
+    CATALOG_PATH,
+    Screen,
+    _artist_keyboard,
+    _guide_keyboard,
+    _image_path,
+    _main_screen,
+    _place_screen,
+    _place_text,
+    _section_keyboard,
+    build_main_keyboard,
+    compile_content,
+)
+from markup import render
+
+# Сколько памяти выделяет подготовка экрана на одно нажатие (tracemalloc): прежняя сборка клавиатур
+# и текстов в обработчике против готовых экранов из реестра. Результаты держатся до замера,
+# так что считается всё, что нажатие создаёт.
+#   python bench_screens.py
+
+CALLS = 200
+
+
+def _allocated(build: Callable[[], Any]) -> Tuple[float, float]:
+    # (байт, блоков) на вызов
+    results = [None] * CALLS
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(CALLS):
+        results[i] = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in stats)
+    count = sum(stat.count_diff for stat in stats)
+    return size / CALLS, count / CALLS
+
+
+def main() -> None:
+    raw = catalog.load(CATALOG_PATH)
+    content = compile_content(raw)
+    texts = {key: render(text) for key, text in raw["texts"].items() if key != "help"}
+    artists = content.artists
+    section = raw["guide"][0]
+    place = section["places"][0]
+    key = f"guide:{section['slug']}:{place['slug']}"
+    user_data: Dict[str, Any] = {"saved": [key], "visited": [], "last_screen": "guide"}
+    cases: Dict[str, Tuple[Callable[[], Any], Callable[[], Any]]] = {
+        "back": (
+            lambda: Screen(texts["start"], build_main_keyboard()),
+            lambda: _main_screen(content, user_data),
+        ),
+        "artists": (
+            lambda: Screen(texts["artists"], _artist_keyboard(artists)),
+            lambda: content.screens["artists"],
+        ),
+        "guide": (
+            lambda: Screen(texts["guide"], _guide_keyboard(raw["guide"])),
+            lambda: content.screens["guide"],
+        ),
+        f"guide:{section['slug']}": (
+            lambda: Screen(
+                render(section["caption"]), _section_keyboard(section), photo=_image_path(section["cover"])
+            ),
+            lambda: content.screens[f"guide:{section['slug']}"],
+        ),
+        key: (
+            lambda: Screen(
+                _place_text(place), _section_keyboard(section), photo=_image_path(place.get("image"))
+            ),
+            lambda: _place_screen(content, key, user_data),
+        ),
+    }
+    report = {}
+    for data, (old, new) in cases.items():
+        old_bytes, old_blocks = _allocated(old)
+        new_bytes, new_blocks = _allocated(new)
+        report[data] = {
+            "old": {"bytes": round(old_bytes), "blocks": round(old_blocks, 1)},
+            "registry": {"bytes": round(new_bytes), "blocks": round(new_blocks, 1)},
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import json
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from search import SearchIndex, terms
+
+# Задержка inline-поиска на синтетических каталогах в 1 000, 5 000 и 20 000 мест: SearchIndex против
+# прохода по всем местам с проверкой подстрок (как искал бы обработчик без индекса). Запросы — целые слова,
+# префиксы «на каждое нажатие клавиши» и опечатки; кэш запросов индекса сбрасывается перед каждым запросом,
+# так что повторы среди запросов не попадают в кэш. Скрипт завершается с ошибкой, если p99 поиска по индексу
+# на каком-то каталоге дольше BUDGET_MS.
+#   python bench_search.py
+
+SIZES = (1_000, 5_000, 20_000)
+QUERIES = 300
+BUDGET_MS = 1.0
+
+_WORDS = (
+    "музей галерея центр дом усадьба выставка искусство современное русское авангард театр парк палаты "
+    "фабрика завод мастерская библиотека собрание коллекция фонд студия площадь улица набережная бульвар "
+    "переулок тверская пречистенка остоженка арбат пресня таганка лефортово сокольники замоскворечье"
+).split()
+
+
+def _places(n: int, rnd: random.Random) -> Dict[int, Tuple[str, str, str]]:
+    return {
+        i: (
+            " ".join(rnd.sample(_WORDS, 3)).capitalize(),
+            f"{rnd.choice(_WORDS)} {rnd.randint(1, 99)}",
+            " ".join(rnd.choices(_WORDS, k=25)),
+        )
+        for i in range(n)
+    }
+
+
+def _queries(rnd: random.Random) -> List[str]:
+    queries = []
+    for _ in range(QUERIES):
+        first, second = rnd.sample(_WORDS, 2)
+        kind = rnd.randrange(3)
+        if kind == 0:
+            queries.append(f"{first} {second}")
+        elif kind == 1:
+            queries.append(f"{first} {second[: max(2, len(second) // 2)]}")
+        else:
+            i = rnd.randrange(1, len(first) - 1)
+            queries.append(first[:i] + first[i + 1 :])
+    return queries
+
+
+def _scan(places: Dict[int, Tuple[str, str, str]], query: str, limit: int = 20) -> List[int]:
+    words = terms(query)
+    found = []
+    for key, fields in places.items():
+        text = " ".join(fields).lower().replace("ё", "е")
+        if all(word in text for word in words):
+            found.append(key)
+            if len(found) == limit:
+                break
+    return found
+
+
+def _ms(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50": round(samples[len(samples) // 2] * 1000, 3),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1000, 3),
+    }
+
+
+def main() -> None:
+    rnd = random.Random(1)
+    queries = _queries(rnd)
+    report = {}
+    for size in SIZES:
+        places = _places(size, rnd)
+        started = time.perf_counter()
+        index = SearchIndex()
+        for key, (title, address, desc) in places.items():
+            index.add(key, [(title, 3.0), (address, 2.0), (desc, 1.0)])
+        index.freeze()
+        build = time.perf_counter() - started
+        indexed, scanned = [], []
+        for query in queries:
+            index.search.cache_clear()
+            started = time.perf_counter()
+            index.search(query)
+            indexed.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            _scan(places, query)
+            scanned.append(time.perf_counter() - started)
+        report[size] = {"index_build_ms": round(build * 1000, 1), "index": _ms(indexed), "scan": _ms(scanned)}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if any(result["index"]["p99"] > BUDGET_MS for result in report.values()):
+        sys.exit("Поиск по индексу дольше бюджета")
+
+
+if __name__ == "__main__":
+    main()
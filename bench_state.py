@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from state import SQLiteUserState
+
+# Непрерывный поток изменений состояния пользователей: UPDATES_PER_S нажатий в секунду от USERS пользователей
+# в течение SECONDS. Раз в секунду изменившиеся записи отдаются SQLiteUserState, как это делает PTB.
+# Печатаются время записи пачки (в рабочем потоке) и задержки event loop, пока идут записи.
+#   python bench_state.py
+
+USERS = 20_000
+UPDATES_PER_S = 2_000
+SECONDS = 10
+INTERVAL = 1.0
+PLACES = [f"guide:section:{i}" for i in range(40)]
+
+
+def _ms(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50": round(samples[len(samples) // 2] * 1000, 2),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1000, 2),
+        "max": round(samples[-1] * 1000, 2),
+    }
+
+
+def _copy(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: list(value) if isinstance(value, list) else value for key, value in data.items()}
+
+
+async def run() -> Dict[str, Any]:
+    rnd = random.Random(1)
+    store = SQLiteUserState(os.path.join(tempfile.mkdtemp(prefix="bench-state-"), "state.sqlite3"), INTERVAL)
+    await store.get_user_data()
+    users: Dict[int, Dict[str, Any]] = {}
+    lags: List[float] = []
+    flushes: List[float] = []
+    running = True
+
+    async def ticker() -> None:
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    for _ in range(SECONDS):
+        second = time.perf_counter()
+        dirty = set()
+        for _ in range(UPDATES_PER_S):
+            user_id = rnd.randrange(USERS)
+            data = users.setdefault(user_id, {"saved": [], "visited": []})
+            place = rnd.choice(PLACES)
+            data["saved" if rnd.random() < 0.5 else "visited"].append(place)
+            data["last_screen"] = place
+            dirty.add(user_id)
+        # PTB отдаёт копии изменившихся записей одной пачкой через gather
+        await asyncio.gather(*(store.update_user_data(user_id, _copy(users[user_id])) for user_id in dirty))
+        await asyncio.sleep(max(0.0, INTERVAL - (time.perf_counter() - second)))
+        flushes.append(store.last_flush_seconds)
+    running = False
+    await tick
+    await store.flush()
+    return {
+        "users": USERS,
+        "updates_per_s": UPDATES_PER_S,
+        "seconds": SECONDS,
+        "flush_ms": _ms(flushes),
+        "loop_lag_ms": _ms(lags),
+        "state": store.stats(),
+    }
+
+
+def main() -> None:
+    print(json.dumps(asyncio.run(run()), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
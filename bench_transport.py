@@ -0,0 +1,106 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List
+
+from telegram import Bot
+from telegram.request import BaseRequest, HTTPXRequest
+
+from fake_bot_api import FakeBotAPI
+from metrics import BotMetrics
+from transport import Transport
+
+# Задержка лёгких вызовов (answerCallbackQuery) во время пачки загрузок фото: один общий пул на 256 соединений,
+# как было до разделения, против Transport с отдельными пулами для лёгких вызовов и загрузок. Поддельный
+# Bot API работает в отдельном процессе, чтобы его разбор загрузок не делил event loop с замеряемым клиентом.
+#   python bench_transport.py
+
+LATENCY = 0.03
+# Байт в секунду на одну загрузку
+UPLOAD_BANDWIDTH = 1_000_000
+PHOTO_BYTES = 300_000
+BURSTS = (50, 500)
+# Параллельных циклов лёгких вызовов и частота каждого
+SMALL_LOOPS = 4
+SMALL_RATE = 50
+
+
+def _serve(ports: Any) -> None:
+    async def serve() -> None:
+        api = FakeBotAPI(latency=LATENCY, upload_bandwidth=UPLOAD_BANDWIDTH)
+        await api.start()
+        ports.put(int(api.url.rsplit(":", 1)[1]))
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def _ms(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50": round(samples[len(samples) // 2] * 1000, 1),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1000, 1),
+        "max": round(samples[-1] * 1000, 1),
+    }
+
+
+def _request(kind: str) -> BaseRequest:
+    if kind == "shared":
+        return HTTPXRequest(connection_pool_size=256, media_write_timeout=60, read_timeout=120, pool_timeout=120)
+    return Transport.from_env(BotMetrics()).messages
+
+
+async def _burst(kind: str, port: int, uploads: int, photo: bytes) -> Dict[str, Any]:
+    base = f"http://127.0.0.1:{port}"
+    bot = Bot("1:x", base_url=f"{base}/bot", base_file_url=f"{base}/file/bot", request=_request(kind))
+    await bot.initialize()
+    # Соединения открываются заранее, чтобы в замер не попало их установление
+    await bot.answer_callback_query("warmup")
+    small: List[float] = []
+    done = asyncio.Event()
+
+    async def small_calls(loop_id: int) -> None:
+        i = 0
+        while not done.is_set():
+            i += 1
+            started = time.perf_counter()
+            await bot.answer_callback_query(f"{loop_id}:{i}")
+            small.append(time.perf_counter() - started)
+            await asyncio.sleep(1 / SMALL_RATE)
+
+    loops = [asyncio.create_task(small_calls(i)) for i in range(SMALL_LOOPS)]
+    await asyncio.sleep(0.5)
+    idle, small = small, []
+    started = time.perf_counter()
+    await asyncio.gather(*(bot.send_photo(1000 + i, photo) for i in range(uploads)))
+    burst = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*loops)
+    await bot.shutdown()
+    return {
+        "burst_seconds": round(burst, 2),
+        "small_calls": len(small),
+        "small_idle_ms": _ms(idle),
+        "small_during_burst_ms": _ms(small),
+    }
+
+
+def main() -> None:
+    ports: Any = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(ports,), daemon=True)
+    server.start()
+    port = ports.get(timeout=10)
+    photo = os.urandom(PHOTO_BYTES)
+    report: Dict[str, Any] = {"latency_ms": LATENCY * 1000, "photo_bytes": PHOTO_BYTES}
+    try:
+        for uploads in BURSTS:
+            report[uploads] = {kind: asyncio.run(_burst(kind, port, uploads, photo)) for kind in ("shared", "split")}
+    finally:
+        server.terminate()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,243 +1,171 @@
+import asyncio
+import functools
 import logging
 import os
-from typing import Dict, List
-
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, InputMediaPhoto
-from telegram.constants import ParseMode
+import re
+import secrets
+import sys
+from dataclasses import dataclass, replace
+from typing import Any, Container, Dict, Hashable, List, Optional, Tuple
+
+from telegram import (
+    Bot,
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResult,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InputTextMessageContent,
+    Message,
+    Update,
+)
+from telegram.constants import ChatType, MessageLimit, ParseMode
+from telegram.error import BadRequest
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
+    InlineQueryHandler,
+    MessageHandler,
+    TypeHandler,
+    filters,
 )
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+from albums import ArtistAlbums
+from assets import MANIFEST_PATH, AssetManifest
+from backlog import Backlog
+from broadcast import Audience, Broadcaster, Progress
+from catalog import CatalogWatcher
+from dedup import CallbackDeduplicator
+from derivatives import BuildReport, Derivatives
+from file_ids import FileIdCache
+from geo import GridIndex, LatLon, walk_minutes, walking
+from itinerary import RoutePlanner
+from logs import bind_update, setup_logging
+from markup import MarkupError, bold, check, escape, render
+from metrics import BotMetrics, Collected, CollectedByLabel, InstrumentedRequest
+from processing import PerChatUpdateProcessor, update_chat_id
+from rate_limit import SendScheduler
+from routing import Router
+from screens import Screen, ScreenRegistry
+from search import SearchIndex
+from state import STATE_DB_PATH, SQLiteUserState, UserState
+from transport import Transport
+from workers import WorkerPool, serve_front, serve_worker
+
+LOG_HANDLER = setup_logging(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    fmt=os.getenv("LOG_FORMAT", "text"),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    sampling=os.getenv("LOG_SAMPLING", "httpx=0.01"),
 )
 logger = logging.getLogger(__name__)
 
 
-ARTIST_DIR_MAP = {
-    "pimenov": {"dir": "Пименов", "title": "Пименов", "title_gen": "Пименова"},
-    "plavinskiy": {"dir": "Плавинский", "title": "Плавинский", "title_gen": "Плавинского"},
-    "chtak": {"dir": "Чтак", "title": "Чтак", "title_gen": "Чтака"},
-}
-
-REALISM_IMAGE_PATH = os.path.join(
-    os.path.dirname(__file__), "images", "Реализм", "Фото-раздела.jpg"
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), "images")
+
+# Бот обрабатывает команды, нажатия кнопок и inline-поиск мест
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.INLINE_QUERY]
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+ASSETS_REFRESH_INTERVAL = float(os.getenv("ASSETS_REFRESH_INTERVAL", "60"))
+
+# Очередь, накопившаяся за время простоя: DROP_PENDING_UPDATES=1 сбрасывает её целиком,
+# иначе старые сообщения отбрасываются, а остальное подаётся в обработку не быстрее BACKLOG_RATE в секунду
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES") == "1"
+BACKLOG_MAX_AGE = float(os.getenv("BACKLOG_MAX_AGE", "300"))
+BACKLOG_RATE = float(os.getenv("BACKLOG_RATE", "20"))
+
+# Повторное нажатие той же кнопки на том же сообщении в пределах окна не выполняется заново
+CALLBACK_DEDUP_WINDOW = float(os.getenv("CALLBACK_DEDUP_WINDOW", "1.5"))
+
+# Результаты inline-поиска зависят только от текста запроса, Telegram может долго держать их в кэше
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "86400"))
+INLINE_RESULTS_LIMIT = 20
+
+# Ближайшие места по присланной геопозиции
+NEARBY_RESULTS = 5
+NEARBY_MAX_DISTANCE_M = float(os.getenv("NEARBY_MAX_DISTANCE_M", "30000"))
+
+# Эндпоинт /metrics в формате Prometheus; без METRICS_PORT не поднимается
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# BOT_MODE=workers: фронт принимает webhook и раздаёт обновления BOT_WORKERS процессам-обработчикам
+# по chat_id. BOT_MODE=worker и BOT_WORKER_* фронт выставляет обработчикам сам
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WORKERS = int(os.getenv("BOT_WORKERS", "0")) or os.cpu_count() or 1
+WORKER_INDEX = int(os.getenv("BOT_WORKER_INDEX", "0"))
+IS_WORKER = BOT_MODE == "worker"
+if IS_WORKER and METRICS_PORT:
+    # У каждого обработчика свой /metrics: METRICS_PORT + 1 + номер
+    METRICS_PORT += 1 + WORKER_INDEX
+# Лимиты Telegram — на весь бот, а не на процесс: каждый обработчик расходует свою долю
+SEND_SHARE = WORKERS if IS_WORKER else 1
+SEND_RATE_OVERALL = float(os.getenv("SEND_RATE_OVERALL", "30")) / SEND_SHARE
+
+METRICS = BotMetrics()
+METRICS.add(
+    Collected(
+        "bot_log_records_dropped_total",
+        "Записи лога, отброшенные из-за переполненной очереди",
+        "counter",
+        lambda: LOG_HANDLER.dropped,
+    )
 )
 
-AVANT_IMAGE_PATH = os.path.join(
-    os.path.dirname(__file__), "images", "Авангард", "фото-раздела.jpg"
-)
+# Тексты, авторы и места путеводителя — в content/catalog.json; файл перечитывается на лету
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(os.path.dirname(__file__), "content", "catalog.json"))
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "2"))
 
-SOVIET_IMAGE_PATH = os.path.join(
-    os.path.dirname(__file__), "images", "соцреализм", "обложка-раздела.jpeg"
-)
+# Сохранённые места, отметки «был здесь», маршрут и последний экран пользователя пишутся в STATE_DB_PATH
+# пачками раз в STATE_FLUSH_INTERVAL секунд и при остановке
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "1"))
 
-CONTEMP_IMAGE_PATH = os.path.join(
-    os.path.dirname(__file__), "images", "современное", "обложка-раздела.jpg"
-)
+# Рассылки запускают только пользователи из ADMIN_IDS (через запятую); BROADCAST_RATE — сообщений в секунду,
+# с запасом до общего лимита Telegram в 30, чтобы ответы на нажатия не ждали. Рассылку отправляет один
+# обработчик, и запас остаётся в пределах его доли
+ADMIN_IDS = [int(user_id) for user_id in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if user_id]
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25")) / SEND_SHARE
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "50"))
+# Как часто отправляющий рассылки обработчик проверяет, не запустили ли новую в другом процессе
+BROADCAST_PICKUP_INTERVAL = 5
 
-GUIDE_CLASSIC_DETAILS = {
-    "tretyakov_lavrushinsky": {
-        "title": "Государственная Третьяковская галерея, Лаврушинский переулок",
-        "desc": (
-            "Главное собрание русской классической живописи и реализма XIX – начала XX века, включая передвижников."
-        ),
-        "site": "https://www.tretyakovgallery.ru/",
-        "address": "Лаврушинский пер., 10",
-    },
-    "tretyakov_kadashevskaya": {
-        "title": "Новый корпус Третьяковской галереи (Кадашевская наб.)",
-        "desc": (
-            "Крупная экспозиция, целиком посвящённая русскому реализму и Товариществу передвижных художественных выставок."
-        ),
-        "site": "https://www.tretyakovgallery.ru/",
-        "address": "Кадашевская наб., 10",
-    },
-    "pushkin_main": {
-        "title": "Государственный музей изобразительных искусств им. А.С. Пушкина (основное здание)",
-        "desc": (
-            "Европейская классическая живопись и скульптура, старые мастера — важный блок для понимания академической традиции и реалистической школы."
-        ),
-        "site": "https://www.pushkinmuseum.art/",
-        "address": "ул. Волхонка, 12",
-    },
-}
-
-GUIDE_CLASSIC_IMAGES = {
-    "tretyakov_lavrushinsky": os.path.join(
-        os.path.dirname(__file__), "images", "Реализм", "третьяковка-лаврушенский-переулок.jpg"
-    ),
-    "tretyakov_kadashevskaya": os.path.join(
-        os.path.dirname(__file__), "images", "Реализм", "третьяковка-кадашевская.jpg"
-    ),
-    "pushkin_main": os.path.join(
-        os.path.dirname(__file__), "images", "Реализм", "музей-пушкина.jpg"
-    ),
-}
-
-GUIDE_AVANT_DETAILS = {
-    "shabolovka_museum": {
-        "title": "Музей авангарда на Шаболовке (Галерея «На Шаболовке»)",
-        "desc": (
-            "Экспозиция в конструктивистском жилмассиве Хавско‑Шаболовского района, посвящена архитектуре 1920–1930-х, "
-            "Шуховской башне и истории советского авангарда в квартале."
-        ),
-        "site": "https://shabolovka.vzmoscow.ru/",
-        "address": "ул. Шаболовка, 24, корп. 2",
-    },
-    "shabolovka_walk": {
-        "title": "Пешеходный маршрут «Авангард на Шаболовке»",
-        "desc": (
-            "Прогулка вокруг Шуховской башни: дом-коммуна, школа‑«гигант», конструктивистские дома. "
-            "Показывает, как идеи авангарда воплотились в городской среде."
-        ),
-        "site": "https://shabolovka.vzmoscow.ru/archive/tproduct/1243040061-175439713442-ulichnaya-ekskursiya-avangard-na-shabolo",
-        "address": "Старт: ул. Шаболовка, 37 (Шуховская башня)",
-    },
-    "jewish_museum": {
-        "title": "Еврейский музей и Центр толерантности (Центр авангарда)",
-        "desc": (
-            "Выставки русского авангарда («До востребования», «Союз молодёжи» и др.), ключевые художники начала XX века и контекст движения."
-        ),
-        "site": "https://www.jewish-museum.ru/",
-        "address": "ул. Образцова, 11, стр. 1",
-    },
-    "tretyakov_new": {
-        "title": "Третьяковская галерея (Новая Третьяковка, проекты об авангарде)",
-        "desc": (
-            "Крупные выставки по русскому авангарду (например, «Авангард. Список № 1»): Кандинский, Малевич, Татлин, Попова и др."
-        ),
-        "site": "https://www.tretyakovgallery.ru/",
-        "address": "Крымский Вал, 10",
-    },
-}
-
-GUIDE_AVANT_IMAGES = {
-    "shabolovka_museum": os.path.join(
-        os.path.dirname(__file__), "images", "Авангард", "шаболовка.jpg"
-    ),
-    "shabolovka_walk": os.path.join(
-        os.path.dirname(__file__), "images", "Авангард", "авангард-на-шабаловке.jpg"
-    ),
-    "jewish_museum": os.path.join(
-        os.path.dirname(__file__), "images", "Авангард", "еврейский-центр.jpeg"
-    ),
-    "tretyakov_new": os.path.join(
-        os.path.dirname(__file__), "images", "Авангард", "новая-третьяковка-крымский-вал.jpg"
-    ),
-}
-
-GUIDE_SOVIET_DETAILS = {
-    "tretyakov_soviet": {
-        "title": "Новая Третьяковка (Крымский Вал)",
-        "desc": (
-            "Постоянная экспозиция искусства XX века, крупные полотна соцреализма и проекты вроде "
-            "«Соцреализм. Метаморфозы. Советское искусство 1927–1987». Видно, как формировался официальный канон СССР."
-        ),
-        "site": "https://www.tretyakovgallery.ru/",
-        "address": "Крымский Вал, 10",
-    },
-    "vmdpni": {
-        "title": "Всероссийский музей декоративного искусства",
-        "desc": (
-            "Проекты «Соцреализм. Стиль большой эпохи»: живопись, скульптура, декоративное искусство и предметы быта "
-            "советского периода. Помогает понять повседневную эстетику эпохи."
-        ),
-        "site": "https://damuseum.ru/",
-        "address": "ул. Делегатская, 3",
-    },
-    "mosaics": {
-        "title": "Советские мозаики и панно Москвы",
-        "desc": (
-            "Мозаичная карта: станции метро (например, «Маяковская»), фасады и интерьеры зданий, заводские и креативные кластеры "
-            "с сохранёнными мозаиками. Живой визуальный код эпохи в городской среде."
-        ),
-        "site": "https://tour.mosmetro.ru/tours/0C452E44-DB24-4B8E-A551-52C6538952EB",
-        "address": "Разные адреса; старт маршрута: м. Маяковская",
-    },
-}
-
-GUIDE_SOVIET_IMAGES = {
-    "tretyakov_soviet": os.path.join(
-        os.path.dirname(__file__), "images", "соцреализм", "новая-третьяковка-крымский-вал.jpg"
-    ),
-    "vmdpni": os.path.join(
-        os.path.dirname(__file__), "images", "соцреализм", "музей-декоративного-искусства.jpg"
-    ),
-    "mosaics": os.path.join(
-        os.path.dirname(__file__), "images", "соцреализм", "мозаика-в-метро.jpeg"
-    ),
-}
-
-GUIDE_CONTEMP_DETAILS = {
-    "mmoma": {
-        "title": "Московский музей современного искусства (MMOMA)",
-        "desc": (
-            "Первый в России музей, полностью посвящённый современному искусству: несколько площадок в центре, "
-            "постоянная коллекция и крупные выставки российских и зарубежных художников XX–XXI веков."
-        ),
-        "site": "https://mmoma.ru/",
-        "address": "ул. Петровка, 25 и др. площадки",
-    },
-    "garage": {
-        "title": "Музей современного искусства «Гараж» (Парк Горького)",
-        "desc": (
-            "Один из главных центров актуального искусства: международные выставки, перформансы, лекции, фестивали "
-            "и сильная образовательная программа."
-        ),
-        "site": "https://garagemca.org/",
-        "address": "Парк Горького, ул. Крымский Вал, 9, стр. 32",
-    },
-    "mamm": {
-        "title": "Мультимедиа Арт Музей, Москва (МАММ)",
-        "desc": (
-            "Музей фотографии, видео- и медиаискусства на Остоженке: семь этажей экспозиций, "
-            "фокус на современном визуальном языке, документальной и художественной фотографии."
-        ),
-        "site": "https://mamm-mdf.ru/",
-        "address": "ул. Остоженка, 16",
-    },
-    "winzavod": {
-        "title": "Центр современного искусства «Винзавод»",
-        "desc": (
-            "Крупный арт-кластер на территории бывшего завода: галереи современного искусства, мастерские, "
-            "институт «БАЗА», фестивали и ярмарки."
-        ),
-        "site": "https://winzavod.ru/",
-        "address": "4-й Сыромятнический пер., 1/8с6",
-    },
-}
-
-GUIDE_CONTEMP_IMAGES = {
-    "mmoma": os.path.join(
-        os.path.dirname(__file__), "images", "современное", "ммома.jpeg"
-    ),
-    "garage": os.path.join(
-        os.path.dirname(__file__), "images", "современное", "музей-гараж.jpg"
-    ),
-    "mamm": os.path.join(
-        os.path.dirname(__file__), "images", "современное", "ммам.jpg"
-    ),
-    "winzavod": os.path.join(
-        os.path.dirname(__file__), "images", "современное", "винзавод.jpg"
-    ),
-}
-
-
-START_MESSAGE = (
-    "✨*Привет!* Этот бот поможет тебе открыть Москву как крупнейший художественный центр "
-    "России и подобрать маршрут по самым ярким творческим локациям города. Проект создан "
-    "студентами 1 курса НИУ ВШЭ (МИЭМ) в рамках учебного курса ОРГ.\n\n"
-    "🧭 *Навигация*:\n\n"
-    "> Нажми «*Узнать о Москве*», чтобы начать знакомство.\n"
-    "> Нажми «*Московские художники*», чтобы узнать больше о художниках Москвы.\n"
-    "> Нажми «*Путеводитель*», чтобы составить маршрут по интересным местам города."
+_COMMAND_RE = re.compile(r"^/\w+(@\w+)?\s*")
 
+# Ответы Bot API, при которых экран не правится, а отправляется новым сообщением
+_UNEDITABLE = ("can't be edited", "no text in the message", "message to edit not found")
 
-)
+
+@dataclass(frozen=True)
+class Content:
+    texts: Dict[str, str]
+    # slug → {"dir", "title", "title_gen"}
+    artists: Dict[str, Dict[str, str]]
+    # «guide:<section>:<slug>» → место; image — абсолютный путь, location — (широта, долгота)
+    places: Dict[str, Dict[str, Any]]
+    locations: Dict[str, LatLon]
+    screens: ScreenRegistry
+    # Карточка места в четырёх вариантах кнопок: индекс — 2 × «сохранено» + «был здесь»
+    place_screens: Dict[str, Tuple[Screen, Screen, Screen, Screen]]
+    # Главное меню с кнопкой «↩️ Продолжить» на каждый экран, к которому можно вернуться
+    resume_screens: Dict[str, Screen]
+    router: Router
+    search: SearchIndex
+    nearby: GridIndex
+    planner: RoutePlanner
+
+
+def _image_path(relative: Optional[str]) -> Optional[str]:
+    return os.path.join(IMAGES_DIR, *relative.split("/")) if relative else None
+
+
+def _number(n: int) -> str:
+    return f"{n}️⃣" if n < 10 else f"{n}."
 
 
 def build_main_keyboard() -> InlineKeyboardMarkup:
@@ -246,539 +174,1120 @@ def build_main_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton("Московские художники", callback_data="artists")],
         [InlineKeyboardButton("Путеводитель", callback_data="guide")],
         [InlineKeyboardButton("Авторы", callback_data="authors")],
+        [InlineKeyboardButton("⭐ Мои места", callback_data="saved")],
     ]
     return InlineKeyboardMarkup(buttons)
 
 
-def _artist_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton("Пименов", callback_data="artist:pimenov"),
-                InlineKeyboardButton("Плавинский", callback_data="artist:plavinskiy"),
-            ],
-            [InlineKeyboardButton("Чтак", callback_data="artist:chtak")],
-            [InlineKeyboardButton("⬅️ В меню", callback_data="back")],
-        ]
-    )
+def _artist_keyboard(artists: Dict[str, Dict[str, str]]) -> InlineKeyboardMarkup:
+    buttons = [
+        InlineKeyboardButton(artist["title"], callback_data=f"artist:{slug}")
+        for slug, artist in artists.items()
+    ]
+    rows = [buttons[i : i + 2] for i in range(0, len(buttons), 2)]
+    rows.append([InlineKeyboardButton("⬅️ В меню", callback_data="back")])
+    return InlineKeyboardMarkup(rows)
+
+
+def _guide_keyboard(sections: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
+    rows = [
+        [InlineKeyboardButton(section["button"], callback_data=f"guide:{section['slug']}")]
+        for section in sections
+    ]
+    rows.append([InlineKeyboardButton("🗺 Составить маршрут", callback_data="route")])
+    rows.append([InlineKeyboardButton("⬅️ В меню", callback_data="back")])
+    return InlineKeyboardMarkup(rows)
 
 
-def _guide_classic_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+def _section_keyboard(section: Dict[str, Any]) -> InlineKeyboardMarkup:
+    rows = [
         [
-            [InlineKeyboardButton("Классика и реализм", callback_data="guide:classic")],
-            [InlineKeyboardButton("Русский авангард и модернизм", callback_data="guide:avant")],
-            [InlineKeyboardButton("Советское искусство и соцреализм", callback_data="guide:soviet")],
-            [InlineKeyboardButton("Современное искусство", callback_data="guide:contemporary")],
-            [InlineKeyboardButton("⬅️ В меню", callback_data="back")],
+            InlineKeyboardButton(
+                f"{_number(number)} {place['button']}",
+                callback_data=f"guide:{section['slug']}:{place['slug']}",
+            )
         ]
+        for number, place in enumerate(section["places"], start=1)
+    ]
+    rows.append([InlineKeyboardButton("⬅️ К путеводителю", callback_data="guide")])
+    return InlineKeyboardMarkup(rows)
+
+
+def _back_keyboard(callback_data: str = "back", text: str = "⬅️ В меню") -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=callback_data)]])
+
+
+def _place_text(detail: Dict[str, Any]) -> str:
+    return (
+        f"{bold(detail['title'])}\n\n"
+        f"{escape(detail['desc'])}\n"
+        f"Адрес: {escape(detail['address'])}\n"
+        f"Сайт: {escape(detail['site'])}"
     )
 
 
-def _guide_classic_places_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "1️⃣ Третьяковка (Лаврушинский)", callback_data="guide:classic:tretyakov_lavrushinsky"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "2️⃣ Третьяковка (Кадашевская)", callback_data="guide:classic:tretyakov_kadashevskaya"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "3️⃣ ГМИИ Пушкин (осн.)", callback_data="guide:classic:pushkin_main"
-                )
-            ],
-            [InlineKeyboardButton("⬅️ К путеводителю", callback_data="guide")],
-        ]
+def build_screens(
+    texts: Dict[str, str],
+    artists: Dict[str, Dict[str, str]],
+    sections: List[Dict[str, Any]],
+    places: Dict[str, Dict[str, Any]],
+) -> ScreenRegistry:
+    # Тексты уже в HTML; каждый экран проверяется при добавлении в реестр (разметка и лимиты длины)
+    main_keyboard = build_main_keyboard()
+    artist_keyboard = _artist_keyboard(artists)
+    screens = ScreenRegistry()
+    screens.add("main", Screen(texts["start"], main_keyboard))
+    screens.add("help", Screen(texts["help"], parse_mode=None))
+    screens.add("info:moscow", Screen(texts["info_moscow"], _back_keyboard(text="⬅️ Вернуться в меню")))
+    screens.add("artists", Screen(texts["artists"], artist_keyboard))
+    screens.add(
+        "artist:more",
+        Screen("Выберите другого автора или вернитесь в меню.", artist_keyboard, parse_mode=None),
+    )
+    screens.add("artist:missing", Screen("Автор не найден.", artist_keyboard, parse_mode=None))
+    screens.add(
+        "artist:no_images",
+        Screen("Изображения не найдены для этого автора.", artist_keyboard, parse_mode=None),
+    )
+    screens.add("guide", Screen(texts["guide"], _guide_keyboard(sections)))
+    screens.add(
+        "guide:missing",
+        Screen(
+            "Детали маршрута недоступны.",
+            _back_keyboard("guide", "⬅️ К путеводителю"),
+            parse_mode=None,
+        ),
+    )
+    for section in sections:
+        keyboard = _section_keyboard(section)
+        screens.add(
+            f"guide:{section['slug']}",
+            Screen(render(section["caption"]), keyboard, photo=_image_path(section["cover"])),
+        )
+        for place in section["places"]:
+            key = f"guide:{section['slug']}:{place['slug']}"
+            screens.add(key, Screen(places[key]["text"], keyboard, photo=places[key]["image"]))
+    screens.add("authors", Screen(texts["authors"], _back_keyboard()))
+    screens.add(
+        "unknown", Screen("Неизвестное действие. Вернитесь в меню.", main_keyboard, parse_mode=None)
+    )
+    return screens.freeze()
+
+
+def build_router(
+    screens: ScreenRegistry,
+    artists: Dict[str, Dict[str, str]],
+    sections: List[Dict[str, Any]],
+    places: Dict[str, Dict[str, Any]],
+    locations: Dict[str, LatLon],
+) -> Router:
+    router = Router(show_screen, "unknown")
+    router.add("back", show_screen, "main")
+    router.add("info:moscow", show_screen, "info:moscow")
+    router.add("artists", show_screen, "artists")
+    router.add("guide", show_screen, "guide")
+    router.add("authors", show_screen, "authors")
+    for section in sections:
+        slug = section["slug"]
+        router.add(f"guide:{slug}", show_screen, f"guide:{slug}", label="guide:<section>")
+        router.add_prefix(
+            f"guide:{slug}:", show_screen, "guide:missing", label="guide:<section>:<missing>"
+        )
+        for place in section["places"]:
+            router.add(
+                f"guide:{slug}:{place['slug']}",
+                show_screen,
+                f"guide:{slug}:{place['slug']}",
+                label="guide:<section>:<slug>",
+            )
+    router.add("saved", show_saved)
+    router.add("saved:route", route_saved)
+    for key in places:
+        router.add(f"save:{key}", toggle_saved, key, label="save:<place>")
+        router.add(f"visit:{key}", toggle_visited, key, label="visit:<place>")
+    router.add("route", show_route_picker)
+    router.add("route:build", show_route)
+    router.add("route:clear", clear_route)
+    for key in locations:
+        router.add(f"route:toggle:{key}", toggle_route_place, key, label="route:toggle:<place>")
+    router.add_prefix("artist:", show_screen, "artist:missing", label="artist:<missing>")
+    for artist in artists:
+        router.add(f"artist:{artist}", show_artist, artist, label="artist:<slug>")
+    router.validate(screens.markups())
+    return router
+
+
+def build_place_screens(
+    screens: ScreenRegistry, places: Dict[str, Dict[str, Any]]
+) -> Dict[str, Tuple[Screen, Screen, Screen, Screen]]:
+    variants = {}
+    for key in places:
+        screen = screens[key]
+        *rows, back = screen.markup.inline_keyboard
+        options = []
+        for saved in (False, True):
+            for visited in (False, True):
+                actions = [
+                    InlineKeyboardButton("⭐ Сохранено" if saved else "☆ Сохранить", callback_data=f"save:{key}"),
+                    InlineKeyboardButton(
+                        "✔️ Был здесь" if visited else "◻️ Был здесь", callback_data=f"visit:{key}"
+                    ),
+                ]
+                options.append(replace(screen, markup=InlineKeyboardMarkup([*rows, actions, back])))
+        variants[key] = tuple(options)
+    return variants
+
+
+def build_resume_screens(screens: ScreenRegistry, router: Router) -> Dict[str, Screen]:
+    main = screens["main"]
+    # Запоминаются только экраны со своей кнопкой и список «Мои места»
+    targets = [key for key in screens.keys() if router.lookup(key) is not None] + ["saved"]
+    return {
+        key: replace(
+            main,
+            markup=InlineKeyboardMarkup(
+                [*main.markup.inline_keyboard, [InlineKeyboardButton("↩️ Продолжить", callback_data=key)]]
+            ),
+        )
+        for key in targets
+    }
+
+
+def build_search_index(places: Dict[str, Dict[str, Any]]) -> SearchIndex:
+    index = SearchIndex()
+    for key, detail in places.items():
+        index.add(key, [(detail["title"], 3.0), (detail["address"], 2.0), (detail["desc"], 1.0)])
+    return index.freeze()
+
+
+def compile_content(data: Dict[str, Any]) -> Content:
+    # Вызывается и при старте, и из потока наблюдателя каталога: только чистые вычисления
+    # Разметка каталога переводится в HTML один раз на версию; help уходит обычным текстом
+    texts = {key: text if key == "help" else render(text) for key, text in data["texts"].items()}
+    artists = {
+        artist["slug"]: {"dir": artist["dir"], "title": artist["title"], "title_gen": artist["title_gen"]}
+        for artist in data["artists"]
+    }
+    sections = data["guide"]
+    places: Dict[str, Dict[str, Any]] = {}
+    for section in sections:
+        for place in section["places"]:
+            detail = dict(place, image=_image_path(place.get("image")))
+            if place.get("location"):
+                detail["location"] = tuple(place["location"])
+            detail["text"] = _place_text(place)
+            places[f"guide:{section['slug']}:{place['slug']}"] = detail
+    locations = {key: detail["location"] for key, detail in places.items() if detail.get("location")}
+    screens = build_screens(texts, artists, sections, places)
+    router = build_router(screens, artists, sections, places, locations)
+    # Клавиатуры, зависящие от состояния пользователя, собираются здесь же, а не на каждое нажатие
+    place_screens = build_place_screens(screens, places)
+    resume_screens = build_resume_screens(screens, router)
+    router.validate(
+        [screen.markup for options in place_screens.values() for screen in options]
+        + [screen.markup for screen in resume_screens.values()]
+    )
+    return Content(
+        texts=texts,
+        artists=artists,
+        places=places,
+        locations=locations,
+        screens=screens,
+        place_screens=place_screens,
+        resume_screens=resume_screens,
+        router=router,
+        search=build_search_index(places),
+        nearby=GridIndex(locations.items()),
+        planner=RoutePlanner(locations.items()),
     )
 
 
-def _guide_avant_places_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "1️⃣ Музей авангарда (Шаболовка)", callback_data="guide:avant:shabolovka_museum"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "2️⃣ Маршрут «Авангард на Шаболовке»", callback_data="guide:avant:shabolovka_walk"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "3️⃣ Еврейский музей / Центр авангарда", callback_data="guide:avant:jewish_museum"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "4️⃣ Новая Третьяковка (авангард)", callback_data="guide:avant:tretyakov_new"
-                )
-            ],
-            [InlineKeyboardButton("⬅️ К путеводителю", callback_data="guide")],
-        ]
+def _content(context: ContextTypes.DEFAULT_TYPE) -> Content:
+    # Обработчик берёт снимок каталога один раз и работает с ним до конца обновления
+    return context.bot_data["catalog"].current
+
+
+def _main_screen(content: Content, user_data: Dict[str, Any]) -> Screen:
+    # Экран, на котором пользователь остановился, если он ещё есть в каталоге
+    return content.resume_screens.get(user_data.get("last_screen"), content.screens["main"])
+
+
+async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    content = _content(context)
+    with METRICS.track("/start"):
+        if update.effective_chat and update.effective_chat.type == ChatType.PRIVATE:
+            context.bot_data["audience"].subscribe(update.effective_chat.id)
+        if update.message:
+            await _reply_screen(context, update.message, _main_screen(content, context.user_data))
+        elif update.callback_query:
+            await show_screen(update, context, content, "main")
+
+
+async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    with METRICS.track("/help"):
+        await update.message.reply_text(_content(context).screens["help"].text)
+
+
+def _format_broadcast(progress: Progress, status: str) -> str:
+    return f"#{progress.id} ({status}): {progress.summary()}"
+
+
+async def handle_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message = update.message
+    broadcaster = context.bot_data["broadcaster"]
+    body = _COMMAND_RE.sub("", message.text or message.caption or "", count=1).strip()
+    if not body:
+        recent = await broadcaster.recent()
+        lines = [_format_broadcast(progress, status) for progress, status in recent]
+        await message.reply_text(
+            "Рассылка: /broadcast <текст> или фото с подписью «/broadcast <текст>». "
+            "Разметка — *жирный*. Остановить: /broadcast_stop <номер>.\n\n"
+            + ("\n".join(lines) if lines else "Рассылок ещё не было.")
+        )
+        return
+    photo = message.photo[-1].file_id if message.photo else None
+    try:
+        text = render(body)
+        check(text, MessageLimit.CAPTION_LENGTH if photo else MessageLimit.MAX_TEXT_LENGTH, ParseMode.HTML)
+    except MarkupError as exc:
+        await message.reply_text(f"Рассылка не запущена: {exc}")
+        return
+    progress = await broadcaster.start(context.job_queue, text, photo, owner=message.chat_id)
+    await message.reply_text(
+        f"Рассылка #{progress.id} запущена: {progress.total} получателей, "
+        f"около {max(1, round(progress.total / BROADCAST_RATE / 60))} мин."
     )
 
 
-def _guide_soviet_places_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+async def handle_broadcast_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Укажите номер рассылки: /broadcast_stop <номер>")
+        return
+    broadcast_id = int(context.args[0])
+    if await context.bot_data["broadcaster"].cancel(broadcast_id):
+        await update.message.reply_text(f"Рассылка #{broadcast_id} остановлена.")
+    else:
+        await update.message.reply_text(f"Рассылка #{broadcast_id} сейчас не идёт.")
+
+
+async def _reply_screen(
+    context: ContextTypes.DEFAULT_TYPE, message: Message, screen: Screen
+) -> None:
+    if screen.photo and screen.photo in context.bot_data["assets"]:
+        await context.bot_data["file_ids"].reply_photo(
+            message,
+            screen.photo,
+            caption=screen.text,
+            parse_mode=screen.parse_mode,
+            reply_markup=screen.markup,
+        )
+    else:
+        await message.reply_text(
+            screen.text,
+            reply_markup=screen.markup,
+            parse_mode=screen.parse_mode,
+            disable_web_page_preview=True,
+        )
+
+
+def _user_places(context: ContextTypes.DEFAULT_TYPE, name: str, known: Container[str]) -> List[str]:
+    # Места, убранные из каталога после выбора, из списков пользователя выпадают
+    places = context.user_data.setdefault(name, [])
+    places[:] = [key for key in places if key in known]
+    return places
+
+
+def _place_screen(content: Content, key: str, user_data: Dict[str, Any]) -> Screen:
+    saved = key in user_data.get("saved", ())
+    visited = key in user_data.get("visited", ())
+    return content.place_screens[key][2 * saved + visited]
+
+
+async def show_screen(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content, key: str
+) -> None:
+    if key in content.places:
+        screen = _place_screen(content, key, context.user_data)
+    else:
+        screen = content.screens[key]
+    # Запоминаем только экраны, на которые ведёт своя кнопка, — к ним /start предложит вернуться
+    if content.router.lookup(key) is not None:
+        context.user_data["last_screen"] = key
+    await edit_screen(update, context, screen)
+
+
+async def edit_screen(update: Update, context: ContextTypes.DEFAULT_TYPE, screen: Screen) -> None:
+    query = update.callback_query
+    message = query.message
+    if not isinstance(message, Message):
+        return
+    photo = screen.photo if screen.photo and screen.photo in context.bot_data["assets"] else None
+    # Экран переиспользует сообщение с нажатой кнопкой; новое сообщение —
+    # только когда правка невозможна (текстовое сообщение нельзя превратить в фото).
+    try:
+        if photo and message.photo:
+            await context.bot_data["file_ids"].edit_photo(
+                message,
+                photo,
+                caption=screen.text,
+                parse_mode=screen.parse_mode,
+                reply_markup=screen.markup,
+            )
+        elif not photo and not message.photo:
+            await message.edit_text(
+                screen.text,
+                reply_markup=screen.markup,
+                parse_mode=screen.parse_mode,
+                disable_web_page_preview=True,
+            )
+        elif not photo and screen.fits_caption:
+            await message.edit_caption(
+                caption=screen.text, parse_mode=screen.parse_mode, reply_markup=screen.markup
+            )
+        else:
+            await _reply_screen(context, message, screen)
+    except BadRequest as exc:
+        text = exc.message.lower()
+        if "not modified" in text:
+            return
+        if not any(reason in text for reason in _UNEDITABLE):
+            raise
+        await _reply_screen(context, message, screen)
+
+
+async def show_artist(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content, artist: str
+) -> None:
+    query = update.callback_query
+    if not await context.bot_data["albums"].send(query.message, artist):
+        await show_screen(update, context, content, "artist:no_images")
+        return
+    await _reply_screen(context, query.message, content.screens["artist:more"])
+
+
+def _route_picker_screen(content: Content, selected: List[str], hint: str = "") -> Screen:
+    rows = [
         [
-            [
-                InlineKeyboardButton(
-                    "1️⃣ Новая Третьяковка (соцреализм)", callback_data="guide:soviet:tretyakov_soviet"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "2️⃣ Всероссийский музей декоративного искусства", callback_data="guide:soviet:vmdpni"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "3️⃣ Советские мозаики и панно", callback_data="guide:soviet:mosaics"
-                )
-            ],
-            [InlineKeyboardButton("⬅️ К путеводителю", callback_data="guide")],
+            InlineKeyboardButton(
+                f"{'✅' if key in selected else '▫️'} {content.places[key]['button']}",
+                callback_data=f"route:toggle:{key}",
+            )
+        ]
+        for key in content.locations
+    ]
+    rows.append([InlineKeyboardButton("🚶 Построить маршрут", callback_data="route:build")])
+    rows.append(
+        [
+            InlineKeyboardButton("🧹 Очистить", callback_data="route:clear"),
+            InlineKeyboardButton("⬅️ К путеводителю", callback_data="guide"),
         ]
     )
+    text = (
+        "🗺 <b>Маршрут</b>\n\n"
+        "Отметьте места из всех разделов путеводителя и нажмите «Построить маршрут» — "
+        "бот предложит порядок, в котором их удобнее обойти пешком.\n\n"
+        f"Выбрано: {len(selected)}"
+    )
+    if hint:
+        text += f"\n\n{hint}"
+    return Screen(text, InlineKeyboardMarkup(rows))
+
+
+def _selected_places(context: ContextTypes.DEFAULT_TYPE, content: Content) -> List[str]:
+    return _user_places(context, "route", content.planner)
 
 
-def _guide_contemp_places_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+async def show_route_picker(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content
+) -> None:
+    selected = _selected_places(context, content)
+    await edit_screen(update, context, _route_picker_screen(content, selected))
+
+
+async def toggle_route_place(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content, key: str
+) -> None:
+    selected = _selected_places(context, content)
+    if key in selected:
+        selected.remove(key)
+    else:
+        selected.append(key)
+    await edit_screen(update, context, _route_picker_screen(content, selected))
+
+
+async def clear_route(update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content) -> None:
+    context.user_data["route"] = []
+    await edit_screen(update, context, _route_picker_screen(content, []))
+
+
+async def show_route(update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content) -> None:
+    selected = _selected_places(context, content)
+    if len(selected) < 2:
+        screen = _route_picker_screen(content, selected, "Выберите хотя бы два места.")
+        await edit_screen(update, context, screen)
+        return
+    planner = content.planner
+    order, length = planner.plan(selected)
+    lines = []
+    for number, key in enumerate(order, start=1):
+        if number > 1:
+            lines.append(f"   ↓ {_format_distance(planner.leg(order[number - 2], key))}")
+        detail = content.places[key]
+        lines.append(f"{number}. {bold(detail['button'])} — {escape(detail['address'])}")
+    minutes = walk_minutes(length)
+    text = (
+        f"🚶 <b>Ваш маршрут</b>: мест — {len(order)}, {_format_distance(length)}, ~{minutes} мин пешком\n\n"
+        + "\n".join(lines)
+    )
+    points = "~".join(f"{lat},{lon}" for lat, lon in (content.locations[key] for key in order))
+    markup = InlineKeyboardMarkup(
         [
-            [InlineKeyboardButton("1️⃣ MMOMA", callback_data="guide:contemporary:mmoma")],
-            [InlineKeyboardButton("2️⃣ Гараж", callback_data="guide:contemporary:garage")],
-            [InlineKeyboardButton("3️⃣ МАММ", callback_data="guide:contemporary:mamm")],
-            [InlineKeyboardButton("4️⃣ Винзавод", callback_data="guide:contemporary:winzavod")],
-            [InlineKeyboardButton("⬅️ К путеводителю", callback_data="guide")],
+            [InlineKeyboardButton("🗺 Открыть на карте", url=f"https://yandex.ru/maps/?rtext={points}&rtt=pd")],
+            [InlineKeyboardButton("✏️ Изменить выбор", callback_data="route")],
+            [InlineKeyboardButton("⬅️ В меню", callback_data="back")],
         ]
     )
+    await edit_screen(update, context, Screen(text, markup))
 
 
-async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if update.message:
-        await update.message.reply_text(
-            START_MESSAGE,
-            reply_markup=build_main_keyboard(),
-            parse_mode=ParseMode.MARKDOWN,
-            disable_web_page_preview=True,
-        )
-    elif update.callback_query:
-        await update.callback_query.edit_message_text(
-            START_MESSAGE,
-            reply_markup=build_main_keyboard(),
-            parse_mode=ParseMode.MARKDOWN,
-            disable_web_page_preview=True,
+def _toggle(places: List[str], key: str) -> None:
+    if key in places:
+        places.remove(key)
+    else:
+        places.append(key)
+
+
+async def _refresh_place_actions(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content, key: str
+) -> None:
+    # Меняются только кнопки под карточкой места, фото и текст остаются
+    markup = _place_screen(content, key, context.user_data).markup
+    try:
+        await update.callback_query.edit_message_reply_markup(markup)
+    except BadRequest as exc:
+        if "not modified" not in exc.message.lower():
+            raise
+
+
+async def toggle_saved(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content, key: str
+) -> None:
+    _toggle(_user_places(context, "saved", content.places), key)
+    await _refresh_place_actions(update, context, content, key)
+
+
+async def toggle_visited(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content, key: str
+) -> None:
+    _toggle(_user_places(context, "visited", content.places), key)
+    await _refresh_place_actions(update, context, content, key)
+
+
+def _saved_screen(content: Content, saved: List[str], visited: List[str]) -> Screen:
+    if not saved:
+        text = (
+            "⭐ <b>Мои места</b>\n\n"
+            "Здесь появятся места, которые вы сохраните в путеводителе кнопкой «☆ Сохранить»."
         )
+        return Screen(text, _back_keyboard())
+    lines = []
+    rows = []
+    for number, key in enumerate(saved, start=1):
+        detail = content.places[key]
+        mark = " ✔️" if key in visited else ""
+        lines.append(f"{number}. {bold(detail['title'])} — {escape(detail['address'])}{mark}")
+        rows.append([InlineKeyboardButton(f"{number}. {detail['button']}{mark}", callback_data=key)])
+    done = sum(1 for key in saved if key in visited)
+    text = f"⭐ <b>Мои места</b>: {len(saved)}, посещено {done}\n\n" + "\n".join(lines)
+    if sum(1 for key in saved if key in content.planner) >= 2:
+        rows.append([InlineKeyboardButton("🗺 Маршрут по сохранённым", callback_data="saved:route")])
+    rows.append([InlineKeyboardButton("⬅️ В меню", callback_data="back")])
+    return Screen(text, InlineKeyboardMarkup(rows))
 
 
-async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    text = (
-        "Доступные команды:\n"
-        "/start — главное меню\n"
-        "/help — эта справка\n"
-        "Используйте кнопки в главном меню, чтобы читать разделы и составить маршрут."
-    )
-    await update.message.reply_text(text)
+async def show_saved(update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content) -> None:
+    saved = _user_places(context, "saved", content.places)
+    visited = _user_places(context, "visited", content.places)
+    context.user_data["last_screen"] = "saved"
+    await edit_screen(update, context, _saved_screen(content, saved, visited))
+
+
+async def route_saved(update: Update, context: ContextTypes.DEFAULT_TYPE, content: Content) -> None:
+    saved = _user_places(context, "saved", content.places)
+    context.user_data["route"] = [key for key in saved if key in content.planner]
+    await show_route(update, context, content)
+
+
+async def bind_log_context(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Все записи лога, сделанные при обработке этого обновления, получат его update_id
+    bind_update(update.update_id, update_chat_id(update))
+
+
+async def note_fresh_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Свежее обновление из чата отменяет его ещё не обработанные обновления из очереди простоя
+    context.bot_data["backlog"].seen(update)
+
+
+async def _answer(query: CallbackQuery) -> None:
+    try:
+        await query.answer()
+    except BadRequest as exc:
+        # Нажатие из очереди после простоя: «часики» у пользователя уже погасли, экран всё равно обновляем
+        if "query is too old" not in exc.message.lower():
+            raise
+
+
+def _press_key(query: CallbackQuery) -> Hashable:
+    if query.message is not None:
+        return query.message.chat.id, query.message.message_id
+    return query.inline_message_id or query.id
 
 
 async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     if not query:
         return
-    await query.answer()
-
+    content = _content(context)
     data = query.data or ""
-    if data == "back":
-        if query.message:
-            await query.message.reply_text(
-                START_MESSAGE,
-                reply_markup=build_main_keyboard(),
-                parse_mode=ParseMode.MARKDOWN,
-                disable_web_page_preview=True,
-            )
+    route = content.router.resolve(data)
+    key = _press_key(query)
+    duplicate, done = context.bot_data["presses"].claim(key, data)
+    if duplicate:
+        # Двойное нажатие: гасим «часики» и ждём первое нажатие, не повторяя работу
+        METRICS.duplicates.inc(route.label)
+        await _answer(query)
+        await asyncio.shield(done)
         return
+    failed = True
+    try:
+        with METRICS.track(route.label):
+            await _answer(query)
+            await route.handler(update, context, content, *route.args)
+        failed = False
+    finally:
+        context.bot_data["presses"].release(key, done, failed)
+
+
+def _inline_result(
+    context: ContextTypes.DEFAULT_TYPE, content: Content, key: str
+) -> InlineQueryResult:
+    detail = content.places[key]
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("🌐 Сайт", url=detail["site"])]])
+    image = detail["image"]
+    # Фото в выдаче — только уже загруженные в Telegram: по file_id из памяти, без повторной загрузки
+    # и без запросов к базе на каждое нажатие клавиши
+    if image and image in context.bot_data["assets"]:
+        file_id = context.bot_data["file_ids"].cached(image)
+        if file_id:
+            return InlineQueryResultCachedPhoto(
+                id=key,
+                photo_file_id=file_id,
+                title=detail["title"],
+                description=detail["address"],
+                caption=detail["text"],
+                parse_mode=ParseMode.HTML,
+                reply_markup=markup,
+            )
+    return InlineQueryResultArticle(
+        id=key,
+        title=detail["title"],
+        description=detail["address"],
+        input_message_content=InputTextMessageContent(
+            detail["text"], parse_mode=ParseMode.HTML
+        ),
+        reply_markup=markup,
+    )
 
-    if data == "info:moscow":
-        text = (
-            "*Узнать о Москве*\n\n"
-            "Москва — крупнейший художественный центр России: именно здесь находятся главные собрания русского искусства, "
-            "которые формируют представление о культуре всей страны. В Третьяковской галерее можно увидеть путь московской "
-            "и общерусской живописи от древнерусской иконописи до картин передвижников и мастеров XX века (онлайн-коллекция: "
-            "https://gallerix.ru/album/GTG, сайт галереи: https://tretyakovskaja.ru). Государственный музей изобразительных искусств "
-            "имени А.С. Пушкина дополняет образ Москвы как «моста» между Россией и Европой: его коллекция показывает, как столичные "
-            "художники и зрители вступали в диалог с мировым искусством (электронный каталог: https://collection.pushkinmuseum.art).\n\n"
-            "Чтобы лучше понять художественную Москву, можно начать с книг, которые напрямую связаны с её музеями и экспозициями. "
-            "Про русскую живопись и московские залы передвижников помогут издания «Русские художники-передвижники» Ирины Кравченко "
-            "(например, описание: https://www.moscowbooks.ru/book/1205821/, https://www.labirint.ru/books/550453/) и альбом "
-            "«Передвижники. Художники-передвижники и самые важные картины» (https://www.litres.ru/book/uliya-varencova/peredvizhniki-"
-            "hudozhniki-peredvizhniki-i-samye-vazhnye-kar-51611144/) — многие репродукции из этих книг можно увидеть «вживую» именно "
-            "в московских музеях. А чтобы увидеть, как Москва стала центром русского авангарда и эксперимента, подойдут подборка "
-            "«Книги о русском авангарде» от издательства АСТ (https://ast.ru/top/knigi-o-russkom-avangarde/) и книга Андрея Сарабьянова "
-            "«Русский авангард. И не только» (https://www.labirint.ru/books/961444/) — они хорошо объясняют контекст работ, которые сегодня "
-            "экспонируются в московских коллекциях и выставках."
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(
-                [[InlineKeyboardButton("⬅️ Вернуться в меню", callback_data="back")]]
-            ),
-            parse_mode=ParseMode.MARKDOWN,
-            disable_web_page_preview=True,
-        )
-        return
 
-    if data == "artists":
-        text = (
-            "*Московские художники*\n\n"
-            "Москва — это не только столица, но и родной город для многих художников, которые здесь родились, "
-            "выросли и связали с ней своё творчество. Их картины часто показывают московские улицы, дворы и жителей, "
-            "а биографии тесно связаны с московскими школами, мастерскими и выставками.\n\n"
-            "Примеры московских художников:\n\n"
-            "• Юрий Иванович Пименов (1903–1977) — родился в Москве, учился и работал в столице, "
-            "один из самых узнаваемых художников XX века. Прославился лирическими городскими сценами "
-            "и образом «новой, современной Москвы» — автомобили, улицы, театральная жизнь. (https://izvestnye-lyudi.ru/person/yurij-ivanovich-pimenov/)\n\n"
-            "• Дмитрий Петрович Плавинский (1937–2012) — родился в Москве и стал одним из ярких представителей "
-            "неофициального искусства второй половины XX века. В его живописи часто соединяются мотивы истории, "
-            "архитектуры и городского пространства. (https://izvestnye-lyudi.ru/person/dmitrij-petrovich-plavinskij/)\n\n"
-            "• Валерий Сергеевич Чтак (1981–2024) — родился в Москве, художник-концептуалист и стрит-арт автор, участник московских "
-            "художественных проектов. Его произведения связаны с языком городской среды, текстами и визуальными высказываниями "
-            "о жизни в мегаполисе. (https://vladey.net/ru/artist/valeriy-chtak)\n\n"
-            "Где дальше искать московских художников:\n"
-            "Подборка «Художники, родившиеся в Москве» с краткими биографиями и датами: "
-            "https://izvestnye-lyudi.ru/moskovskaya-oblast/moskovskaya-aglomeraciya/moskva/?list=hudozhniki\n\n"
-            "Ознакомиться с работами данных авторов:"
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=_artist_keyboard(),
-            parse_mode=ParseMode.MARKDOWN,
-            disable_web_page_preview=True,
+async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.inline_query
+    content = _content(context)
+    with METRICS.track("inline"):
+        text = query.query.strip()
+        if text:
+            keys = content.search.search(text, INLINE_RESULTS_LIMIT)
+        else:
+            keys = content.search.keys(INLINE_RESULTS_LIMIT)
+        await query.answer(
+            [_inline_result(context, content, key) for key in keys], cache_time=INLINE_CACHE_TIME
         )
-        return
 
-    if data == "guide":
-        text = (
-            "*Путеводитель*\n\n"
-            "В этом разделе собраны маршруты по Москве, привязанные к разным художественным стилям. "
-            "Вы выбираете интересующее направление и получаете список мест в городе, где этот стиль можно «увидеть вживую».\n\n"
-            "*Классика и реализм*\n"
-            "Маршруты по музеям и локациям, где представлены шедевры классической живописи, передвижники и реалистические пейзажи.\n\n"
-            "*Русский авангард и модернизм*\n"
-            "Пункты, связанные с художниками и архитектурой начала XX века, рождением авангарда и новыми художественными формами.\n\n"
-            "*Советское искусство и соцреализм*\n"
-            "Объекты и музеи, показывающие искусство советского периода: крупные полотна, монументальные композиции и образы города эпохи СССР.\n\n"
-            "*Современное искусство*\n"
-            "Места, где можно увидеть актуальные выставки, креативные кластеры, галереи и уличное искусство сегодняшней Москвы."
-        )
-        if query.message:
-            await query.message.reply_text(
-                text,
-                reply_markup=_guide_classic_keyboard(),
-                parse_mode=ParseMode.MARKDOWN,
-                disable_web_page_preview=True,
-            )
-        return
 
-    if data == "guide:classic":
-        caption = (
-            "*Классика и реализм*\n\n"
-            "1️⃣ Государственная Третьяковская галерея, Лаврушинский переулок\n"
-            "Главное собрание русской классической живописи и реализма XIX – начала XX века, включая передвижников.\n\n"
-            "2️⃣ Новый корпус Третьяковской галереи на Кадашевской набережной (выставка «Передвижники»)\n"
-            "Крупная экспозиция, целиком посвящённая русскому реализму и Товариществу передвижных художественных выставок.\n\n"
-            "3️⃣ Государственный музей изобразительных искусств им. А.С. Пушкина (основное здание)\n"
-            "Европейская классическая живопись и скульптура, старые мастера — важный блок для понимания академической традиции и реалистической школы."
-        )
-        if query.message:
-            if os.path.exists(REALISM_IMAGE_PATH):
-                with open(REALISM_IMAGE_PATH, "rb") as photo:
-                    await query.message.reply_photo(
-                        photo=photo,
-                        caption=caption,
-                        parse_mode=ParseMode.MARKDOWN,
-                        reply_markup=_guide_classic_places_keyboard(),
-                    )
-            else:
-                await query.message.reply_text(
-                    caption,
-                    reply_markup=_guide_classic_places_keyboard(),
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True,
-                )
-        return
+def _format_distance(meters: float) -> str:
+    if meters < 1000:
+        return f"{round(meters, -1):.0f} м"
+    return f"{meters / 1000:.1f} км".replace(".", ",")
+
 
-    if data.startswith("guide:classic:"):
-        slug = data.split(":", 2)[2]
-        detail = GUIDE_CLASSIC_DETAILS.get(slug)
-        if not detail:
-            await query.message.reply_text("Детали маршрута недоступны.")
+async def on_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    content = _content(context)
+    with METRICS.track("location"):
+        location = update.message.location
+        found = content.nearby.nearest(
+            (location.latitude, location.longitude), NEARBY_RESULTS, NEARBY_MAX_DISTANCE_M
+        )
+        if not found:
+            await update.message.reply_text(
+                "Поблизости нет мест из путеводителя.", reply_markup=_back_keyboard()
+            )
             return
-        detail_text = (
-            f"*{detail['title']}*\n\n"
-            f"{detail['desc']}\n"
-            f"Адрес: {detail['address']}\n"
-            f"Сайт: {detail['site']}"
-        )
-        image_path = GUIDE_CLASSIC_IMAGES.get(slug)
-        if image_path and os.path.exists(image_path):
-            with open(image_path, "rb") as photo:
-                await query.message.reply_photo(
-                    photo=photo,
-                    caption=detail_text,
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=_guide_classic_places_keyboard(),
-                )
-        else:
-            await query.message.reply_text(
-                detail_text,
-                parse_mode=ParseMode.MARKDOWN,
-                disable_web_page_preview=True,
-                reply_markup=_guide_classic_places_keyboard(),
+        lines = ["📍 <b>Ближайшие места:</b>", ""]
+        buttons = []
+        for number, (distance, key, _) in enumerate(found, start=1):
+            detail = content.places[key]
+            path, minutes = walking(distance)
+            lines.append(
+                f"{number}. {bold(detail['title'])} — {_format_distance(path)}, ~{minutes} мин пешком\n"
+                f"   {escape(detail['address'])}"
             )
-        return
+            buttons.append([InlineKeyboardButton(f"{number}. {detail['title']}", callback_data=key)])
+        buttons.append([InlineKeyboardButton("⬅️ В меню", callback_data="back")])
+        await update.message.reply_text(
+            "\n".join(lines),
+            reply_markup=InlineKeyboardMarkup(buttons),
+            parse_mode=ParseMode.HTML,
+        )
 
-    if data == "guide:avant":
-        caption = (
-            "*Русский авангард и модернизм*\n\n"
-            "1️⃣ Музей авангарда на Шаболовке (Галерея «На Шаболовке»)\n"
-            "Экспозиция о конструктивизме и Шуховской башне в жилмассиве 1920–1930-х.\n\n"
-            "2️⃣ Пешеходный маршрут «Авангард на Шаболовке»\n"
-            "Дом-коммуна, школа‑«гигант», конструктивистские дома вокруг Шуховской башни.\n\n"
-            "3️⃣ Еврейский музей и Центр толерантности (Центр авангарда)\n"
-            "Выставки русского авангарда с работами мастеров начала XX века.\n\n"
-            "4️⃣ Третьяковская галерея (Новая Третьяковка)\n"
-            "Крупные проекты об авангарде: Кандинский, Малевич, Татлин, Попова и др."
-        )
-        if query.message:
-            if os.path.exists(AVANT_IMAGE_PATH):
-                with open(AVANT_IMAGE_PATH, "rb") as photo:
-                    await query.message.reply_photo(
-                        photo=photo,
-                        caption=caption,
-                        parse_mode=ParseMode.MARKDOWN,
-                        reply_markup=_guide_avant_places_keyboard(),
-                    )
-            else:
-                await query.message.reply_text(
-                    caption,
-                    reply_markup=_guide_avant_places_keyboard(),
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True,
-                )
-        return
 
-    if data.startswith("guide:avant:"):
-        slug = data.split(":", 2)[2]
-        detail = GUIDE_AVANT_DETAILS.get(slug)
-        if not detail:
-            await query.message.reply_text("Детали маршрута недоступны.")
-            return
-        detail_text = (
-            f"*{detail['title']}*\n\n"
-            f"{detail['desc']}\n"
-            f"Адрес: {detail['address']}\n"
-            f"Сайт: {detail['site']}"
-        )
-        image_path = GUIDE_AVANT_IMAGES.get(slug)
-        if image_path and os.path.exists(image_path):
-            with open(image_path, "rb") as photo:
-                await query.message.reply_photo(
-                    photo=photo,
-                    caption=detail_text,
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=_guide_avant_places_keyboard(),
-                )
-        else:
-            await query.message.reply_text(
-                detail_text,
-                parse_mode=ParseMode.MARKDOWN,
-                disable_web_page_preview=True,
-                reply_markup=_guide_avant_places_keyboard(),
-            )
-        return
+def _missing_images(
+    assets: AssetManifest, content: Content, previous: Optional[Content] = None
+) -> List[str]:
+    # При перезагрузке каталога в лог попадают только файлы, которых не хватало в новой версии
+    def missing(version: Content) -> List[str]:
+        return assets.missing(screen.photo for screen in version.screens.screens() if screen.photo)
+
+    known = set(missing(previous)) if previous is not None else set()
+    found = missing(content)
+    for path in found:
+        if path not in known:
+            logger.error("Изображение не найдено: %s", os.path.relpath(path, IMAGES_DIR))
+    return found
+
+
+def load_assets(content: Content) -> AssetManifest:
+    assets = AssetManifest(IMAGES_DIR)
+    assets.load(MANIFEST_PATH)
+    if any(assets.scan()):
+        assets.save(MANIFEST_PATH)
+    logger.info("Манифест изображений: %d файлов, %d байт", len(assets), assets.total_size())
+    missing = _missing_images(assets, content)
+    if missing and os.getenv("STRICT_ASSETS") == "1":
+        raise RuntimeError(f"Не найдено изображений: {len(missing)}")
+    return assets
+
+
+def _log_derivatives(report: BuildReport) -> None:
+    logger.info(
+        "Оптимизация изображений: %d файлов (собрано %d, из кэша %d, ошибок %d), "
+        "%d → %d байт, экономия %d байт (%.0f%%)",
+        report.sources,
+        report.built,
+        report.reused,
+        report.failed,
+        report.original_bytes,
+        report.served_bytes,
+        report.saved_bytes,
+        100 * report.saved_bytes / report.original_bytes if report.original_bytes else 0,
+    )
 
-    if data == "guide:soviet":
-        caption = (
-            "*Советское искусство и соцреализм*\n\n"
-            "1️⃣ Новая Третьяковка (Крымский Вал)\n"
-            "Постоянная экспозиция искусства XX века и проекты по соцреализму.\n\n"
-            "2️⃣ Всероссийский музей декоративного искусства\n"
-            "Показы живописи, скульптуры, предметов быта советского периода.\n\n"
-            "3️⃣ Советские мозаики и панно Москвы\n"
-            "Мозаичная карта: метро, фасады, интерьеры с визуальным кодом эпохи."
-        )
-        if query.message:
-            if os.path.exists(SOVIET_IMAGE_PATH):
-                with open(SOVIET_IMAGE_PATH, "rb") as photo:
-                    await query.message.reply_photo(
-                        photo=photo,
-                        caption=caption,
-                        parse_mode=ParseMode.MARKDOWN,
-                        reply_markup=_guide_soviet_places_keyboard(),
-                    )
-            else:
-                await query.message.reply_text(
-                    caption,
-                    reply_markup=_guide_soviet_places_keyboard(),
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True,
-                )
-        return
 
-    if data.startswith("guide:soviet:"):
-        slug = data.split(":", 2)[2]
-        detail = GUIDE_SOVIET_DETAILS.get(slug)
-        if not detail:
-            await query.message.reply_text("Детали маршрута недоступны.")
-            return
-        detail_text = (
-            f"*{detail['title']}*\n\n"
-            f"{detail['desc']}\n"
-            f"Адрес: {detail['address']}\n"
-            f"Сайт: {detail['site']}"
-        )
-        image_path = GUIDE_SOVIET_IMAGES.get(slug)
-        if image_path and os.path.exists(image_path):
-            with open(image_path, "rb") as photo:
-                await query.message.reply_photo(
-                    photo=photo,
-                    caption=detail_text,
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=_guide_soviet_places_keyboard(),
+async def _refresh_assets(assets: AssetManifest, derivatives: Derivatives) -> None:
+    # Изменения, ещё не сохранённые в снимок манифеста и не пережатые: после ошибки следующий проход повторит
+    pending = False
+    while True:
+        await asyncio.sleep(ASSETS_REFRESH_INTERVAL)
+        try:
+            added, changed, removed = await asyncio.to_thread(assets.scan)
+            if added or changed or removed:
+                logger.info(
+                    "Манифест изображений обновлён: +%d ~%d -%d", added, changed, removed
                 )
-        else:
-            await query.message.reply_text(
-                detail_text,
-                parse_mode=ParseMode.MARKDOWN,
-                disable_web_page_preview=True,
-                reply_markup=_guide_soviet_places_keyboard(),
-            )
-        return
+                pending = True
+            if pending:
+                await asyncio.to_thread(assets.save, MANIFEST_PATH)
+                _log_derivatives(await asyncio.to_thread(derivatives.build))
+                pending = False
+        except Exception:
+            logger.exception("Ошибка при обновлении манифеста изображений")
+
+
+async def _load_albums(application, content: Content) -> None:
+    albums = ArtistAlbums(
+        IMAGES_DIR, content.artists, application.bot_data["assets"], application.bot_data["file_ids"]
+    )
+    await albums.load()
+    application.bot_data["albums"] = albums
 
-    if data == "guide:contemporary":
-        caption = (
-            "*Современное искусство*\n\n"
-            "1️⃣ Московский музей современного искусства (MMOMA)\n"
-            "Первый музей современного искусства в России: несколько площадок, коллекция и крупные выставки.\n\n"
-            "2️⃣ Музей «Гараж» (Парк Горького)\n"
-            "Ключевой центр актуального искусства: международные проекты, перформансы, лекции, фестивали.\n\n"
-            "3️⃣ Мультимедиа Арт Музей, Москва (МАММ)\n"
-            "Семь этажей фото-, видео- и медиаискусства, фокус на современном визуальном языке.\n\n"
-            "4️⃣ Центр современного искусства «Винзавод»\n"
-            "Галереи, мастерские, институт «БАЗА», фестивали и ярмарки в бывшем заводском кластере."
-        )
-        if query.message:
-            if os.path.exists(CONTEMP_IMAGE_PATH):
-                with open(CONTEMP_IMAGE_PATH, "rb") as photo:
-                    await query.message.reply_photo(
-                        photo=photo,
-                        caption=caption,
-                        parse_mode=ParseMode.MARKDOWN,
-                        reply_markup=_guide_contemp_places_keyboard(),
-                    )
-            else:
-                await query.message.reply_text(
-                    caption,
-                    reply_markup=_guide_contemp_places_keyboard(),
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True,
-                )
-        return
 
-    if data.startswith("guide:contemporary:"):
-        slug = data.split(":", 2)[2]
-        detail = GUIDE_CONTEMP_DETAILS.get(slug)
-        if not detail:
-            await query.message.reply_text("Детали маршрута недоступны.")
-            return
-        detail_text = (
-            f"*{detail['title']}*\n\n"
-            f"{detail['desc']}\n"
-            f"Адрес: {detail['address']}\n"
-            f"Сайт: {detail['site']}"
-        )
-        image_path = GUIDE_CONTEMP_IMAGES.get(slug)
-        if image_path and os.path.exists(image_path):
-            with open(image_path, "rb") as photo:
-                await query.message.reply_photo(
-                    photo=photo,
-                    caption=detail_text,
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=_guide_contemp_places_keyboard(),
-                )
-        else:
-            await query.message.reply_text(
-                detail_text,
-                parse_mode=ParseMode.MARKDOWN,
-                disable_web_page_preview=True,
-                reply_markup=_guide_contemp_places_keyboard(),
+async def _on_catalog_reload(application, previous: Content, content: Content) -> None:
+    _missing_images(application.bot_data["assets"], content, previous)
+    if content.artists != application.bot_data["albums"].artists:
+        await _load_albums(application, content)
+
+
+async def _on_startup(application) -> None:
+    assets = application.bot_data["assets"]
+    await _load_albums(application, application.bot_data["catalog"].current)
+    application.bot_data["assets_refresh"] = asyncio.create_task(
+        _refresh_assets(assets, application.bot_data["derivatives"])
+    )
+    application.bot_data["catalog_watch"] = asyncio.create_task(
+        application.bot_data["catalog"].watch(functools.partial(_on_catalog_reload, application))
+    )
+    if METRICS_PORT:
+        await METRICS.serve(METRICS_HOST, METRICS_PORT)
+    audience = application.bot_data["audience"]
+    application.job_queue.run_repeating(audience.flush_job, STATE_FLUSH_INTERVAL, name="audience:flush")
+    broadcaster = application.bot_data["broadcaster"]
+    if broadcaster.runner:
+        # Рассылки, прерванные остановкой, продолжаются с последней записанной позиции
+        await broadcaster.resume(application.job_queue)
+        if IS_WORKER:
+            application.job_queue.run_repeating(
+                broadcaster.pickup_job, BROADCAST_PICKUP_INTERVAL, name="broadcast:pickup"
             )
-        return
+    # Обработчики за фронтом очередь простоя не разбирают: её доставит webhook
+    if not DROP_PENDING_UPDATES and not IS_WORKER:
+        backlog = application.bot_data["backlog"]
+        if await backlog.drain(application.bot, ALLOWED_UPDATES):
+            processor = application.update_processor
+            application.bot_data["backlog_feed"] = asyncio.create_task(
+                backlog.feed(application.update_queue, lambda: processor.saturated)
+            )
+        if backlog.received:
+            logger.info("Очередь после простоя: %s", backlog.stats())
+
+
+async def _on_shutdown(application) -> None:
+    application.bot_data["assets_refresh"].cancel()
+    application.bot_data["catalog_watch"].cancel()
+    if "backlog_feed" in application.bot_data:
+        application.bot_data["backlog_feed"].cancel()
+        logger.info("Очередь после простоя: %s", application.bot_data["backlog"].stats())
+    await METRICS.close()
+    file_ids = application.bot_data["file_ids"]
+    logger.info("Кэш file_id: %s", file_ids.stats())
+    logger.info("Кэш содержимого фото: %s", file_ids.contents.stats())
+    logger.info("Очередь отправки: %s", application.bot.rate_limiter.stats())
+    logger.info("Состояние пользователей: %s", application.persistence.stats())
+    await application.bot_data["audience"].close()
+    if LOG_HANDLER.dropped:
+        logger.warning("Отброшено записей лога: %d", LOG_HANDLER.dropped)
+    file_ids.close()
+
+
+def build_application(token: str) -> Application:
+    builder = ApplicationBuilder().token(token)
+    # Для локальных прогонов против поддельного Bot API
+    api_url = os.getenv("BOT_API_URL")
+    if api_url:
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+    transport = Transport.from_env(METRICS)
+    scheduler = SendScheduler(
+        overall_rate=SEND_RATE_OVERALL,
+        chat_rate=float(os.getenv("SEND_RATE_PER_CHAT", "1")),
+    )
+    application = (
+        builder.request(InstrumentedRequest(transport.messages, METRICS))
+        .get_updates_request(InstrumentedRequest(transport.updates, METRICS))
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .rate_limiter(scheduler)
+        .persistence(
+            SQLiteUserState(
+                STATE_DB_PATH, STATE_FLUSH_INTERVAL, shard=(WORKER_INDEX, WORKERS) if IS_WORKER else None
+            )
+        )
+        .context_types(ContextTypes(user_data=UserState))
+        .post_init(_on_startup)
+        .post_shutdown(_on_shutdown)
+        .build()
+    )
 
-    if data.startswith("artist:"):
-        artist = data.split(":", 1)[1]
-        meta = ARTIST_DIR_MAP.get(artist)
-        if not meta:
-            await query.message.reply_text("Автор не найден.")
-            return
-        base_dir = os.path.join(os.path.dirname(__file__), "images", meta["dir"])
-        if not os.path.isdir(base_dir):
-            await query.message.reply_text("Изображения не найдены для этого автора.")
-            return
-        files = [os.path.join(base_dir, f"{i}.jpg") for i in range(1, 5)]
-        # Некоторые файлы могут быть .jpeg — подменяем при отсутствии .jpg
-        resolved_files = []
-        for path in files:
-            if os.path.exists(path):
-                resolved_files.append(path)
-            else:
-                alt = path[:-4] + ".jpeg"
-                if os.path.exists(alt):
-                    resolved_files.append(alt)
-        if not resolved_files:
-            await query.message.reply_text("Изображения не найдены для этого автора.")
-            return
-        media = [
-            InputMediaPhoto(
-                media=open(fp, "rb"),
-                caption=f"Работы {meta['title_gen']}",
+    if application.job_queue is None:
+        raise RuntimeError("Для рассылок нужен python-telegram-bot[job-queue].")
+
+    # Каталог с ошибкой при старте — фатален; при перезагрузке он только отклоняется
+    catalog = CatalogWatcher(CATALOG_PATH, compile_content, CATALOG_RELOAD_INTERVAL)
+    assets = load_assets(catalog.current)
+    derivatives = Derivatives(assets)
+    _log_derivatives(derivatives.build())
+    application.bot_data["assets"] = assets
+    application.bot_data["derivatives"] = derivatives
+    file_ids = FileIdCache(manifest=assets, derivatives=derivatives)
+    application.bot_data["file_ids"] = file_ids
+    contents = file_ids.contents
+    METRICS.add(
+        Collected(
+            "bot_asset_cache_hits_total",
+            "Загрузки фото, содержимое которых взято из памяти",
+            "counter",
+            lambda: contents.hits,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_asset_cache_misses_total",
+            "Загрузки фото, для которых файл читался с диска",
+            "counter",
+            lambda: contents.misses,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_asset_cache_hit_ratio",
+            "Доля загрузок фото из памяти с запуска",
+            "gauge",
+            lambda: contents.hit_ratio,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_asset_cache_resident_bytes",
+            "Объём содержимого фото в памяти",
+            "gauge",
+            lambda: contents.resident,
+        )
+    )
+    application.bot_data["presses"] = CallbackDeduplicator(CALLBACK_DEDUP_WINDOW)
+    application.bot_data["catalog"] = catalog
+    backlog = Backlog(BACKLOG_MAX_AGE, BACKLOG_RATE)
+    application.bot_data["backlog"] = backlog
+    METRICS.add(
+        Collected(
+            "bot_backlog_expired_total",
+            "Обновления из очереди простоя, отброшенные как устаревшие",
+            "counter",
+            lambda: backlog.expired,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_backlog_merged_total",
+            "Нажатия из очереди простоя, вытесненные более поздним нажатием или свежим обновлением чата",
+            "counter",
+            lambda: backlog.merged + backlog.superseded,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_backlog_pending",
+            "Обновления из очереди простоя, ждущие обработки",
+            "gauge",
+            lambda: backlog.pending,
+        )
+    )
+
+    audience = Audience(STATE_DB_PATH)
+    broadcaster = Broadcaster(audience, BROADCAST_RATE, BROADCAST_CHUNK, runner=WORKER_INDEX == 0)
+    application.bot_data["audience"] = audience
+    application.bot_data["broadcaster"] = broadcaster
+    METRICS.add(
+        Collected(
+            "bot_broadcast_sent_total",
+            "Сообщения рассылок, доставленные получателям",
+            "counter",
+            lambda: broadcaster.sent,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_broadcast_blocked_total",
+            "Получатели рассылок, заблокировавшие бота или удалившие аккаунт",
+            "counter",
+            lambda: broadcaster.blocked,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_broadcasts_active",
+            "Рассылки, идущие сейчас",
+            "gauge",
+            lambda: broadcaster.active,
+        )
+    )
+    state = application.persistence
+    METRICS.add(
+        Collected(
+            "bot_state_pending",
+            "Записи состояния пользователей, ждущие записи на диск",
+            "gauge",
+            lambda: state.pending,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_state_rows_written_total",
+            "Записи состояния пользователей, записанные в SQLite",
+            "counter",
+            lambda: state.rows_written,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_state_flush_seconds",
+            "Длительность последней записи пачки состояния",
+            "gauge",
+            lambda: state.last_flush_seconds,
+        )
+    )
+
+    METRICS.add(
+        Collected(
+            "bot_send_queue_depth",
+            "Отправки, ждущие токена из общего бюджета сообщений",
+            "gauge",
+            lambda: scheduler.queue_depth,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_send_waiting_for_chat",
+            "Отправки, ждущие бюджета своего чата",
+            "gauge",
+            lambda: scheduler.waiting_for_chat,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_send_requests_total",
+            "Запросы к Bot API через очередь отправки",
+            "counter",
+            lambda: scheduler.requests,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_send_wait_seconds_total",
+            "Суммарное ожидание отправок в очереди",
+            "counter",
+            lambda: scheduler.wait_total,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_send_wait_max_seconds",
+            "Самое долгое ожидание отправки в очереди с запуска",
+            "gauge",
+            lambda: scheduler.wait_max,
+        )
+    )
+    METRICS.add(
+        Collected(
+            "bot_send_retries_total",
+            "Повторы отправок после RetryAfter",
+            "counter",
+            lambda: scheduler.retries,
+        )
+    )
+
+    METRICS.add(
+        CollectedByLabel(
+            "bot_http_connections_in_use",
+            "Занятые соединения по пулу",
+            "gauge",
+            "pool",
+            lambda: {pool.name: pool.in_use for pool in transport.pools()},
+        )
+    )
+    METRICS.add(
+        CollectedByLabel(
+            "bot_http_pool_waiting",
+            "Запросы, ждущие свободного соединения, по пулу",
+            "gauge",
+            "pool",
+            lambda: {pool.name: pool.waiting for pool in transport.pools()},
+        )
+    )
+
+    application.add_handler(TypeHandler(Update, note_fresh_update), group=-2)
+    application.add_handler(TypeHandler(Update, bind_log_context), group=-1)
+    application.add_handler(CommandHandler("start", handle_start))
+    application.add_handler(CommandHandler("help", handle_help))
+    if ADMIN_IDS:
+        admins = filters.User(user_id=ADMIN_IDS)
+        application.add_handler(CommandHandler("broadcast", handle_broadcast, filters=admins))
+        application.add_handler(CommandHandler("broadcast_stop", handle_broadcast_stop, filters=admins))
+        application.add_handler(
+            MessageHandler(
+                filters.PHOTO & filters.CaptionRegex(r"^/broadcast(@\w+)?(\s|$)") & admins, handle_broadcast
             )
-            if idx == 0
-            else InputMediaPhoto(media=open(fp, "rb"))
-            for idx, fp in enumerate(resolved_files)
-        ]
-        await query.message.reply_media_group(media=media)
-        await query.message.reply_text(
-            "Выберите другого автора или вернитесь в меню.",
-            reply_markup=_artist_keyboard(),
         )
-        return
+    application.add_handler(CallbackQueryHandler(on_callback))
+    application.add_handler(InlineQueryHandler(on_inline_query))
+    application.add_handler(MessageHandler(filters.LOCATION, on_location))
+    return application
+
+
+def _webhook_settings() -> Tuple[str, int, str, str, str]:
+    public_url = os.getenv("WEBHOOK_URL")
+    if not public_url:
+        raise RuntimeError(f"Для BOT_MODE={BOT_MODE} нужна переменная окружения WEBHOOK_URL.")
+    url_path = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+    secret = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    return (
+        os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+        int(os.getenv("WEBHOOK_PORT", "8443")),
+        url_path,
+        f"{public_url.rstrip('/')}/{url_path}",
+        secret,
+    )
 
 
-    if data == "authors":
-        text = "*Авторы*\n\nМанин Андрей БИБ254\n\nИбрагимова Афина БИТ252"
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(
-                [[InlineKeyboardButton("⬅️ В меню", callback_data="back")]]
-            ),
-            parse_mode=ParseMode.MARKDOWN,
-            disable_web_page_preview=True,
+def run(application: Application) -> None:
+    if BOT_MODE == "polling":
+        # start_polling сам снимает ранее установленный webhook
+        logger.info("Бот запущен в режиме polling. Нажмите Ctrl+C для остановки.")
+        application.run_polling(
+            allowed_updates=ALLOWED_UPDATES, drop_pending_updates=DROP_PENDING_UPDATES
+        )
+    elif BOT_MODE == "webhook":
+        listen, port, url_path, webhook_url, secret = _webhook_settings()
+        logger.info("Бот запущен в режиме webhook: %s", webhook_url)
+        application.run_webhook(
+            listen=listen,
+            port=port,
+            url_path=url_path,
+            webhook_url=webhook_url,
+            secret_token=secret,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=DROP_PENDING_UPDATES,
+        )
+    elif BOT_MODE == "worker":
+        asyncio.run(serve_worker(application, os.environ["BOT_WORKER_SOCKET"]))
+    else:
+        raise RuntimeError(
+            f"Неизвестный BOT_MODE: {BOT_MODE} (ожидается polling, webhook или workers)."
         )
-        return
 
-    await query.edit_message_text(
-        "Неизвестное действие. Вернитесь в меню.",
-        reply_markup=build_main_keyboard(),
-        disable_web_page_preview=True,
+
+def run_workers(token: str) -> None:
+    listen, port, url_path, webhook_url, secret = _webhook_settings()
+    # Каталог проверяется, изображения хэшируются и пережимаются один раз, до запуска обработчиков:
+    # те находят снимок манифеста и готовые копии на диске, а file_id берут из общей базы
+    catalog = CatalogWatcher(CATALOG_PATH, compile_content, CATALOG_RELOAD_INTERVAL)
+    _log_derivatives(Derivatives(load_assets(catalog.current)).build())
+    api_url = os.getenv("BOT_API_URL")
+    if api_url:
+        bot = Bot(token, base_url=f"{api_url}/bot", base_file_url=f"{api_url}/file/bot")
+    else:
+        bot = Bot(token)
+    pool = WorkerPool(WORKERS, [sys.executable, os.path.abspath(__file__)])
+    logger.info("Бот запущен в режиме workers: %d обработчиков, %s", WORKERS, webhook_url)
+    clean = asyncio.run(
+        serve_front(
+            bot,
+            pool,
+            listen,
+            port,
+            url_path,
+            webhook_url,
+            secret,
+            ALLOWED_UPDATES,
+            DROP_PENDING_UPDATES,
+        )
     )
+    if not clean:
+        raise RuntimeError("Обработчик завершился аварийно.")
 
 
 def main() -> None:
@@ -786,18 +1295,11 @@ def main() -> None:
     if not token:
         raise RuntimeError("Переменная окружения BOT_TOKEN не установлена.")
 
-    application = ApplicationBuilder().token(token).build()
-
-    application.add_handler(CommandHandler("start", handle_start))
-    application.add_handler(CommandHandler("help", handle_help))
-    application.add_handler(CallbackQueryHandler(on_callback))
-
-    logger.info("Бот запущен. Нажмите Ctrl+C для остановки.")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == "workers":
+        run_workers(token)
+    else:
+        run(build_application(token))
 
 
 if __name__ == "__main__":
     main()
-
-
-
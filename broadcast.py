@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, TelegramError
+from telegram.ext import ContextTypes, JobQueue
+
+from rate_limit import PRIORITY_BULK
+from state import STATE_DB_PATH
+
+# Рассылка объявлений всем, кто нажимал /start. Получатели читаются из базы страницами по chat_id,
+# каждая страница — отдельное задание JobQueue; после неё в базу пишется позиция и счётчики,
+# так что после перезапуска рассылка продолжается со следующей страницы. Кто заблокировал бота
+# или удалил аккаунт, помечается и в следующие рассылки не попадает, пока снова не нажмёт /start.
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Рассылка идёт в общем бюджете отправок с самым низким приоритетом
+_BULK = {"priority": PRIORITY_BULK}
+
+
+class Audience:
+    # Подписчики и рассылки лежат в той же базе, что и состояние пользователей; соединение
+    # используется только из рабочих потоков и только под self._lock
+    def __init__(self, db_path: str = STATE_DB_PATH) -> None:
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        # chat_id → время /start, ещё не записанные в базу
+        self._started: Dict[int, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS subscribers ("
+                    "chat_id INTEGER PRIMARY KEY, started REAL NOT NULL, blocked REAL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS broadcasts ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, photo TEXT, file_id TEXT, "
+                    "owner INTEGER, status TEXT NOT NULL, cursor INTEGER NOT NULL DEFAULT 0, "
+                    "total INTEGER NOT NULL, sent INTEGER NOT NULL DEFAULT 0, "
+                    "blocked INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, "
+                    "created REAL NOT NULL, finished REAL)"
+                )
+                if "subscribers" not in tables and "user_state" in tables:
+                    # Реестра раньше не было: подписчиками считаются все, у кого уже есть сохранённое состояние
+                    conn.execute(
+                        "INSERT OR IGNORE INTO subscribers (chat_id, started) "
+                        "SELECT user_id, updated FROM user_state"
+                    )
+            self._conn = conn
+        return self._conn
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        async with self._lock:
+            return await asyncio.to_thread(lambda: fn(self._connect(), *args))
+
+    def subscribe(self, chat_id: int) -> None:
+        self._started.setdefault(chat_id, time.time())
+
+    async def flush(self) -> None:
+        if not self._started:
+            return
+        batch, self._started = self._started, {}
+        try:
+            await self.run(_add_subscribers, batch)
+        except sqlite3.Error as exc:
+            for chat_id, started in batch.items():
+                self._started.setdefault(chat_id, started)
+            logger.error("Не удалось записать %d подписчиков: %s", len(batch), exc)
+
+    async def flush_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self.flush()
+
+    async def count(self) -> int:
+        await self.flush()
+        return await self.run(_count_subscribers)
+
+    async def close(self) -> None:
+        await self.flush()
+        async with self._lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+
+def _add_subscribers(conn: sqlite3.Connection, batch: Dict[int, float]) -> None:
+    with conn:
+        # Повторный /start возвращает в рассылку того, кто раньше блокировал бота
+        conn.executemany(
+            "INSERT INTO subscribers (chat_id, started) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET blocked = NULL",
+            list(batch.items()),
+        )
+
+
+def _count_subscribers(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COUNT(*) FROM subscribers WHERE blocked IS NULL").fetchone()[0]
+
+
+def _page(conn: sqlite3.Connection, after: int, limit: int) -> List[int]:
+    return [
+        chat_id
+        for (chat_id,) in conn.execute(
+            "SELECT chat_id FROM subscribers WHERE blocked IS NULL AND chat_id > ? ORDER BY chat_id LIMIT ?",
+            (after, limit),
+        )
+    ]
+
+
+@dataclass
+class Progress:
+    id: int
+    text: str
+    photo: Optional[str]
+    file_id: Optional[str]
+    owner: Optional[int]
+    cursor: int
+    total: int
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"доставлено {self.sent} из {self.total}, заблокировали бота {self.blocked}, "
+            f"не доставлено из-за ошибок {self.failed}"
+        )
+
+
+_PROGRESS_COLUMNS = "id, text, photo, file_id, owner, cursor, total, sent, blocked, failed"
+
+
+def _create(
+    conn: sqlite3.Connection, text: str, photo: Optional[str], file_id: Optional[str], owner: Optional[int]
+) -> Progress:
+    total = _count_subscribers(conn)
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO broadcasts (text, photo, file_id, owner, status, total, created) "
+            "VALUES (?, ?, ?, ?, 'running', ?, ?)",
+            (text, photo, file_id, owner, total, time.time()),
+        )
+    return Progress(cursor.lastrowid, text, photo, file_id, owner, 0, total)
+
+
+def _running(conn: sqlite3.Connection) -> List[Progress]:
+    rows = conn.execute(f"SELECT {_PROGRESS_COLUMNS} FROM broadcasts WHERE status = 'running' ORDER BY id")
+    return [Progress(*row) for row in rows]
+
+
+def _recent(conn: sqlite3.Connection, limit: int) -> List[Tuple[Progress, str]]:
+    rows = conn.execute(
+        f"SELECT {_PROGRESS_COLUMNS}, status FROM broadcasts ORDER BY id DESC LIMIT ?", (limit,)
+    )
+    return [(Progress(*row[:-1]), row[-1]) for row in rows]
+
+
+def _checkpoint(conn: sqlite3.Connection, progress: Progress, blocked: List[int]) -> bool:
+    # False — рассылку тем временем остановили (возможно, из другого процесса)
+    now = time.time()
+    with conn:
+        conn.execute(
+            "UPDATE broadcasts SET cursor = ?, file_id = ?, sent = ?, blocked = ?, failed = ? WHERE id = ?",
+            (progress.cursor, progress.file_id, progress.sent, progress.blocked, progress.failed, progress.id),
+        )
+        conn.executemany(
+            "UPDATE subscribers SET blocked = ? WHERE chat_id = ?", [(now, chat_id) for chat_id in blocked]
+        )
+        (status,) = conn.execute("SELECT status FROM broadcasts WHERE id = ?", (progress.id,)).fetchone()
+    return status == "running"
+
+
+def _finish(conn: sqlite3.Connection, broadcast_id: int, status: str) -> bool:
+    with conn:
+        cursor = conn.execute(
+            "UPDATE broadcasts SET status = ?, finished = ? WHERE id = ? AND status = 'running'",
+            (status, time.time(), broadcast_id),
+        )
+    return cursor.rowcount > 0
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def _blocked_by_user(exc: TelegramError) -> bool:
+    # Forbidden: «bot was blocked by the user», «user is deactivated»; чат мог исчезнуть совсем
+    return isinstance(exc, Forbidden) or "chat not found" in exc.message.lower()
+
+
+class Broadcaster:
+    def __init__(self, audience: Audience, rate: float = 25, chunk: int = 50, runner: bool = True) -> None:
+        self.audience = audience
+        self.rate = rate
+        self.chunk = chunk
+        # При нескольких процессах-обработчиках рассылки отправляет только один из них: остальные
+        # записывают новую рассылку в базу, а он подхватывает её через pickup_job
+        self.runner = runner
+        self._active: Dict[int, Progress] = {}
+        # Темп общий для всех идущих рассылок
+        self._next_at = 0.0
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+
+    async def start(
+        self, job_queue: JobQueue, text: str, photo: Optional[str] = None, owner: Optional[int] = None
+    ) -> Progress:
+        # photo — file_id уже загруженного в Telegram фото или путь к файлу: тогда он загрузится
+        # один раз, первому получателю, и дальше рассылка пойдёт по полученному file_id
+        await self.audience.flush()
+        file_id = photo if photo and not await asyncio.to_thread(os.path.isfile, photo) else None
+        progress = await self.audience.run(_create, text, photo, file_id, owner)
+        logger.info("Рассылка #%d запущена: %d получателей", progress.id, progress.total)
+        if self.runner:
+            self._schedule(job_queue, progress)
+        return progress
+
+    async def resume(self, job_queue: JobQueue) -> List[Progress]:
+        # Идущие по базе рассылки, которые этот процесс ещё не отправляет: прерванные остановкой
+        # или запущенные другим процессом
+        picked = [progress for progress in await self.audience.run(_running) if progress.id not in self._active]
+        for progress in picked:
+            logger.info("Рассылка #%d продолжается: %s", progress.id, progress.summary())
+            self._schedule(job_queue, progress)
+        return picked
+
+    async def pickup_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self.resume(context.job_queue)
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        # Через базу: рассылку может отправлять другой процесс, он заметит остановку на следующей странице
+        self._active.pop(broadcast_id, None)
+        if not await self.audience.run(_finish, broadcast_id, "cancelled"):
+            return False
+        logger.info("Рассылка #%d остановлена", broadcast_id)
+        return True
+
+    async def recent(self, limit: int = 5) -> List[Tuple[Progress, str]]:
+        return await self.audience.run(_recent, limit)
+
+    def _schedule(self, job_queue: JobQueue, progress: Progress) -> None:
+        self._active[progress.id] = progress
+        job_queue.run_once(self._chunk_job, 0, data=progress.id, name=f"broadcast:{progress.id}")
+
+    async def _chunk_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        progress = self._active.get(context.job.data)
+        if progress is None:
+            return
+        chat_ids = await self.audience.run(_page, progress.cursor, self.chunk)
+        if not chat_ids:
+            await self._complete(context.bot, progress)
+            return
+        content = None
+        if progress.photo and not progress.file_id:
+            # Файл читается в потоке и один раз на страницу; пропал или не читается — рассылка
+            # останавливается, иначе она так и висела бы в «running»
+            try:
+                content = await asyncio.to_thread(_read, progress.photo)
+            except OSError as exc:
+                await self._fail(context.bot, progress, f"не удалось прочитать фото: {exc}")
+                return
+        blocked = await self._send_chunk(context.bot, progress, chat_ids, content)
+        progress.cursor = chat_ids[-1]
+        if not await self.audience.run(_checkpoint, progress, blocked):
+            self._active.pop(progress.id, None)
+            return
+        # При остановке бота PTB дожидается текущей страницы, а следующую уже не ставим:
+        # после перезапуска рассылка продолжится с неё
+        if progress.id in self._active and context.application.running:
+            context.job_queue.run_once(self._chunk_job, 0, data=progress.id, name=context.job.name)
+
+    async def _send_chunk(
+        self, bot: Bot, progress: Progress, chat_ids: List[int], content: Optional[bytes] = None
+    ) -> List[int]:
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate if self.rate > 0 else 0
+        sends = []
+        for chat_id in chat_ids:
+            # Ровный темп без накопления погрешности sleep
+            now = loop.time()
+            self._next_at = max(self._next_at, now)
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+            self._next_at += interval
+            uploading = progress.photo is not None and progress.file_id is None
+            sends.append(asyncio.ensure_future(self._deliver(bot, progress, chat_id, content)))
+            if uploading:
+                # Пока file_id нет, фото загружается — и только одному получателю за раз
+                await sends[-1]
+        outcomes = await asyncio.gather(*sends)
+        blocked = [chat_id for chat_id, outcome in zip(chat_ids, outcomes) if outcome == "blocked"]
+        sent = outcomes.count("sent")
+        progress.sent += sent
+        progress.blocked += len(blocked)
+        progress.failed += len(outcomes) - sent - len(blocked)
+        self.sent += sent
+        self.blocked += len(blocked)
+        self.failed += len(outcomes) - sent - len(blocked)
+        return blocked
+
+    async def _deliver(self, bot: Bot, progress: Progress, chat_id: int, content: Optional[bytes] = None) -> str:
+        try:
+            if not progress.photo:
+                await bot.send_message(
+                    chat_id,
+                    progress.text,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True,
+                    rate_limit_args=_BULK,
+                )
+            elif progress.file_id:
+                await bot.send_photo(
+                    chat_id,
+                    progress.file_id,
+                    caption=progress.text,
+                    parse_mode=ParseMode.HTML,
+                    rate_limit_args=_BULK,
+                )
+            else:
+                message = await bot.send_photo(
+                    chat_id,
+                    content,
+                    filename=os.path.basename(progress.photo),
+                    caption=progress.text,
+                    parse_mode=ParseMode.HTML,
+                    rate_limit_args=_BULK,
+                )
+                progress.file_id = message.photo[-1].file_id
+        except (Forbidden, BadRequest) as exc:
+            if _blocked_by_user(exc):
+                return "blocked"
+            logger.warning("Рассылка #%d, чат %d: %s", progress.id, chat_id, exc.message)
+            return "failed"
+        except TelegramError as exc:
+            # RetryAfter сверх числа повторов, таймауты и сеть: получатель пропускается
+            logger.warning("Рассылка #%d, чат %d: %s", progress.id, chat_id, exc)
+            return "failed"
+        return "sent"
+
+    async def _complete(self, bot: Bot, progress: Progress) -> None:
+        self._active.pop(progress.id, None)
+        await self.audience.run(_finish, progress.id, "done")
+        logger.info("Рассылка #%d завершена: %s", progress.id, progress.summary())
+        await self._notify(bot, progress, f"Рассылка #{progress.id} завершена: {progress.summary()}.")
+
+    async def _fail(self, bot: Bot, progress: Progress, reason: str) -> None:
+        self._active.pop(progress.id, None)
+        await self.audience.run(_finish, progress.id, "failed")
+        logger.error("Рассылка #%d остановлена: %s", progress.id, reason)
+        await self._notify(bot, progress, f"Рассылка #{progress.id} остановлена ({reason}): {progress.summary()}.")
+
+    async def _notify(self, bot: Bot, progress: Progress, text: str) -> None:
+        if progress.owner is None:
+            return
+        try:
+            await bot.send_message(progress.owner, text)
+        except TelegramError as exc:
+            logger.warning("Не удалось сообщить о рассылке #%d: %s", progress.id, exc)
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+# Контент бота (тексты, авторы, разделы путеводителя и места) живёт в JSON-файле.
+# Файл проверяется по схеме и собирается в неизменяемый объект; при изменении файла
+# новая версия собирается в отдельном потоке и подменяет старую одним присваиванием.
+# Файл с ошибкой отклоняется целиком — работает прежняя версия.
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TEXT_KEYS = ("start", "help", "info_moscow", "artists", "guide", "authors")
+
+_SLUG_RE = re.compile(r"[a-z0-9_]+")
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def _check(condition: bool, where: str, problem: str) -> None:
+    if not condition:
+        raise CatalogError(f"{where}: {problem}")
+
+
+def _text(obj: Dict[str, Any], key: str, where: str) -> str:
+    value = obj.get(key)
+    _check(isinstance(value, str) and value.strip() != "", f"{where}.{key}", "нужна непустая строка")
+    return value
+
+
+def _object(value: Any, where: str, keys: Tuple[str, ...]) -> Dict[str, Any]:
+    _check(isinstance(value, dict), where, "нужен объект")
+    unknown = sorted(set(value) - set(keys))
+    _check(not unknown, where, f"неизвестные поля: {', '.join(unknown)}")
+    return value
+
+
+def _list(value: Any, where: str) -> List[Any]:
+    _check(isinstance(value, list) and len(value) > 0, where, "нужен непустой список")
+    return value
+
+
+def _slugs(items: List[Dict[str, Any]], where: str) -> None:
+    seen = set()
+    for i, item in enumerate(items):
+        slug = _text(item, "slug", f"{where}[{i}]")
+        _check(_SLUG_RE.fullmatch(slug) is not None, f"{where}[{i}].slug", "только a-z, 0-9 и _")
+        _check(slug not in seen, f"{where}[{i}].slug", f"повторяется «{slug}»")
+        seen.add(slug)
+
+
+def _image(obj: Dict[str, Any], key: str, where: str, required: bool) -> None:
+    if not required and obj.get(key) is None:
+        return
+    path = _text(obj, key, where)
+    # Пути — относительно images/ и не выходят за его пределы
+    normalized = os.path.normpath(path)
+    _check(
+        not os.path.isabs(path) and not normalized.startswith(".."),
+        f"{where}.{key}",
+        "путь должен быть внутри images/",
+    )
+
+
+def _place(place: Any, where: str) -> None:
+    _object(
+        place,
+        where,
+        ("slug", "button", "title", "desc", "site", "address", "location", "image"),
+    )
+    for key in ("button", "title", "desc", "address"):
+        _text(place, key, where)
+    _check(
+        _text(place, "site", where).startswith(("https://", "http://")),
+        f"{where}.site",
+        "нужен адрес http(s)://",
+    )
+    location = place.get("location")
+    if location is not None:
+        _check(
+            isinstance(location, list)
+            and len(location) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in location)
+            and -90 <= location[0] <= 90
+            and -180 <= location[1] <= 180,
+            f"{where}.location",
+            "нужна пара [широта, долгота]",
+        )
+    _image(place, "image", where, required=False)
+
+
+def validate(data: Any) -> Dict[str, Any]:
+    _object(data, "catalog", ("texts", "artists", "guide"))
+    texts = _object(data.get("texts"), "texts", TEXT_KEYS)
+    for key in TEXT_KEYS:
+        _text(texts, key, "texts")
+
+    artists = _list(data.get("artists"), "artists")
+    for i, artist in enumerate(artists):
+        _object(artist, f"artists[{i}]", ("slug", "dir", "title", "title_gen"))
+        for key in ("dir", "title", "title_gen"):
+            _text(artist, key, f"artists[{i}]")
+    _slugs(artists, "artists")
+
+    sections = _list(data.get("guide"), "guide")
+    for i, section in enumerate(sections):
+        where = f"guide[{i}]"
+        _object(section, where, ("slug", "button", "cover", "caption", "places"))
+        _text(section, "button", where)
+        _text(section, "caption", where)
+        _image(section, "cover", where, required=True)
+        places = _list(section.get("places"), f"{where}.places")
+        for j, place in enumerate(places):
+            _place(place, f"{where}.places[{j}]")
+        _slugs(places, f"{where}.places")
+    _slugs(sections, "guide")
+    return data
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as fh:
+        try:
+            data = json.load(fh)
+        except json.JSONDecodeError as exc:
+            raise CatalogError(f"{os.path.basename(path)}: некорректный JSON: {exc}") from exc
+    return validate(data)
+
+
+def _signature(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class CatalogWatcher(Generic[T]):
+    # compile превращает проверенный словарь в готовый к работе объект (экраны, маршрутизатор, индексы)
+    # и вызывается вне event loop; ошибка сборки отклоняет версию так же, как ошибка схемы.
+    def __init__(self, path: str, compile: Callable[[Dict[str, Any]], T], interval: float = 2.0) -> None:
+        self.path = path
+        self.interval = interval
+        self._compile = compile
+        self._signature = _signature(path)
+        self.current: T = compile(load(path))
+        self.version = 1
+        self.reloads = 0
+        self.rejected = 0
+
+    def _build(self) -> Optional[T]:
+        signature = _signature(self.path)
+        if signature == self._signature:
+            return None
+        # Запоминаем и отклонённую версию, чтобы не разбирать её повторно на каждом опросе
+        self._signature = signature
+        return self._compile(load(self.path))
+
+    async def poll(self) -> Optional[T]:
+        try:
+            compiled = await asyncio.to_thread(self._build)
+        except (OSError, ValueError, RuntimeError) as exc:
+            self.rejected += 1
+            logger.error("Каталог %s отклонён, остаётся версия %d: %s", self.path, self.version, exc)
+            return None
+        if compiled is None:
+            return None
+        # Обработчики берут self.current один раз на обновление, так что подмена атомарна для них
+        self.current = compiled
+        self.version += 1
+        self.reloads += 1
+        logger.info("Каталог %s перезагружен, версия %d", self.path, self.version)
+        return compiled
+
+    async def watch(self, on_reload: Optional[Callable[[T, T], Any]] = None) -> None:
+        # on_reload(прежняя версия, новая) — для того, что зависит от контента вне самого каталога
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                previous = self.current
+                compiled = await self.poll()
+                if compiled is not None and on_reload is not None:
+                    await on_reload(previous, compiled)
+            except Exception:
+                # Ошибка одной перезагрузки не должна останавливать наблюдение до конца работы процесса
+                logger.exception("Ошибка при перезагрузке каталога %s, версия %d", self.path, self.version)
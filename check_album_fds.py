@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from fake_bot_api import FakeBotAPI
+from loadtest import build_bot, start_bot, stop_bot
+
+# 1000 нажатий artist:plavinskiy: альбом загружается в Telegram один раз (параллельные нажатия ждут одну
+# загрузку), дальше уходит по file_id, а число открытых файловых дескрипторов процесса не растёт.
+#   python check_album_fds.py
+
+USERS = 50
+ROUNDS = 20
+ARTIST = "artist:plavinskiy"
+
+
+def _open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+async def run() -> Dict[str, Any]:
+    api = FakeBotAPI(latency=0.01)
+    await api.start()
+    generator = build_bot(api, {"SEND_RATE_OVERALL": "100000", "SEND_RATE_PER_CHAT": "100000"})
+    await start_bot(generator.application)
+    users = range(100_000, 100_000 + USERS)
+    await asyncio.gather(*(generator.start(user_id) for user_id in users))
+    fds: List[int] = []
+    for _ in range(ROUNDS):
+        # Все пользователи жмут одновременно; следующее нажатие — на новом экране под альбомом
+        await asyncio.gather(*(generator.tap(user_id, ARTIST) for user_id in users))
+        fds.append(_open_fds())
+    await stop_bot(generator.application)
+    await api.stop()
+    return {
+        "taps": USERS * ROUNDS,
+        "albums_sent": api.calls["sendMediaGroup"],
+        "album_uploads": api.uploads["sendMediaGroup"],
+        # Первый раунд открывает соединения пулов, дальше их число не меняется
+        "fds_after_first_round": fds[0],
+        "fds_max": max(fds[1:]),
+        "fds_last": fds[-1],
+    }
+
+
+def main() -> None:
+    report = asyncio.run(run())
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    problems = []
+    if report["albums_sent"] != report["taps"]:
+        problems.append("альбом отправлен не на каждое нажатие")
+    if report["album_uploads"] != 1:
+        problems.append("альбом загружался больше одного раза")
+    if report["fds_max"] > report["fds_after_first_round"]:
+        problems.append("число открытых дескрипторов растёт")
+    if problems:
+        sys.exit("; ".join(problems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import json
+import sys
+import time
+from typing import Any, Dict, Set
+
+from loadtest import build_backlog, run_subprocess
+
+# Запуск после простоя: до старта бота в поддельный Bot API кладётся очередь из 10 000 обновлений
+# (build_backlog), и бот стартует вместе со свежими пользователями. Проверяется, что очередь выбрана
+# целиком, старые /start и inline-запросы выброшены, из нажатий каждого чата осталось последнее,
+# отложенное из чатов со свежими обновлениями не выполнено, а остальное подано не быстрее BACKLOG_RATE
+# и обработано без заметного отставания от него.
+#   python check_backlog.py
+
+SIZE = 10_000
+CHATS = 1000
+USERS = 10
+# Значения по умолчанию из bot.py
+RATE = 20
+MAX_AGE = 300
+# Допустимое отклонение подачи от RATE (подача начинается чуть раньше замера) и запас на обработку
+# последних обновлений
+AHEAD = 0.95
+LAG = 1.2
+SLACK = 5.0
+
+
+def _expected() -> Dict[str, int]:
+    now = time.time()
+    expired = merged = starts = 0
+    pressed: Set[int] = set()
+    for update in build_backlog(SIZE, CHATS):
+        if "inline_query" in update:
+            expired += 1
+        elif "callback_query" in update:
+            chat_id = update["callback_query"]["from"]["id"]
+            merged += chat_id in pressed
+            pressed.add(chat_id)
+        elif now - update["message"]["date"] > MAX_AGE:
+            expired += 1
+        else:
+            starts += 1
+    return {"expired": expired, "merged": merged, "kept": starts + len(pressed)}
+
+
+def main() -> None:
+    expected = _expected()
+    result = run_subprocess(
+        ["--users", str(USERS), "--backlog", str(SIZE), "--backlog-chats", str(CHATS)]
+        + ["--backlog-rate", str(RATE)],
+        env={"BACKLOG_MAX_AGE": str(MAX_AGE)},
+    )
+    backlog: Dict[str, Any] = result["backlog"]
+    # Вытесненные обновления тоже занимают свой шаг подачи
+    nominal = expected["kept"] / RATE
+    budget = round(nominal * LAG + SLACK, 1)
+    checks = {
+        "received": backlog["received"] == SIZE,
+        "expired": backlog["expired"] == expected["expired"],
+        "merged": backlog["merged"] == expected["merged"],
+        "kept": backlog["fed"] + backlog["superseded"] == expected["kept"],
+        "superseded": backlog["superseded"] > 0,
+        "handled": backlog["handled"] == backlog["fed"],
+        "pending": backlog["pending"] == 0,
+        "seconds": nominal * AHEAD <= backlog["seconds"] <= budget,
+    }
+    report = {
+        "expected": expected,
+        "backlog": backlog,
+        "nominal_seconds": nominal,
+        "budget_seconds": budget,
+        "failed": [name for name, ok in checks.items() if not ok],
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["failed"]:
+        sys.exit("Очередь после простоя разобрана не так или подана не в том темпе")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+from fake_bot_api import FakeBotAPI
+from loadtest import TOKEN, build_bot, start_bot, stop_bot
+
+# Рассылка на 100 000 подписчиков против поддельного Bot API: бот останавливается посреди рассылки
+# и после перезапуска продолжает с записанной позиции, никому не отправив дважды; заблокировавшие бота
+# и удалённые аккаунты помечаются, и следующая рассылка их не считает и им не пишет; фото загружается
+# один раз, дальше — по file_id, в том числе после перезапуска. Рассылка, чьё фото пропало с диска,
+# останавливается со статусом failed, а не висит в running.
+#   python check_broadcast.py
+
+RECIPIENTS = 100_000
+# Каждый BLOCKED_EVERY-й заблокировал бота, каждый DEACTIVATED_EVERY-й удалил аккаунт
+BLOCKED_EVERY = 97
+DEACTIVATED_EVERY = 89
+# Доля получателей, после которой бот останавливается
+STOP_AT = 0.4
+
+PHOTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "логотип-бота.png")
+
+# Темп рассылки не ограничивается: проверяется доставка, а не скорость
+ENV = {
+    "SEND_RATE_OVERALL": "1000000",
+    "SEND_RATE_PER_CHAT": "1000000",
+    "BROADCAST_RATE": "1000000",
+}
+
+_FIELDS = ("status", "total", "sent", "blocked", "failed")
+
+
+async def _wait(condition: Callable[[], bool], timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Рассылка не дошла до нужного места")
+        await asyncio.sleep(0.1)
+
+
+async def _finished(broadcaster: Any, broadcast_id: int) -> Dict[str, Any]:
+    await _wait(lambda: broadcaster.active == 0)
+    for progress, status in await broadcaster.recent():
+        if progress.id == broadcast_id:
+            return dict(vars(progress), status=status)
+    raise RuntimeError(f"Рассылка #{broadcast_id} не найдена")
+
+
+async def run() -> Dict[str, Any]:
+    api = FakeBotAPI()
+    await api.start()
+    chat_ids = range(1, RECIPIENTS + 1)
+    api.blocked_chats.update(chat_id for chat_id in chat_ids if chat_id % BLOCKED_EVERY == 0)
+    api.deactivated_chats.update(
+        chat_id for chat_id in chat_ids if chat_id % DEACTIVATED_EVERY == 0 and chat_id not in api.blocked_chats
+    )
+    gone = len(api.blocked_chats) + len(api.deactivated_chats)
+
+    application = build_bot(api, ENV).application
+    await start_bot(application)
+    audience = application.bot_data["audience"]
+    for chat_id in chat_ids:
+        audience.subscribe(chat_id)
+    await audience.flush()
+
+    # Первая рассылка — с фото, загружаемым с диска; остановка посреди неё
+    started = time.perf_counter()
+    progress = await application.bot_data["broadcaster"].start(application.job_queue, "<b>Объявление</b>", PHOTO)
+    await _wait(lambda: sum(api.delivered.values()) >= RECIPIENTS * STOP_AT)
+    await stop_bot(application)
+    stopped_at = sum(api.delivered.values())
+
+    # Новый Application в том же процессе: рассылку подхватывает post_init. bot импортируется
+    # только после build_bot, который выставляет пути к базам во временном каталоге
+    import bot
+
+    application = bot.build_application(TOKEN)
+    await start_bot(application)
+    first = await _finished(application.bot_data["broadcaster"], progress.id)
+    first_seconds = time.perf_counter() - started
+    repeated = sum(1 for n in api.delivered.values() if n > 1)
+    missed = RECIPIENTS - gone - len(api.delivered)
+
+    # Вторая — текстовая: помеченных в первой уже нет среди получателей
+    broadcaster = application.bot_data["broadcaster"]
+    progress = await broadcaster.start(application.job_queue, "Второе объявление")
+    second = await _finished(broadcaster, progress.id)
+
+    # Третья — с фото, которое удалили сразу после запуска
+    vanished = os.path.join(tempfile.mkdtemp(prefix="check-broadcast-"), "фото.png")
+    shutil.copy(PHOTO, vanished)
+    progress = await broadcaster.start(application.job_queue, "Третье объявление", vanished)
+    os.remove(vanished)
+    sends = api.calls["sendPhoto"]
+    third = await _finished(broadcaster, progress.id)
+    third_sends = api.calls["sendPhoto"] - sends
+    await stop_bot(application)
+    await api.stop()
+
+    report = {
+        "recipients": RECIPIENTS,
+        "blocked_or_deactivated": gone,
+        "delivered_before_stop": stopped_at,
+        "first": {key: first[key] for key in _FIELDS},
+        "first_seconds": round(first_seconds, 1),
+        "repeated_after_resume": repeated,
+        "missed": missed,
+        "photo_uploads": api.uploads["sendPhoto"],
+        "photo_sends": api.calls["sendPhoto"],
+        "second": {key: second[key] for key in _FIELDS},
+        "missing_photo": dict({key: third[key] for key in _FIELDS}, photo_sends=third_sends),
+    }
+    active = RECIPIENTS - gone
+    report["ok"] = (
+        first["status"] == "done"
+        and first["sent"] == active
+        and first["blocked"] == gone
+        and first["failed"] == 0
+        and repeated == 0
+        and missed == 0
+        and api.uploads["sendPhoto"] == 1
+        and second["status"] == "done"
+        and second["total"] == active
+        and second["sent"] == active
+        and second["blocked"] == 0
+        and third["status"] == "failed"
+        and third_sends == 0
+    )
+    return report
+
+
+def main() -> None:
+    report = asyncio.run(run())
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not report["ok"]:
+        sys.exit("Рассылка дошла не до всех, дошла дважды, загрузила фото повторно или зависла без фото")
+
+
+if __name__ == "__main__":
+    main()
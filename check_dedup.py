@@ -0,0 +1,57 @@
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+from loadtest import run_subprocess
+
+# Серия из пяти одинаковых нажатий против поддельного Bot API: ветка выполняется один раз, и при быстром,
+# и при медленном API (первое нажатие дольше CALLBACK_DEDUP_WINDOW). Без окна — контроль, что проверка
+# вообще видит дубликаты.
+#   python check_dedup.py
+
+REPEAT = 5
+
+# (сессия, окно, задержка API в мс, ожидаемое число вызовов по методам)
+CASES: List[Tuple[List[str], str, float, Dict[str, int]]] = [
+    (["guide", "guide:contemporary"], "1.5", 20, {"editMessageText": 1, "sendPhoto": 1}),
+    (["guide", "guide:contemporary"], "1.5", 800, {"editMessageText": 1, "sendPhoto": 1}),
+    (["artists", "artist:chtak"], "1.5", 800, {"editMessageText": 1, "sendMediaGroup": 1, "sendMessage": 2}),
+    (["guide", "guide:contemporary"], "0", 800, {"editMessageText": REPEAT, "sendPhoto": REPEAT}),
+]
+
+
+def main() -> None:
+    failed = False
+    report: List[Dict[str, Any]] = []
+    for session, window, latency, expected in CASES:
+        result = run_subprocess(
+            ["--users", "1", "--repeat", str(REPEAT), "--latency-ms", str(latency)],
+            env={"CALLBACK_DEDUP_WINDOW": window},
+            trace=[session],
+        )
+        calls = result["api_calls_by_method"]
+        expected = dict(expected, answerCallbackQuery=REPEAT * len(session))
+        # /start — ещё одно sendMessage
+        expected.setdefault("sendMessage", 1)
+        mismatched = {
+            method: (calls.get(method, 0), count)
+            for method, count in expected.items()
+            if calls.get(method, 0) != count
+        }
+        failed = failed or bool(mismatched)
+        report.append(
+            {
+                "session": session,
+                "window": window,
+                "latency_ms": latency,
+                "calls": calls,
+                "mismatched": mismatched,
+            }
+        )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if failed:
+        sys.exit("Повторные нажатия выполнились заново")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import sys
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from fake_bot_api import FakeBotAPI
+from loadtest import build_bot, start_bot, stop_bot
+
+# Сколько вызовов Bot API стоит каждый переход по меню: экран правит сообщение с нажатой кнопкой,
+# новое сообщение — только когда правка невозможна. Пути проходятся настоящим Application против
+# поддельного Bot API, вызовы считаются по FakeBotAPI.calls.
+#   python check_navigation.py
+
+PLACE = "guide:avant:shabolovka_museum"
+
+# Путь: шаги (callback_data, удалить ли перед нажатием сообщение с экраном, ожидаемые вызовы кроме
+# answerCallbackQuery, который на каждое нажатие один)
+PATHS: Dict[str, List[Tuple[str, bool, Dict[str, int]]]] = {
+    "путеводитель и места": [
+        ("guide", False, {"editMessageText": 1}),
+        # Текстовое сообщение нельзя превратить в фото
+        ("guide:avant", False, {"sendPhoto": 1}),
+        (PLACE, False, {"editMessageMedia": 1}),
+        (f"save:{PLACE}", False, {"editMessageReplyMarkup": 1}),
+        (f"visit:{PLACE}", False, {"editMessageReplyMarkup": 1}),
+        ("guide:avant", False, {"editMessageMedia": 1}),
+        ("guide", False, {"editMessageCaption": 1}),
+        ("back", False, {"editMessageCaption": 1}),
+    ],
+    "мои места и маршрут": [
+        ("guide", False, {"editMessageText": 1}),
+        ("guide:contemporary", False, {"sendPhoto": 1}),
+        ("guide:contemporary:winzavod", False, {"editMessageMedia": 1}),
+        ("save:guide:contemporary:winzavod", False, {"editMessageReplyMarkup": 1}),
+        ("saved", False, {"editMessageCaption": 1}),
+        ("route", False, {"editMessageCaption": 1}),
+        ("back", False, {"editMessageCaption": 1}),
+    ],
+    "художники": [
+        ("artists", False, {"editMessageText": 1}),
+        # Альбом и экран выбора следующего автора под ним
+        ("artist:plavinskiy", False, {"sendMediaGroup": 1, "sendMessage": 1}),
+        ("back", False, {"editMessageText": 1}),
+    ],
+    "экран удалён пользователем": [
+        ("guide", True, {"editMessageText": 1, "sendMessage": 1}),
+        ("guide:avant", False, {"sendPhoto": 1}),
+        (PLACE, True, {"editMessageMedia": 1, "sendPhoto": 1}),
+        ("guide", True, {"editMessageCaption": 1, "sendMessage": 1}),
+    ],
+}
+
+_SERVICE = ("getUpdates", "getMe", "deleteWebhook")
+
+
+def _calls(api: FakeBotAPI) -> Counter:
+    return Counter({method: n for method, n in api.calls.items() if method not in _SERVICE})
+
+
+async def run() -> List[Dict[str, Any]]:
+    api = FakeBotAPI()
+    await api.start()
+    generator = build_bot(api, {"SEND_RATE_OVERALL": "100000", "SEND_RATE_PER_CHAT": "100000"})
+    await start_bot(generator.application)
+    report = []
+    for user_id, (name, steps) in enumerate(PATHS.items(), start=100_000):
+        before = _calls(api)
+        await generator.start(user_id)
+        if _calls(api) - before != Counter(sendMessage=1):
+            report.append({"path": name, "step": "/start", "calls": dict(_calls(api) - before)})
+        for data, delete, expected in steps:
+            if delete:
+                screen = api.screens[user_id]
+                api.deleted_messages.add((user_id, screen["message_id"]))
+            before = _calls(api)
+            await generator.tap(user_id, data)
+            calls = dict(_calls(api) - before)
+            wanted = dict(expected, answerCallbackQuery=1)
+            report.append(
+                {"path": name, "step": data, "deleted": delete, "calls": calls, "ok": calls == wanted}
+            )
+    await stop_bot(generator.application)
+    await api.stop()
+    return report
+
+
+def main() -> None:
+    report = asyncio.run(run())
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not all(step.get("ok") for step in report):
+        sys.exit("Переходы стоят не столько вызовов Bot API, сколько ожидалось")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+from typing import Any, Dict
+
+import httpx
+
+from fake_bot_api import FakeBotAPI
+from loadtest import TOKEN, RemoteLoadGenerator, free_port
+
+# BOT_MODE=webhook целиком: bot.py запускается отдельным процессом, как в продакшене, ставит webhook
+# у поддельного Bot API, и тот доставляет обновления POST-запросами на него. Проверяется, что webhook
+# поставлен с секретом и только нужными типами обновлений, что /start и нажатие доходят до бота, а запрос
+# без секрета или с чужим получает 403.
+#   python check_webhook.py
+
+SECRET = "check-webhook-secret"
+USER = 100_000
+# bot.ALLOWED_UPDATES: бот обрабатывает только сообщения, нажатия и inline-запросы
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+TIMEOUT = 30
+
+
+async def _post(url: str, secret: Any) -> int:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret is not None else {}
+    update = {
+        "update_id": 10**9,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": USER + 1, "type": "private"},
+            "from": {"id": USER + 1, "is_bot": False, "first_name": "check"},
+            "text": "/help",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }
+    async with httpx.AsyncClient() as client:
+        response = await client.post(url, json=update, headers=headers)
+    return response.status_code
+
+
+async def run() -> Dict[str, Any]:
+    api = FakeBotAPI()
+    await api.start()
+    workdir = tempfile.mkdtemp(prefix="check-webhook-")
+    port = free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN=TOKEN,
+        BOT_MODE="webhook",
+        BOT_API_URL=api.url,
+        WEBHOOK_URL=f"http://127.0.0.1:{port}",
+        WEBHOOK_LISTEN="127.0.0.1",
+        WEBHOOK_PORT=str(port),
+        WEBHOOK_PATH="hook",
+        WEBHOOK_SECRET=SECRET,
+        FILE_ID_DB_PATH=os.path.join(workdir, "file_ids.sqlite3"),
+        STATE_DB_PATH=os.path.join(workdir, "state.sqlite3"),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py"), env=env
+    )
+    try:
+        for _ in range(TIMEOUT * 10):
+            if api.webhook_url is not None:
+                break
+            if process.returncode is not None:
+                raise RuntimeError(f"bot.py завершился с кодом {process.returncode}")
+            await asyncio.sleep(0.1)
+        else:
+            raise TimeoutError("Бот не поставил webhook")
+        url = api.webhook_url
+        generator = RemoteLoadGenerator(api, None)
+        await asyncio.wait_for(generator.start(USER), TIMEOUT)
+        await asyncio.wait_for(generator.tap(USER, "guide"), TIMEOUT)
+        report = {
+            "webhook_url": url,
+            "secret_set": api.webhook_secret == SECRET,
+            "allowed_updates": api.webhook_allowed_updates,
+            "delivered": generator.handled,
+            "right_secret": await _post(url, SECRET),
+            "wrong_secret": await _post(url, "not-" + SECRET),
+            "no_secret": await _post(url, None),
+        }
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGTERM)
+            await process.wait()
+        await api.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    report["ok"] = (
+        report["webhook_url"] == f"http://127.0.0.1:{port}/hook"
+        and report["secret_set"]
+        and report["allowed_updates"] == ALLOWED_UPDATES
+        and report["delivered"] == 2
+        and report["right_secret"] == 200
+        and report["wrong_secret"] == 403
+        and report["no_secret"] == 403
+    )
+    return report
+
+
+def main() -> None:
+    report = asyncio.run(run())
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not report["ok"]:
+        sys.exit("Webhook не доставил обновления, поставлен не так или принял запрос без секрета")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+
+class CallbackDeduplicator:
+    # Повторные нажатия той же кнопки на том же сообщении в пределах окна не выполняются заново:
+    # они ждут результата первого нажатия. На каждое сообщение хранится только последнее нажатие,
+    # так что «guide → back → guide» дубликатом не считается.
+    # Нажатия одного чата обрабатываются по очереди, поэтому повтор доходит сюда только после того,
+    # как первое нажатие завершилось, — при медленном Bot API позже, чем через окно от начала первого.
+    # Поэтому окно отсчитывается от завершения первого нажатия и продлевается каждым повтором.
+    def __init__(self, window: float = 1.5, max_entries: int = 10_000) -> None:
+        self.window = window
+        self.max_entries = max_entries
+        self._presses: "OrderedDict[Hashable, Tuple[str, float, asyncio.Future]]" = OrderedDict()
+        self.duplicates = 0
+
+    def _evict(self, now: float) -> None:
+        # Записи упорядочены по времени последнего события; незавершённые не вытесняются, пока хватает места
+        while self._presses:
+            _, seen, future = next(iter(self._presses.values()))
+            full = len(self._presses) > self.max_entries
+            if not full and (now - seen < self.window or not future.done()):
+                break
+            self._presses.popitem(last=False)
+
+    def claim(self, message_key: Hashable, data: str) -> Tuple[bool, asyncio.Future]:
+        # (False, future) — нажатие надо обработать и затем вызвать release;
+        # (True, future) — это дубликат, future завершится вместе с первым нажатием
+        now = time.monotonic()
+        self._evict(now)
+        previous = self._presses.get(message_key)
+        if previous is not None:
+            prev_data, seen, future = previous
+            if prev_data == data and (not future.done() or now - seen < self.window):
+                self.duplicates += 1
+                if future.done():
+                    self._presses[message_key] = (data, now, future)
+                    self._presses.move_to_end(message_key)
+                return True, future
+        future = asyncio.get_running_loop().create_future()
+        self._presses[message_key] = (data, now, future)
+        self._presses.move_to_end(message_key)
+        return False, future
+
+    def release(self, message_key: Hashable, future: asyncio.Future, failed: bool = False) -> None:
+        if not future.done():
+            future.set_result(None)
+        entry = self._presses.get(message_key)
+        if entry is None or entry[2] is not future:
+            return
+        if failed:
+            # После ошибки повторное нажатие должно выполниться заново
+            del self._presses[message_key]
+        else:
+            self._presses[message_key] = (entry[0], time.monotonic(), future)
+            self._presses.move_to_end(message_key)
+
+    def __len__(self) -> int:
+        return len(self._presses)
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from assets import Asset, AssetManifest
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow необязателен: без него отправляются оригиналы
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = os.getenv(
+    "DERIVATIVES_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "derivatives"),
+)
+
+# Telegram всё равно пережимает фото до 1280 px по большей стороне
+TELEGRAM_PHOTO_MAX_SIDE = 1280
+
+
+@dataclass(frozen=True)
+class DerivativeSettings:
+    max_side: int = TELEGRAM_PHOTO_MAX_SIDE
+    quality: int = int(os.getenv("DERIVATIVE_QUALITY", "85"))
+
+    @property
+    def key(self) -> str:
+        raw = f"jpeg-progressive:{self.max_side}:{self.quality}:v1"
+        return hashlib.sha256(raw.encode()).hexdigest()[:12]
+
+
+@dataclass
+class BuildReport:
+    sources: int = 0
+    built: int = 0
+    reused: int = 0
+    failed: int = 0
+    original_bytes: int = 0
+    served_bytes: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.served_bytes
+
+
+def _render(src: str, dst: str, max_side: int, quality: int) -> int:
+    with Image.open(src) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode != "RGB":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+            image = background
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        image.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(tmp, dst)
+    return os.path.getsize(dst)
+
+
+class Derivatives:
+    def __init__(
+        self,
+        manifest: AssetManifest,
+        cache_dir: str = DERIVATIVES_DIR,
+        settings: DerivativeSettings = DerivativeSettings(),
+    ) -> None:
+        self._manifest = manifest
+        self._cache_dir = cache_dir
+        self._settings = settings
+        # (путь, sha256 исходника) -> копия: после пересканирования и до конца пересборки у файла уже новый
+        # хэш, а готовой копии под него ещё нет — тогда отправляется оригинал, а не копия старой версии
+        self._served: Dict[Tuple[str, str], str] = {}
+
+    def _target(self, asset: Asset) -> str:
+        return os.path.join(self._cache_dir, f"{asset.sha256[:32]}-{self._settings.key}.jpg")
+
+    def build(self, workers: Optional[int] = None) -> BuildReport:
+        report = BuildReport()
+        assets = self._manifest.assets()
+        report.sources = len(assets)
+        report.original_bytes = sum(asset.size for asset in assets)
+        if Image is None:
+            logger.warning("Pillow не установлен — отправляются оригиналы изображений")
+            self._served = {}
+            report.served_bytes = report.original_bytes
+            return report
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+        pending: List[Tuple[Asset, str]] = []
+        sizes: Dict[str, int] = {}
+        for asset in assets:
+            target = self._target(asset)
+            if os.path.exists(target):
+                sizes[asset.path] = os.path.getsize(target)
+                report.reused += 1
+            else:
+                pending.append((asset, target))
+
+        if pending:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    (asset, pool.submit(_render, asset.path, target, self._settings.max_side, self._settings.quality))
+                    for asset, target in pending
+                ]
+                for asset, future in futures:
+                    try:
+                        sizes[asset.path] = future.result()
+                        report.built += 1
+                    except Exception as exc:
+                        logger.warning("Не удалось оптимизировать %s: %s", asset.path, exc)
+                        report.failed += 1
+
+        served: Dict[Tuple[str, str], str] = {}
+        for asset in assets:
+            size = sizes.get(asset.path)
+            # Маленькие исходники после пережатия бывают крупнее — тогда шлём оригинал
+            if size is not None and size < asset.size:
+                served[(asset.path, asset.sha256)] = self._target(asset)
+                report.served_bytes += size
+            else:
+                report.served_bytes += asset.size
+        self._served = served
+        return report
+
+    def resolve(self, path: str) -> str:
+        asset = self._manifest.get(path)
+        if asset is None:
+            return path
+        return self._served.get((asset.path, asset.sha256), path)
@@ -0,0 +1,366 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+
+from markup import MarkupError, visible_length
+
+# Локальная замена Telegram Bot API для нагрузочных прогонов без сети:
+# понимает ровно те методы, которые вызывает бот, и считает вызовы и загруженные байты.
+
+_PATH_RE = re.compile(r"^/bot[^/]+/(\w+)$")
+_DISPOSITION_RE = re.compile(rb'name="([^"]*)"(?:; filename="([^"]*)")?')
+
+# Методы, которые в Telegram упираются в лимиты на сообщения
+_SEND_METHODS = frozenset({"sendMessage", "sendPhoto", "sendMediaGroup"})
+
+_EDIT_METHODS = frozenset(
+    {"editMessageText", "editMessageCaption", "editMessageMedia", "editMessageReplyMarkup"}
+)
+
+
+def _markup_error(fields: Dict[str, str]) -> Optional[str]:
+    # Как настоящий Bot API: HTML с ошибкой разметки отклоняется с 400
+    parts = [fields] if "parse_mode" in fields else []
+    if "media" in fields:
+        media = json.loads(fields["media"])
+        parts.extend(media if isinstance(media, list) else [media])
+    for part in parts:
+        if part.get("parse_mode") != "HTML":
+            continue
+        for key in ("text", "caption"):
+            if key in part:
+                try:
+                    visible_length(part[key])
+                except MarkupError as exc:
+                    return f"Bad Request: can't parse entities: {exc}"
+    return None
+
+
+def _parse_multipart(body: bytes, boundary: bytes) -> Tuple[Dict[str, str], Dict[str, bytes]]:
+    fields: Dict[str, str] = {}
+    files: Dict[str, bytes] = {}
+    for part in body.split(b"--" + boundary):
+        part = part.strip(b"\r\n")
+        if not part or part == b"--":
+            continue
+        head, _, content = part.partition(b"\r\n\r\n")
+        match = _DISPOSITION_RE.search(head)
+        if not match:
+            continue
+        name = match.group(1).decode()
+        if match.group(2) is not None:
+            files[name] = content
+        else:
+            fields[name] = content.decode()
+    return fields, files
+
+
+class FakeBotAPI:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        upload_bandwidth: Optional[float] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        flood_rate: Optional[float] = None,
+    ) -> None:
+        self.latency = latency
+        self.upload_bandwidth = upload_bandwidth
+        # Как флуд-контроль Telegram: больше flood_rate отправок за секунду — 429 с retry_after
+        self.flood_rate = flood_rate
+        self._sent_at: Deque[float] = deque()
+        # Чаты, где пользователь заблокировал бота или удалил аккаунт: отправка отвечает 403
+        self.blocked_chats: Set[int] = set()
+        self.deactivated_chats: Set[int] = set()
+        # (chat_id, message_id) сообщений, которые пользователь удалил: правка отвечает 400
+        self.deleted_messages: Set[Tuple[int, int]] = set()
+        self._host = host
+        self._port = port
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._updates: List[Dict[str, Any]] = []
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids: Dict[int, itertools.count] = {}
+        self._webhook: Optional[Tuple[str, Optional[str]]] = None
+        # allowed_updates из последнего setWebhook
+        self.webhook_allowed_updates: Optional[List[str]] = None
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+        self._connections: set = set()
+        # Последнее «экранное» сообщение бота в каждом чате — к нему привязываются нажатия
+        self.screens: Dict[int, Dict[str, Any]] = {}
+        self.calls: Counter = Counter()
+        # Вызовы с загрузкой файлов, по методам
+        self.uploads: Counter = Counter()
+        self.bytes_uploaded = 0
+        self.bytes_received = 0
+        self.markup_errors = 0
+        self.flood_errors = 0
+        # Сколько сообщений ушло в каждый чат
+        self.delivered: Counter = Counter()
+        # callback_query_id или chat_id → (методы, future): так прогон узнаёт об ответе бота,
+        # когда тот работает в других процессах
+        self._expected: Dict[str, Tuple[Tuple[str, ...], asyncio.Future]] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self._host}:{self._port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self._host, self._port)
+        self._port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Висящие long-poll getUpdates иначе доживут до конца event loop
+            for task in self._connections:
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        if self._webhook_client is not None:
+            await self._webhook_client.aclose()
+
+    @property
+    def webhook_url(self) -> Optional[str]:
+        return self._webhook[0] if self._webhook is not None else None
+
+    @property
+    def webhook_secret(self) -> Optional[str]:
+        return self._webhook[1] if self._webhook is not None else None
+
+    def expect(self, methods: Tuple[str, ...], key: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._expected[key] = (methods, future)
+        return future
+
+    def reserve_update_id(self) -> int:
+        return next(self._update_ids)
+
+    async def push_update(self, payload: Dict[str, Any]) -> int:
+        update = dict(payload)
+        if "update_id" not in update:
+            update["update_id"] = self.reserve_update_id()
+        if self._webhook is not None:
+            url, secret = self._webhook
+            headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+            if self._webhook_client is None:
+                self._webhook_client = httpx.AsyncClient()
+            await self._webhook_client.post(url, json=update, headers=headers)
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+        return update["update_id"]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                path = request_line.split(" ")[1]
+                result = await self._dispatch(path, headers.get("content-type", ""), body)
+                payload = json.dumps(result).encode()
+                status = str(result.get("error_code", 200)).encode()
+                writer.write(
+                    b"HTTP/1.1 " + status + b" OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+                )
+                await writer.drain()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _dispatch(self, path: str, content_type: str, body: bytes) -> Dict[str, Any]:
+        match = _PATH_RE.match(path)
+        if not match:
+            return {"ok": False, "error_code": 404, "description": "Not Found"}
+        method = match.group(1)
+        self.calls[method] += 1
+        self.bytes_received += len(body)
+        if content_type.startswith("multipart/form-data"):
+            boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+            fields, files = _parse_multipart(body, boundary)
+        elif content_type.startswith("application/json"):
+            raw = json.loads(body or b"{}")
+            fields = {k: v if isinstance(v, str) else json.dumps(v) for k, v in raw.items()}
+            files = {}
+        else:
+            fields, files = dict(parse_qsl(body.decode())), {}
+        uploaded = sum(len(content) for content in files.values())
+        self.bytes_uploaded += uploaded
+        if files:
+            self.uploads[method] += 1
+
+        delay = self.latency
+        if uploaded and self.upload_bandwidth:
+            delay += uploaded / self.upload_bandwidth
+        if method == "getUpdates":
+            return {"ok": True, "result": await self._get_updates(fields)}
+        if delay:
+            await asyncio.sleep(delay)
+        error = _markup_error(fields)
+        if error:
+            self.markup_errors += 1
+            return {"ok": False, "error_code": 400, "description": error}
+        if method in _SEND_METHODS:
+            refused = self._refuse_send(int(fields["chat_id"]))
+            if refused:
+                return refused
+        if method in _EDIT_METHODS and "chat_id" in fields:
+            if (int(fields["chat_id"]), int(fields["message_id"])) in self.deleted_messages:
+                return {"ok": False, "error_code": 400, "description": "Bad Request: message to edit not found"}
+        handler = getattr(self, f"_m_{method}", None)
+        result = handler(fields, files) if handler else True
+        if self._expected:
+            key = fields.get("callback_query_id") or fields.get("chat_id")
+            expected = self._expected.get(key)
+            if expected is not None and method in expected[0]:
+                del self._expected[key]
+                if not expected[1].done():
+                    expected[1].set_result(None)
+        return {"ok": True, "result": result}
+
+    def _refuse_send(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        if self.flood_rate:
+            now = time.monotonic()
+            while self._sent_at and self._sent_at[0] <= now - 1:
+                self._sent_at.popleft()
+            if len(self._sent_at) >= self.flood_rate:
+                self.flood_errors += 1
+                return {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }
+            self._sent_at.append(now)
+        if chat_id in self.blocked_chats:
+            return {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        if chat_id in self.deactivated_chats:
+            return {"ok": False, "error_code": 403, "description": "Forbidden: user is deactivated"}
+        self.delivered[chat_id] += 1
+        return None
+
+    async def _get_updates(self, fields: Dict[str, str]) -> List[Dict[str, Any]]:
+        offset = int(fields.get("offset", 0))
+        limit = int(fields.get("limit", 100))
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(fields.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    # --- ответы методов ---
+
+    def _message(self, chat_id: int, **content: Any) -> Dict[str, Any]:
+        counter = self._message_ids.setdefault(chat_id, itertools.count(1_000_000))
+        return {
+            "message_id": next(counter),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "bot", "username": "fake_bot"},
+            **content,
+        }
+
+    @staticmethod
+    def _photo(source: str, files: Dict[str, bytes]) -> List[Dict[str, Any]]:
+        name = source[len("attach://") :] if source.startswith("attach://") else source
+        if name in files:
+            file_id = "fake-" + hashlib.sha1(files[name]).hexdigest()[:24]
+        else:
+            file_id = source
+        return [{"file_id": file_id, "file_unique_id": file_id[-16:], "width": 1280, "height": 853}]
+
+    def _screen(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        self.screens[message["chat"]["id"]] = message
+        return message
+
+    def _edited(self, fields: Dict[str, str], keep_photo: bool, **content: Any) -> Dict[str, Any]:
+        chat_id = int(fields["chat_id"])
+        message = {**self._message(chat_id), "message_id": int(fields["message_id"])}
+        previous = self.screens.get(chat_id, {})
+        if keep_photo and "photo" in previous:
+            message["photo"] = previous["photo"]
+        message.update(content, edit_date=int(time.time()))
+        if "reply_markup" in fields:
+            message["reply_markup"] = json.loads(fields["reply_markup"])
+        return self._screen(message)
+
+    def _m_getMe(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict[str, Any]:
+        return {"id": 1, "is_bot": True, "first_name": "bot", "username": "fake_bot"}
+
+    def _m_setWebhook(self, fields: Dict[str, str], files: Dict[str, bytes]) -> bool:
+        self._webhook = (fields["url"], fields.get("secret_token"))
+        if "allowed_updates" in fields:
+            self.webhook_allowed_updates = json.loads(fields["allowed_updates"])
+        return True
+
+    def _m_deleteWebhook(self, fields: Dict[str, str], files: Dict[str, bytes]) -> bool:
+        self._webhook = None
+        return True
+
+    def _m_sendMessage(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict[str, Any]:
+        message = self._message(int(fields["chat_id"]), text=fields.get("text", ""))
+        if "reply_markup" in fields:
+            message["reply_markup"] = json.loads(fields["reply_markup"])
+        return self._screen(message)
+
+    def _m_sendPhoto(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict[str, Any]:
+        message = self._message(
+            int(fields["chat_id"]),
+            photo=self._photo(fields.get("photo", "photo"), files),
+            caption=fields.get("caption", ""),
+        )
+        if "reply_markup" in fields:
+            message["reply_markup"] = json.loads(fields["reply_markup"])
+        return self._screen(message)
+
+    def _m_sendMediaGroup(self, fields: Dict[str, str], files: Dict[str, bytes]) -> List[Dict[str, Any]]:
+        chat_id = int(fields["chat_id"])
+        return [
+            self._message(chat_id, photo=self._photo(item["media"], files), caption=item.get("caption", ""))
+            for item in json.loads(fields["media"])
+        ]
+
+    def _m_editMessageText(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict[str, Any]:
+        return self._edited(fields, keep_photo=False, text=fields.get("text", ""))
+
+    def _m_editMessageCaption(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict[str, Any]:
+        return self._edited(fields, keep_photo=True, caption=fields.get("caption", ""))
+
+    def _m_editMessageReplyMarkup(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict[str, Any]:
+        previous = self.screens.get(int(fields["chat_id"]), {})
+        content = {key: previous[key] for key in ("text", "caption") if key in previous}
+        return self._edited(fields, keep_photo=True, **content)
+
+    def _m_editMessageMedia(self, fields: Dict[str, str], files: Dict[str, bytes]) -> Dict[str, Any]:
+        media = json.loads(fields["media"])
+        return self._edited(
+            fields,
+            keep_photo=False,
+            photo=self._photo(media["media"], files),
+            caption=media.get("caption", ""),
+        )
@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from telegram import InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+from asset_cache import AssetBytesCache
+from assets import AssetManifest
+from derivatives import Derivatives
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FILE_ID_DB_PATH = os.getenv("FILE_ID_DB_PATH", os.path.join(BASE_DIR, "file_ids.sqlite3"))
+
+# Загрузку файла, которого ещё нет в кэше, берёт на себя один процесс: он записывает в базу заявку,
+# остальные ждут его file_id. Заявка упавшего процесса истекает через _UPLOAD_LEASE секунд
+_UPLOAD_LEASE = 30.0
+_UPLOAD_POLL = 0.05
+
+T = TypeVar("T")
+
+
+def is_stale_file_id(exc: BadRequest) -> bool:
+    text = exc.message.lower()
+    return "file identifier" in text or "file_id" in text or "remote file" in text
+
+
+class FileIdCache:
+    def __init__(
+        self,
+        db_path: str = FILE_ID_DB_PATH,
+        manifest: Optional[AssetManifest] = None,
+        derivatives: Optional[Derivatives] = None,
+        contents: Optional[AssetBytesCache] = None,
+    ) -> None:
+        self._manifest = manifest
+        self._derivatives = derivatives
+        self.contents = contents if contents is not None else AssetBytesCache()
+        # Базу делят процессы-обработчиков: WAL, чтобы чтение не ждало записи другого процесса. Запрос может
+        # ждать блокировку соседа до 10 секунд, поэтому после старта база читается и пишется только в потоке
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            "path TEXT NOT NULL, digest TEXT NOT NULL, file_id TEXT NOT NULL, "
+            "PRIMARY KEY (path, digest))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "path TEXT NOT NULL, digest TEXT NOT NULL, until REAL NOT NULL, "
+            "PRIMARY KEY (path, digest))"
+        )
+        self._conn.commit()
+        self._lock = asyncio.Lock()
+        self._ids: Dict[Tuple[str, str], str] = {
+            (path, digest): file_id
+            for path, digest, file_id in self._conn.execute(
+                "SELECT path, digest, file_id FROM file_ids"
+            )
+        }
+        # path -> (size, mtime_ns, sha256), чтобы не хэшировать файл на каждое нажатие
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        # Загрузки этого процесса: параллельные промахи по тому же файлу ждут одну
+        self._uploading: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Промахи памяти, которые закрыла загрузка из другого процесса
+        self.shared = 0
+
+    def _key(self, path: str) -> Tuple[str, str]:
+        asset = self._manifest.get(path) if self._manifest is not None else None
+        if asset is not None:
+            return os.path.relpath(path, BASE_DIR), asset.sha256
+        st = os.stat(path)
+        known = self._digests.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            digest = known[2]
+        else:
+            with open(path, "rb") as fh:
+                digest = hashlib.sha256(fh.read()).hexdigest()
+            self._digests[path] = (st.st_size, st.st_mtime_ns, digest)
+        return os.path.relpath(path, BASE_DIR), digest
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        async with self._lock:
+            return await asyncio.to_thread(fn, self._conn, *args)
+
+    async def _lookup(self, key: Tuple[str, str]) -> Optional[str]:
+        file_id = self._ids.get(key)
+        if not file_id:
+            # Промах бывает только до первой загрузки: прежде чем грузить, смотрим, не загрузил ли файл
+            # соседний процесс — чтение по первичному ключу
+            file_id = await self._run(_select, key)
+            if file_id is not None:
+                self._ids[key] = file_id
+                self.shared += 1
+        return file_id
+
+    async def get(self, path: str) -> Optional[str]:
+        file_id = await self._lookup(self._key(path))
+        if file_id:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return file_id
+
+    def cached(self, path: str) -> Optional[str]:
+        # Только то, что уже в памяти: без базы и без счётчиков попаданий
+        return self._ids.get(self._key(path))
+
+    async def acquire(self, path: str) -> Optional[str]:
+        # file_id, если файл тем временем загрузил кто-то другой; None — загружать вызывающему,
+        # а затем обязательно вызвать release
+        key = self._key(path)
+        while True:
+            file_id = await self._lookup(key)
+            if file_id:
+                return file_id
+            pending = self._uploading.get(key)
+            if pending is not None:
+                await asyncio.shield(pending)
+                continue
+            if await self._run(_claim, key):
+                self._uploading[key] = asyncio.get_running_loop().create_future()
+                return None
+            await asyncio.sleep(_UPLOAD_POLL)
+
+    async def release(self, path: str) -> None:
+        key = self._key(path)
+        try:
+            await self._run(_release, key)
+        finally:
+            pending = self._uploading.pop(key, None)
+            if pending is not None:
+                pending.set_result(None)
+
+    async def put(self, path: str, file_id: str) -> None:
+        key = self._key(path)
+        if self._ids.get(key) == file_id:
+            return
+        self._ids[key] = file_id
+        await self._run(_insert, key, file_id)
+
+    async def invalidate(self, path: str) -> None:
+        key = self._key(path)
+        file_id = self._ids.pop(key, None)
+        if file_id is None:
+            return
+        self.invalidations += 1
+        await self._run(_delete, key, file_id)
+
+    def upload_path(self, path: str) -> str:
+        # Ключ кэша — исходный файл, а загружается оптимизированная копия, если она есть
+        return self._derivatives.resolve(path) if self._derivatives is not None else path
+
+    async def read(self, path: str) -> Tuple[bytes, str]:
+        # Содержимое для загрузки и имя файла, по которому PTB выставит MIME-тип
+        upload = self.upload_path(path)
+        return await self.contents.read(upload, self._key(path)[1]), os.path.basename(upload)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "shared": self.shared,
+            "entries": len(self._ids),
+        }
+
+    def close(self) -> None:
+        self._conn.close()
+
+    async def reply_photo(self, message: Message, path: str, **kwargs) -> Message:
+        file_id = await self.get(path)
+        if file_id:
+            try:
+                return await message.reply_photo(photo=file_id, **kwargs)
+            except BadRequest as exc:
+                if not is_stale_file_id(exc):
+                    raise
+                logger.warning("file_id для %s больше не действителен: %s", path, exc.message)
+                await self.invalidate(path)
+        file_id = await self.acquire(path)
+        if file_id:
+            return await message.reply_photo(photo=file_id, **kwargs)
+        try:
+            content, filename = await self.read(path)
+            sent = await message.reply_photo(photo=content, filename=filename, **kwargs)
+            await self.put(path, sent.photo[-1].file_id)
+        finally:
+            await self.release(path)
+        return sent
+
+    async def edit_photo(
+        self,
+        message: Message,
+        path: str,
+        caption: Optional[str] = None,
+        parse_mode: Optional[str] = None,
+        **kwargs,
+    ) -> Message:
+        file_id = await self.get(path)
+        if file_id:
+            try:
+                return await message.edit_media(
+                    InputMediaPhoto(media=file_id, caption=caption, parse_mode=parse_mode), **kwargs
+                )
+            except BadRequest as exc:
+                if not is_stale_file_id(exc):
+                    raise
+                logger.warning("file_id для %s больше не действителен: %s", path, exc.message)
+                await self.invalidate(path)
+        file_id = await self.acquire(path)
+        if file_id:
+            return await message.edit_media(
+                InputMediaPhoto(media=file_id, caption=caption, parse_mode=parse_mode), **kwargs
+            )
+        try:
+            content, filename = await self.read(path)
+            edited = await message.edit_media(
+                InputMediaPhoto(media=content, filename=filename, caption=caption, parse_mode=parse_mode),
+                **kwargs,
+            )
+            if isinstance(edited, Message) and edited.photo:
+                await self.put(path, edited.photo[-1].file_id)
+        finally:
+            await self.release(path)
+        return edited
+
+
+def _select(conn: sqlite3.Connection, key: Tuple[str, str]) -> Optional[str]:
+    row = conn.execute("SELECT file_id FROM file_ids WHERE path = ? AND digest = ?", key).fetchone()
+    return row[0] if row is not None else None
+
+
+def _claim(conn: sqlite3.Connection, key: Tuple[str, str]) -> bool:
+    now = time.time()
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO uploads (path, digest, until) VALUES (?, ?, ?) "
+            "ON CONFLICT(path, digest) DO UPDATE SET until = excluded.until WHERE uploads.until < ?",
+            (*key, now + _UPLOAD_LEASE, now),
+        )
+    return cursor.rowcount > 0
+
+
+def _release(conn: sqlite3.Connection, key: Tuple[str, str]) -> None:
+    with conn:
+        conn.execute("DELETE FROM uploads WHERE path = ? AND digest = ?", key)
+
+
+def _insert(conn: sqlite3.Connection, key: Tuple[str, str], file_id: str) -> None:
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO file_ids (path, digest, file_id) VALUES (?, ?, ?)", (*key, file_id))
+
+
+def _delete(conn: sqlite3.Connection, key: Tuple[str, str], file_id: str) -> None:
+    # Другой процесс мог уже перезагрузить файл и записать новый file_id — его не трогаем
+    with conn:
+        conn.execute("DELETE FROM file_ids WHERE path = ? AND digest = ? AND file_id = ?", (*key, file_id))
@@ -0,0 +1,113 @@
+import heapq
+import math
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+# Поиск ближайших мест по сетке: точки раскладываются по квадратным ячейкам в метрах,
+# запрос обходит кольца ячеек вокруг себя и останавливается, как только ближе уже ничего быть не может.
+
+EARTH_RADIUS_M = 6_371_000
+# Пешеходный путь по городу длиннее прямой; скорость шага ~4.8 км/ч
+WALK_DETOUR = 1.3
+WALK_SPEED_M_PER_MIN = 80
+
+LatLon = Tuple[float, float]
+
+
+def haversine_m(a: LatLon, b: LatLon) -> float:
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def walk_minutes(path_m: float) -> int:
+    return max(1, round(path_m / WALK_SPEED_M_PER_MIN))
+
+
+def walking(distance_m: float) -> Tuple[float, int]:
+    # (метры пешком, минуты) по расстоянию по прямой
+    path = distance_m * WALK_DETOUR
+    return path, walk_minutes(path)
+
+
+class GridIndex:
+    def __init__(self, points: Iterable[Tuple[Hashable, LatLon]], cell_m: float = 500) -> None:
+        points = list(points)
+        self.cell_m = cell_m
+        # Равнопромежуточная проекция вокруг средней широты: в пределах города ошибка — доли процента
+        ref_lat = sum(lat for _, (lat, _) in points) / len(points) if points else 55.75
+        self._mx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(ref_lat))
+        self._my = math.radians(1) * EARTH_RADIUS_M
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Hashable, LatLon]]] = {}
+        for key, location in points:
+            x, y = self._project(location)
+            cell = (math.floor(x / cell_m), math.floor(y / cell_m))
+            self._cells.setdefault(cell, []).append((x, y, key, location))
+        self._size = len(points)
+        if self._cells:
+            xs = [cx for cx, _ in self._cells]
+            ys = [cy for _, cy in self._cells]
+            self._bounds = (min(xs), max(xs), min(ys), max(ys))
+        else:
+            self._bounds = (0, -1, 0, -1)
+
+    def _project(self, location: LatLon) -> Tuple[float, float]:
+        return location[1] * self._mx, location[0] * self._my
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _ring(self, cx: int, cy: int, r: int) -> Iterator[Tuple[int, int]]:
+        # Ячейки на границе квадрата радиуса r, обрезанные по области, где вообще есть точки
+        min_x, max_x, min_y, max_y = self._bounds
+        if r == 0:
+            yield cx, cy
+            return
+        x_lo, x_hi = max(cx - r, min_x), min(cx + r, max_x)
+        for y in (cy - r, cy + r):
+            if min_y <= y <= max_y:
+                for x in range(x_lo, x_hi + 1):
+                    yield x, y
+        y_lo, y_hi = max(cy - r + 1, min_y), min(cy + r - 1, max_y)
+        for x in (cx - r, cx + r):
+            if min_x <= x <= max_x:
+                for y in range(y_lo, y_hi + 1):
+                    yield x, y
+
+    def nearest(
+        self, location: LatLon, k: int = 5, max_distance_m: Optional[float] = None
+    ) -> List[Tuple[float, Hashable, LatLon]]:
+        # [(метры по прямой, ключ, координаты)] по возрастанию расстояния
+        if not self._cells or k <= 0:
+            return []
+        qx, qy = self._project(location)
+        cx, cy = math.floor(qx / self.cell_m), math.floor(qy / self.cell_m)
+        min_x, max_x, min_y, max_y = self._bounds
+        last_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+        limit_sq = max_distance_m**2 if max_distance_m is not None else math.inf
+        best: List[Tuple[float, int, Hashable, LatLon]] = []  # max-куча по -расстоянию²
+        seq = 0
+        for r in range(last_ring + 1):
+            for cell in self._ring(cx, cy, r):
+                for x, y, key, point in self._cells.get(cell, ()):
+                    d_sq = (x - qx) ** 2 + (y - qy) ** 2
+                    if d_sq > limit_sq:
+                        continue
+                    seq += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-d_sq, seq, key, point))
+                    elif d_sq < -best[0][0]:
+                        heapq.heapreplace(best, (-d_sq, seq, key, point))
+            # Всё, что за кольцом r, не ближе, чем расстояние до края квадрата из (2r+1)² ячеек
+            edge = min(
+                qx - (cx - r) * self.cell_m,
+                (cx + r + 1) * self.cell_m - qx,
+                qy - (cy - r) * self.cell_m,
+                (cy + r + 1) * self.cell_m - qy,
+            )
+            if edge**2 > limit_sq or (len(best) == k and edge**2 >= -best[0][0]):
+                break
+        return [
+            (haversine_m(location, point), key, point)
+            for _, _, key, point in sorted(best, key=lambda item: -item[0])
+        ]
@@ -0,0 +1,89 @@
+import functools
+import math
+from typing import FrozenSet, Hashable, Iterable, List, Sequence, Tuple
+
+from geo import EARTH_RADIUS_M, WALK_DETOUR, LatLon
+
+# Порядок обхода выбранных мест: незамкнутый маршрут (возвращаться к началу не нужно).
+# Расстояния между всеми местами каталога считаются один раз; порядок — жадный ближайший сосед
+# от каждой стартовой точки и затем 2-opt. Решения запоминаются по набору мест.
+
+
+class RoutePlanner:
+    def __init__(self, places: Iterable[Tuple[Hashable, LatLon]], cache_size: int = 4096) -> None:
+        places = list(places)
+        self._keys = [key for key, _ in places]
+        self._index = {key: i for i, key in enumerate(self._keys)}
+        self.locations = dict(places)
+        # Пешеходные метры между каждой парой мест; матрица симметрична, считается половина
+        rad = [(math.radians(lat), math.radians(lon)) for _, (lat, lon) in places]
+        cos_lat = [math.cos(lat) for lat, _ in rad]
+        n = len(places)
+        self._matrix = [[0.0] * n for _ in range(n)]
+        scale = 2 * EARTH_RADIUS_M * WALK_DETOUR
+        for i in range(n):
+            lat1, lon1 = rad[i]
+            row = self._matrix[i]
+            for j in range(i + 1, n):
+                lat2, lon2 = rad[j]
+                h = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat[i] * cos_lat[j] * math.sin((lon2 - lon1) / 2) ** 2
+                row[j] = self._matrix[j][i] = scale * math.asin(math.sqrt(h))
+        self._solve = functools.lru_cache(maxsize=cache_size)(self._solve_uncached)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def _length(self, order: Sequence[int]) -> float:
+        d = self._matrix
+        return sum(d[a][b] for a, b in zip(order, order[1:]))
+
+    def _nearest_neighbour(self, start: int, nodes: FrozenSet[int]) -> List[int]:
+        d = self._matrix
+        order = [start]
+        left = set(nodes)
+        left.discard(start)
+        while left:
+            row = d[order[-1]]
+            nxt = min(left, key=row.__getitem__)
+            order.append(nxt)
+            left.remove(nxt)
+        return order
+
+    def _two_opt(self, order: List[int]) -> List[int]:
+        # Разворот отрезка order[i..j]; у незамкнутого пути концы ни с чем не соединены
+        d = self._matrix
+        n = len(order)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(n - 1):
+                a = order[i - 1] if i else None
+                b = order[i]
+                for j in range(i + 1, n):
+                    c = order[j]
+                    e = order[j + 1] if j + 1 < n else None
+                    before = (d[a][b] if a is not None else 0.0) + (d[c][e] if e is not None else 0.0)
+                    after = (d[a][c] if a is not None else 0.0) + (d[b][e] if e is not None else 0.0)
+                    if after < before - 1e-9:
+                        order[i : j + 1] = reversed(order[i : j + 1])
+                        b = order[i]
+                        improved = True
+        return order
+
+    def _solve_uncached(self, nodes: FrozenSet[int]) -> Tuple[Tuple[int, ...], float]:
+        if len(nodes) <= 1:
+            return tuple(nodes), 0.0
+        best = min(
+            (self._nearest_neighbour(start, nodes) for start in nodes), key=self._length
+        )
+        best = self._two_opt(best)
+        return tuple(best), self._length(best)
+
+    def plan(self, keys: Iterable[Hashable]) -> Tuple[List[Hashable], float]:
+        # (места в порядке обхода, длина пешком в метрах); неизвестные ключи пропускаются
+        nodes = frozenset(self._index[key] for key in keys if key in self._index)
+        order, length = self._solve(nodes)
+        return [self._keys[i] for i in order], length
+
+    def leg(self, a: Hashable, b: Hashable) -> float:
+        return self._matrix[self._index[a]][self._index[b]]
@@ -0,0 +1,540 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+# Нагрузочный прогон настоящего Application против локального FakeBotAPI, без сети:
+#   python loadtest.py --users 2000 --latency-ms 30 --upload-kbps 8000
+# Трасса — JSON Lines, по одной сессии (списку callback_data) на строку.
+
+DEFAULT_TRACE = [
+    "guide",
+    "guide:avant",
+    "guide:avant:shabolovka_museum",
+    "guide:avant:jewish_museum",
+    "save:guide:avant:jewish_museum",
+    "guide",
+    "guide:contemporary",
+    "guide:contemporary:winzavod",
+    "save:guide:contemporary:winzavod",
+    "visit:guide:contemporary:winzavod",
+    "saved",
+    "back",
+    "artists",
+    "artist:plavinskiy",
+    "back",
+]
+
+TOKEN = "123456:LOADTEST"
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoadGenerator:
+    def __init__(self, api: Any, application: Any, think_time: float = 0.0, repeat: int = 1) -> None:
+        self.api = api
+        self.application = application
+        self.think_time = think_time
+        # Сколько раз подряд пользователь жмёт каждую кнопку (двойные и тройные нажатия)
+        self.repeat = repeat
+        self._started: Dict[int, float] = {}
+        self._done: Dict[int, asyncio.Future] = {}
+        self.handler_latency: List[float] = []
+        self.end_to_end: List[float] = []
+        self.taps = 0
+        self.pushed = 0
+        self.handled = 0
+        # Обновления, которых генератор не отправлял: очередь простоя (--backlog)
+        self.backlog_handled = 0
+        self._ids = itertools.count(1)
+
+    async def stamp_start(self, update: Any, context: Any) -> None:
+        self._started[update.update_id] = time.perf_counter()
+
+    async def stamp_done(self, update: Any, context: Any) -> None:
+        self.handled += 1
+        started = self._started.pop(update.update_id, None)
+        if started is not None:
+            self.handler_latency.append(time.perf_counter() - started)
+        future = self._done.pop(update.update_id, None)
+        if future is None:
+            self.backlog_handled += 1
+        elif not future.done():
+            future.set_result(None)
+
+    def _completion(self, update_id: int, payload: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._done[update_id] = future
+        return future
+
+    async def _send(self, payload: Dict[str, Any]) -> None:
+        pushed = time.perf_counter()
+        # Регистрируемся до отправки: в режиме webhook бот обработает update раньше, чем вернётся push
+        update_id = self.api.reserve_update_id()
+        future = self._completion(update_id, payload)
+        self.pushed += 1
+        await self.api.push_update({"update_id": update_id, **payload})
+        await future
+        self.end_to_end.append(time.perf_counter() - pushed)
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    async def start(self, user_id: int) -> None:
+        await self._send(
+            {
+                "message": {
+                    "message_id": next(self._ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": self._user(user_id),
+                    "text": "/start",
+                    "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+                }
+            }
+        )
+        self.taps += 1
+
+    async def tap(self, user_id: int, data: str) -> None:
+        # Нажатие кнопки на последнем экране бота в чате пользователя (repeat раз подряд)
+        message = self.api.screens[user_id]
+        await asyncio.gather(
+            *(
+                self._send(
+                    {
+                        "callback_query": {
+                            "id": str(next(self._ids)),
+                            "from": self._user(user_id),
+                            "chat_instance": str(user_id),
+                            "data": data,
+                            "message": message,
+                        }
+                    }
+                )
+                for _ in range(self.repeat)
+            )
+        )
+        self.taps += self.repeat
+
+    async def run_user(self, user_id: int, session: List[str]) -> None:
+        await self.start(user_id)
+        for data in session:
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+            await self.tap(user_id, data)
+
+
+class RemoteLoadGenerator(LoadGenerator):
+    # Бот работает в других процессах (--workers): обновление считается обработанным, когда Bot API
+    # получил на него ответ — answerCallbackQuery на нажатие, сообщение в чат на /start
+    def _completion(self, update_id: int, payload: Dict[str, Any]) -> asyncio.Future:
+        query = payload.get("callback_query")
+        if query is not None:
+            future = self.api.expect(("answerCallbackQuery",), query["id"])
+        else:
+            future = self.api.expect(("sendMessage", "sendPhoto"), str(payload["message"]["chat"]["id"]))
+        future.add_done_callback(self._count_handled)
+        return future
+
+    def _count_handled(self, future: asyncio.Future) -> None:
+        self.handled += 1
+
+
+async def churn_catalog(path: str, every: float) -> Dict[str, int]:
+    # Переписывает каталог во время прогона: правка текста, затем каждый третий раз — файл с ошибкой схемы
+    with open(path, encoding="utf-8") as fh:
+        original = json.load(fh)
+    writes = {"valid": 0, "invalid": 0}
+    try:
+        for step in itertools.count(1):
+            await asyncio.sleep(every)
+            data = json.loads(json.dumps(original))
+            if step % 3 == 0:
+                data["guide"][0]["places"][0]["location"] = "где-то в центре"
+                writes["invalid"] += 1
+            else:
+                data["texts"]["guide"] += f"\n\nВерсия {step}"
+                writes["valid"] += 1
+            # Как и при деплое контента: запись во временный файл и атомарная замена
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, ensure_ascii=False)
+            os.replace(tmp, path)
+    except asyncio.CancelledError:
+        return writes
+
+
+def build_backlog(size: int, chats: int) -> List[Dict[str, Any]]:
+    # Очередь простоя: старые /start, inline-запросы, недавние /start и серии нажатий в каждом чате.
+    # Чаты совпадают с первыми виртуальными пользователями — их свежие нажатия вытесняют очередь.
+    now = int(time.time())
+    updates = []
+    for i in range(size):
+        chat_id = 100_000 + i % chats
+        user = {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}
+        kind = i % 10
+        if kind < 2 or kind == 3:
+            updates.append(
+                {
+                    "message": {
+                        "message_id": i + 1,
+                        "date": now - (7200 if kind < 2 else 30),
+                        "chat": {"id": chat_id, "type": "private"},
+                        "from": user,
+                        "text": "/start",
+                        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+                    }
+                }
+            )
+        elif kind == 2:
+            updates.append({"inline_query": {"id": f"q{i}", "from": user, "query": "гараж", "offset": ""}})
+        else:
+            updates.append(
+                {
+                    "callback_query": {
+                        "id": f"b{i}",
+                        "from": user,
+                        "chat_instance": str(chat_id),
+                        "data": DEFAULT_TRACE[i % len(DEFAULT_TRACE)],
+                        "message": {
+                            "message_id": 1,
+                            "date": now - 3600,
+                            "chat": {"id": chat_id, "type": "private"},
+                            "text": "меню",
+                        },
+                    }
+                }
+            )
+    return updates
+
+
+def _load_sessions(path: Optional[str]) -> List[List[str]]:
+    if not path:
+        return [DEFAULT_TRACE]
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def build_bot(api: Any, env: Dict[str, str], **generator: Any) -> LoadGenerator:
+    # Настоящий Application из bot.py против api в этом процессе. Настройки bot.py читает из окружения
+    # при импорте, поэтому собрать бота можно один раз на процесс
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.update(
+        {
+            "BOT_API_URL": api.url,
+            "FILE_ID_DB_PATH": os.path.join(workdir, "file_ids.sqlite3"),
+            "STATE_DB_PATH": os.path.join(workdir, "state.sqlite3"),
+            **env,
+        }
+    )
+
+    import bot
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    application = bot.build_application(TOKEN)
+    load = LoadGenerator(api, application, **generator)
+    application.add_handler(TypeHandler(Update, load.stamp_start), group=-3)
+    application.add_handler(TypeHandler(Update, load.stamp_done), group=1)
+    return load
+
+
+async def start_bot(application: Any) -> None:
+    import bot
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.updater.start_polling(
+        poll_interval=0, timeout=1, allowed_updates=bot.ALLOWED_UPDATES
+    )
+    await application.start()
+
+
+async def stop_bot(application: Any) -> None:
+    await application.updater.stop()
+    await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+    await application.shutdown()
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from fake_bot_api import FakeBotAPI
+
+    api = FakeBotAPI(
+        latency=args.latency_ms / 1000,
+        upload_bandwidth=args.upload_kbps * 1000 / 8 if args.upload_kbps else None,
+    )
+    await api.start()
+    env = {
+        "SEND_RATE_OVERALL": str(args.send_rate),
+        "SEND_RATE_PER_CHAT": str(args.send_rate),
+        "MAX_CONCURRENT_UPDATES": str(args.concurrency),
+        "BACKLOG_RATE": str(args.backlog_rate),
+        "STATE_FLUSH_INTERVAL": str(args.state_flush),
+    }
+    if args.reload_every:
+        catalog_path = os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "catalog.json")
+        source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content", "catalog.json")
+        shutil.copy(source, catalog_path)
+        env["CATALOG_PATH"] = catalog_path
+        env["CATALOG_RELOAD_INTERVAL"] = str(args.reload_every / 2)
+
+    generator = build_bot(api, env, think_time=args.think_ms / 1000, repeat=args.repeat)
+    application = generator.application
+
+    for payload in build_backlog(args.backlog, args.backlog_chats):
+        await api.push_update(payload)
+
+    await start_bot(application)
+
+    sessions = _load_sessions(args.trace)
+    calls_before = sum(api.calls.values())
+    churn = (
+        asyncio.create_task(churn_catalog(os.environ["CATALOG_PATH"], args.reload_every))
+        if args.reload_every
+        else None
+    )
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            generator.run_user(100_000 + i, sessions[i % len(sessions)])
+            for i in range(args.users)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    backlog = application.bot_data["backlog"]
+    feed = application.bot_data.get("backlog_feed")
+    if feed is not None:
+        await feed
+    while generator.backlog_handled < backlog.fed:
+        await asyncio.sleep(0.05)
+    backlog_elapsed = time.perf_counter() - started
+    catalog_writes = None
+    if churn is not None:
+        churn.cancel()
+        catalog_writes = await churn
+    catalog = application.bot_data["catalog"]
+
+    await stop_bot(application)
+    await api.stop()
+
+    bot_calls = {
+        method: count
+        for method, count in api.calls.items()
+        if method not in ("getUpdates", "getMe", "deleteWebhook")
+    }
+    return {
+        "users": args.users,
+        "taps": generator.taps,
+        "updates_pushed": generator.pushed,
+        "updates_handled": generator.handled,
+        "seconds": round(elapsed, 3),
+        "throughput_taps_per_s": round(generator.taps / elapsed, 1),
+        "handler_latency_ms": {
+            "p50": round(_percentile(generator.handler_latency, 0.50) * 1000, 2),
+            "p95": round(_percentile(generator.handler_latency, 0.95) * 1000, 2),
+            "p99": round(_percentile(generator.handler_latency, 0.99) * 1000, 2),
+            "mean": round(statistics.fmean(generator.handler_latency) * 1000, 2)
+            if generator.handler_latency
+            else 0.0,
+        },
+        "end_to_end_p99_ms": round(_percentile(generator.end_to_end, 0.99) * 1000, 2),
+        "bytes_uploaded": api.bytes_uploaded,
+        "markup_errors": api.markup_errors,
+        "api_calls": sum(api.calls.values()) - calls_before,
+        "api_calls_per_tap": round(sum(bot_calls.values()) / generator.taps, 3),
+        "api_calls_by_method": dict(sorted(bot_calls.items())),
+        "backlog": {
+            **backlog.stats(),
+            "handled": generator.backlog_handled,
+            "seconds": round(backlog_elapsed, 3),
+        },
+        "catalog": {
+            "writes": catalog_writes,
+            "reloads": catalog.reloads,
+            "rejected": catalog.rejected,
+        },
+        "state": application.persistence.stats(),
+        "asset_cache": application.bot_data["file_ids"].contents.stats(),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _tree_cpu(pid: int) -> float:
+    # Процессорное время процесса и его потомков по /proc (Linux): фронт и обработчики
+    # без затрат на их запуск
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0.0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{current}/task/{current}/children") as fh:
+                pending.extend(int(child) for child in fh.read().split())
+        except OSError:
+            continue
+        total += (int(fields[11]) + int(fields[12])) / ticks
+    return total
+
+
+async def run_workers(args: argparse.Namespace) -> Dict[str, Any]:
+    # Настоящий BOT_MODE=workers: фронт и обработчики — отдельные процессы, Bot API и генератор — здесь
+    from fake_bot_api import FakeBotAPI
+
+    api = FakeBotAPI(
+        latency=args.latency_ms / 1000,
+        upload_bandwidth=args.upload_kbps * 1000 / 8 if args.upload_kbps else None,
+    )
+    await api.start()
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    port = free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN=TOKEN,
+        BOT_MODE="workers",
+        BOT_WORKERS=str(args.workers),
+        BOT_API_URL=api.url,
+        WEBHOOK_URL=f"http://127.0.0.1:{port}",
+        WEBHOOK_LISTEN="127.0.0.1",
+        WEBHOOK_PORT=str(port),
+        SEND_RATE_OVERALL=str(args.send_rate),
+        SEND_RATE_PER_CHAT=str(args.send_rate),
+        MAX_CONCURRENT_UPDATES=str(args.concurrency),
+        FILE_ID_DB_PATH=os.path.join(workdir, "file_ids.sqlite3"),
+        STATE_DB_PATH=os.path.join(workdir, "state.sqlite3"),
+        STATE_FLUSH_INTERVAL=str(args.state_flush),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+    front = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py"), env=env
+    )
+    # Фронт ставит webhook, когда все обработчики готовы
+    while api.webhook_url is None:
+        if front.returncode is not None:
+            raise RuntimeError(f"Фронт завершился с кодом {front.returncode}")
+        await asyncio.sleep(0.1)
+
+    generator = RemoteLoadGenerator(api, None, think_time=args.think_ms / 1000, repeat=args.repeat)
+    sessions = _load_sessions(args.trace)
+    cpu_before = _tree_cpu(front.pid)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            generator.run_user(100_000 + i, sessions[i % len(sessions)])
+            for i in range(args.users)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    cpu = _tree_cpu(front.pid) - cpu_before
+
+    front.send_signal(signal.SIGTERM)
+    await front.wait()
+    await api.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    bot_calls = {
+        method: count
+        for method, count in api.calls.items()
+        if method not in ("getMe", "setWebhook", "deleteWebhook")
+    }
+    return {
+        "workers": args.workers,
+        "users": args.users,
+        "taps": generator.taps,
+        "updates_pushed": generator.pushed,
+        "updates_handled": generator.handled,
+        "seconds": round(elapsed, 3),
+        "throughput_taps_per_s": round(generator.taps / elapsed, 1),
+        "end_to_end_ms": {
+            "p50": round(_percentile(generator.end_to_end, 0.50) * 1000, 2),
+            "p99": round(_percentile(generator.end_to_end, 0.99) * 1000, 2),
+        },
+        # Процессорное время фронта и обработчиков: на N ядрах пропускная способность растёт,
+        # пока оно на нажатие не растёт вместе с N
+        "bot_cpu_seconds": round(cpu, 2),
+        "bot_cpu_ms_per_tap": round(cpu * 1000 / generator.taps, 3),
+        "bytes_uploaded": api.bytes_uploaded,
+        "api_calls_per_tap": round(sum(bot_calls.values()) / generator.taps, 3),
+        "api_calls_by_method": dict(sorted(bot_calls.items())),
+    }
+
+
+def run_subprocess(
+    argv: Sequence[str], env: Optional[Dict[str, str]] = None, trace: Optional[List[List[str]]] = None
+) -> Dict[str, Any]:
+    # Прогон в отдельном процессе: bot.py читает настройки из окружения при импорте, так что
+    # сравнения с разными настройками (check_*.py, bench_*.py) запускают каждый прогон заново
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        argv = list(argv)
+        if trace is not None:
+            path = os.path.join(workdir, "trace.jsonl")
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.writelines(json.dumps(session, ensure_ascii=False) + "\n" for session in trace)
+            argv += ["--trace", path]
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *argv],
+            env=dict(os.environ, **(env or {})),
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout
+    return json.loads(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота против локального Bot API")
+    parser.add_argument("--users", type=int, default=200, help="число виртуальных пользователей")
+    parser.add_argument("--trace", help="JSON Lines с сессиями нажатий (по умолчанию встроенная)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="задержка ответа Bot API")
+    parser.add_argument("--upload-kbps", type=float, default=0, help="пропускная способность загрузки, 0 — без ограничения")
+    parser.add_argument("--think-ms", type=float, default=0, help="пауза пользователя между нажатиями")
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз подряд нажимать каждую кнопку")
+    parser.add_argument(
+        "--reload-every", type=float, default=0, help="переписывать каталог контента каждые N секунд"
+    )
+    parser.add_argument("--backlog", type=int, default=0, help="обновлений в очереди простоя перед запуском")
+    parser.add_argument("--backlog-chats", type=int, default=1000, help="сколько чатов в очереди простоя")
+    parser.add_argument("--backlog-rate", type=float, default=20, help="BACKLOG_RATE")
+    parser.add_argument("--state-flush", type=float, default=1, help="STATE_FLUSH_INTERVAL")
+    parser.add_argument("--concurrency", type=int, default=64, help="MAX_CONCURRENT_UPDATES")
+    parser.add_argument("--send-rate", type=float, default=100_000, help="лимит отправок в секунду (в Telegram 30)")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="BOT_MODE=workers с N обработчиками; 0 — Application в этом процессе"
+    )
+    args = parser.parse_args()
+    if args.workers and (args.backlog or args.reload_every):
+        parser.error("--backlog и --reload-every работают только без --workers")
+
+    report = asyncio.run(run_workers(args) if args.workers else run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
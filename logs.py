@@ -0,0 +1,132 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+# Логи пишутся в stderr из отдельного потока: на event loop запись только кладётся в очередь.
+# Очередь ограничена — если приёмник не успевает, лишние записи отбрасываются и считаются.
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# (update_id, chat_id) обрабатываемого обновления; у каждого обновления своя asyncio-задача
+_update_context: contextvars.ContextVar[Optional[Tuple[int, Optional[int]]]] = contextvars.ContextVar(
+    "update_context", default=None
+)
+
+
+def bind_update(update_id: int, chat_id: Optional[int]) -> None:
+    _update_context.set((update_id, chat_id))
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    # «httpx=0.01,telegram.ext=0.1» → доля сохраняемых записей ниже WARNING для каждого логгера
+    rates: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, sep, rate = item.strip().partition("=")
+        if not sep:
+            continue
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        # Берём каждую N-ю запись: дешевле случайных чисел и даёт ровный поток
+        self._every = {name: round(1 / rate) if rate else 0 for name, rate in rates.items()}
+        self._seen: Dict[str, int] = dict.fromkeys(rates, 0)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._every:
+            return True
+        name = record.name
+        for prefix, every in self._every.items():
+            if name == prefix or name.startswith(prefix + "."):
+                if not every:
+                    return False
+                self._seen[prefix] += 1
+                return (self._seen[prefix] - 1) % every == 0
+        return True
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы подставляются сразу: к моменту записи в другом потоке они могут измениться
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        context = _update_context.get()
+        record.update_id, record.chat_id = context if context else ("-", None)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # При остановке ждём места в очереди, а не падаем на переполненной
+        self.queue.put(self._sentinel)
+
+
+class TextFormatter(logging.Formatter):
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        update_id = getattr(record, "update_id", "-")
+        return line if update_id == "-" else f"{line} [update {update_id}]"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        update_id = getattr(record, "update_id", "-")
+        if update_id != "-":
+            entry["update_id"] = update_id
+            entry["chat_id"] = getattr(record, "chat_id", None)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(
+    level: str = "INFO", fmt: str = "text", queue_size: int = 10_000, sampling: str = ""
+) -> BoundedQueueHandler:
+    sink = logging.StreamHandler(sys.stderr)
+    sink.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size))
+    rates = parse_sampling(sampling)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    listener = _Listener(handler.queue, sink, respect_handler_level=True)
+    listener.start()
+    # stop() дописывает всё, что осталось в очереди
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    return handler
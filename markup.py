@@ -0,0 +1,107 @@
+import html
+import re
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+# Все сообщения уходят с parse_mode=HTML. Тексты каталога пишутся с одной разметкой — *жирный*,
+# остальное (подчёркивания и дефисы в ссылках, кавычки, «>») — обычный текст и экранируется.
+# Готовый HTML проверяется локально тем же набором правил, что у Telegram: допустимые теги,
+# вложенность и длина видимого текста, — чтобы ошибка разметки не доходила до Bot API.
+
+# Теги, которые принимает Telegram (https://core.telegram.org/bots/api#html-style)
+_TAGS = {
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del",
+    "a", "code", "pre", "tg-spoiler", "span", "blockquote", "tg-emoji",
+}
+
+# Именованные сущности, которые понимает Telegram; числовые (&#38;) допустимы все
+_ENTITIES = {"lt", "gt", "amp", "quot"}
+
+_BOLD_RE = re.compile(r"\*([^*]+)\*")
+
+
+class MarkupError(ValueError):
+    pass
+
+
+def escape(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+def bold(text: str) -> str:
+    return f"<b>{escape(text)}</b>"
+
+
+def render(text: str) -> str:
+    # «*жирный*» → <b>…</b>, всё остальное экранируется
+    parts: List[str] = []
+    pos = 0
+    for match in _BOLD_RE.finditer(text):
+        parts.append(escape(text[pos : match.start()]))
+        parts.append(bold(match.group(1)))
+        pos = match.end()
+    rest = text[pos:]
+    if "*" in rest:
+        raise MarkupError(f"Непарная «*»: {rest[rest.index('*'):][:40]!r}")
+    parts.append(escape(rest))
+    return "".join(parts)
+
+
+class _Checker(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.stack: List[str] = []
+        self.length = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag not in _TAGS:
+            raise MarkupError(f"Тег <{tag}> не поддерживается Telegram")
+        if tag == "a" and not dict(attrs).get("href"):
+            raise MarkupError("У <a> нет href")
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        raise MarkupError(f"Самозакрывающийся тег <{tag}/> не поддерживается Telegram")
+
+    def handle_endtag(self, tag: str) -> None:
+        if not self.stack or self.stack[-1] != tag:
+            raise MarkupError(f"Лишний или неверно вложенный </{tag}>")
+        self.stack.pop()
+
+    def handle_data(self, data: str) -> None:
+        # Голые «<» и «&» Telegram не принимает — их надо экранировать
+        if "<" in data or "&" in data:
+            raise MarkupError(f"Неэкранированный символ в {data[:40]!r}")
+        # Лимиты Telegram считаются в UTF-16 единицах видимого текста
+        self.length += len(data.encode("utf-16-le")) // 2
+
+    def handle_entityref(self, name: str) -> None:
+        if name not in _ENTITIES:
+            raise MarkupError(f"Неизвестная сущность &{name};")
+        self.length += 1
+
+    def handle_charref(self, name: str) -> None:
+        self.length += len(html.unescape(f"&#{name};").encode("utf-16-le")) // 2
+
+
+def visible_length(text: str) -> int:
+    checker = _Checker()
+    checker.feed(text)
+    checker.close()
+    if checker.stack:
+        raise MarkupError(f"Не закрыт <{checker.stack[-1]}>")
+    return checker.length
+
+
+def text_length(text: str, parse_mode: Optional[str]) -> int:
+    # Длина, которую считает Telegram: без тегов и с раскрытыми сущностями, в кодовых единицах UTF-16
+    return visible_length(text) if parse_mode else len(text.encode("utf-16-le")) // 2
+
+
+def check(text: str, limit: int, parse_mode: Optional[str]) -> int:
+    length = text_length(text, parse_mode)
+    if not length:
+        raise MarkupError("Пустое сообщение")
+    if length > limit:
+        raise MarkupError(f"Текст длиннее {limit} символов: {length}")
+    return length
@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+# Метрики в текстовом формате Prometheus без внешних зависимостей.
+# Горячий путь — только словари и bisect, без блокировок: всё живёт в одном event loop.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPLOAD_BUCKETS = (16_384, 65_536, 131_072, 262_144, 524_288, 1_048_576, 2_097_152, 5_242_880)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = defaultdict(int)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_number(self.value)}",
+        ]
+
+
+class Collected:
+    # Значение снимается в момент запроса /metrics — для счётчиков, которые ведут другие модули
+    def __init__(self, name: str, help_text: str, kind: str, read: Callable[[], float]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_number(self.read())}",
+        ]
+
+
+class CollectedByLabel:
+    # Как Collected, но read возвращает значение на каждое значение метки
+    def __init__(
+        self, name: str, help_text: str, kind: str, label: str, read: Callable[[], Dict[str, float]]
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label = label
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for value, number in sorted(self.read().items()):
+            lines.append(f"{self.name}{_labels((self.label,), (value,))} {_number(number)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # На серию: счётчики по корзинам (последняя — +Inf), сумма
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def series(self, *labels: str) -> List[float]:
+        # Горячий путь запоминает серию и пишет в неё сам, как observe: без поиска по меткам и без вызова
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series(*labels)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]!r}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class _UpdateTimer:
+    __slots__ = ("_metrics", "_route", "_series", "_started")
+
+    def __init__(self, metrics: "BotMetrics", route: str, series: List[float]) -> None:
+        self._metrics = metrics
+        self._route = route
+        self._series = series
+
+    def __enter__(self) -> None:
+        self._metrics.in_flight.value += 1
+        self._started = time.perf_counter()
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        elapsed = time.perf_counter() - self._started
+        metrics = self._metrics
+        series = self._series
+        series[bisect_left(metrics.update_latency.buckets, elapsed)] += 1
+        series[-1] += elapsed
+        metrics.in_flight.value -= 1
+        if exc_type is not None:
+            metrics.update_errors.inc(self._route, exc_type.__name__)
+
+
+class BotMetrics:
+    def __init__(self) -> None:
+        self.update_latency = Histogram(
+            "bot_update_duration_seconds", "Время обработки обновления по маршруту", ("route",)
+        )
+        self.update_errors = Counter(
+            "bot_update_errors_total", "Исключения в обработчиках по типу", ("route", "error")
+        )
+        self.duplicates = Counter(
+            "bot_callback_duplicates_total", "Повторные нажатия, присоединённые к первому", ("route",)
+        )
+        self.in_flight = Gauge("bot_updates_in_flight", "Обновления в обработке")
+        self.api_latency = Histogram(
+            "bot_api_request_duration_seconds", "Длительность вызовов Bot API", ("method",)
+        )
+        self.api_requests = Counter(
+            "bot_api_requests_total", "Вызовы Bot API по методу и HTTP-статусу", ("method", "status")
+        )
+        self.api_errors = Counter(
+            "bot_api_errors_total", "Сетевые ошибки вызовов Bot API", ("method", "error")
+        )
+        self.upload_bytes = Histogram(
+            "bot_upload_bytes", "Объём загружаемых файлов на запрос", ("method",), UPLOAD_BUCKETS
+        )
+        self.pool_wait = Histogram(
+            "bot_http_pool_wait_seconds", "Ожидание свободного соединения по пулу", ("pool",)
+        )
+        self.pool_timeouts = Counter(
+            "bot_http_pool_timeouts_total", "Запросы, не дождавшиеся соединения", ("pool",)
+        )
+        self.http_retries = Counter(
+            "bot_http_retries_total", "Повторы запросов, не дошедших до Bot API", ("pool", "error")
+        )
+        self._all: List[Any] = [
+            self.update_latency,
+            self.update_errors,
+            self.duplicates,
+            self.in_flight,
+            self.api_latency,
+            self.api_requests,
+            self.api_errors,
+            self.upload_bytes,
+            self.pool_wait,
+            self.pool_timeouts,
+            self.http_retries,
+        ]
+        # Серии гистограммы по маршрутам: маршрутов немного, ищем каждую один раз
+        self._routes: Dict[str, List[float]] = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    def add(self, metric: Any) -> None:
+        # По имени: повторная сборка приложения в том же процессе (проверки, перезапуск) подменяет
+        # источник значений, а не дублирует серию
+        for i, existing in enumerate(self._all):
+            if existing.name == metric.name:
+                self._all[i] = metric
+                return
+        self._all.append(metric)
+
+    def track(self, route: str) -> _UpdateTimer:
+        # route — шаблон маршрута, а не сырой callback_data: число серий ограничено
+        series = self._routes.get(route)
+        if series is None:
+            series = self._routes[route] = self.update_latency.series(route)
+        return _UpdateTimer(self, route, series)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._all:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info("Метрики доступны на http://%s:%d/metrics", host, port)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            path = head.split(b" ", 2)[1] if head.count(b" ") >= 2 else b""
+            if path.split(b"?", 1)[0] == b"/metrics":
+                body = self.render().encode()
+                status = b"200 OK"
+            else:
+                body = b"Not Found\n"
+                status = b"404 Not Found"
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"Connection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class InstrumentedRequest(BaseRequest):
+    # Обёртка над транспортом PTB: время и статус каждого вызова Bot API, объём загрузок
+    def __init__(self, inner: BaseRequest, metrics: BotMetrics) -> None:
+        self._inner = inner
+        self._metrics = metrics
+        # URL -> (метод Bot API, серия гистограммы длительности); ключи счётчика по (URL, статус)
+        self._methods: Dict[str, Tuple[str, List[float]]] = {}
+        self._statuses: Dict[Tuple[str, int], Tuple[str, str]] = {}
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self._inner.read_timeout
+
+    async def initialize(self) -> None:
+        await self._inner.initialize()
+
+    async def shutdown(self) -> None:
+        await self._inner.shutdown()
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: Any = BaseRequest.DEFAULT_NONE,
+        write_timeout: Any = BaseRequest.DEFAULT_NONE,
+        connect_timeout: Any = BaseRequest.DEFAULT_NONE,
+        pool_timeout: Any = BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        metrics = self._metrics
+        known = self._methods.get(url)
+        if known is None:
+            api_method = url.rpartition("/")[2]
+            known = self._methods[url] = (api_method, metrics.api_latency.series(api_method))
+        api_method, latency = known
+        if request_data is not None and request_data.contains_files:
+            uploaded = sum(
+                len(content)
+                for _, content, _ in request_data.multipart_data.values()
+                if isinstance(content, bytes)
+            )
+            metrics.upload_bytes.observe(uploaded, api_method)
+        started = time.perf_counter()
+        try:
+            code, payload = await self._inner.do_request(
+                url,
+                method,
+                request_data=request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+        except Exception as exc:
+            metrics.api_errors.inc(api_method, type(exc).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            latency[bisect_left(metrics.api_latency.buckets, elapsed)] += 1
+            latency[-1] += elapsed
+        key = self._statuses.get((url, code))
+        if key is None:
+            key = self._statuses[(url, code)] = (api_method, str(code))
+        metrics.api_requests.values[key] += 1
+        return code, payload
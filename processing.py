@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def update_chat_id(update: object) -> Optional[int]:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    # Обновления разных чатов идут параллельно (не больше max_concurrent_updates),
+    # а внутри одного чата — строго по очереди, чтобы меню не приходили вперемешку.
+    # Очередь своего чата обновление ждёт до того, как занять слот: иначе один чат с пачкой
+    # нажатий занял бы ожидающими все слоты, и остальные чаты стояли бы за ним.
+    def __init__(self, max_concurrent_updates: int) -> None:
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._pending: Dict[int, int] = {}
+        # Сколько обновлений заняли слот обработки и сколько ждут очереди своего чата
+        self.active = 0
+        self.waiting = 0
+
+    # В PTB process_update помечен @final, но это только подсказка для проверки типов
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat_id = update_chat_id(update)
+        if chat_id is None:
+            await super().process_update(update, coroutine)
+            return
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        self._pending[chat_id] = self._pending.get(chat_id, 0) + 1
+        self.waiting += 1
+        waiting = True
+        try:
+            async with lock:
+                self.waiting -= 1
+                waiting = False
+                # Слот обработки (семафор) берёт уже BaseUpdateProcessor.process_update
+                await super().process_update(update, coroutine)
+        finally:
+            if waiting:
+                self.waiting -= 1
+            self._pending[chat_id] -= 1
+            if not self._pending[chat_id]:
+                del self._pending[chat_id]
+                del self._locks[chat_id]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.active += 1
+        try:
+            await coroutine
+        finally:
+            self.active -= 1
+
+    @property
+    def saturated(self) -> bool:
+        return self.active >= self.max_concurrent_updates or self.waiting >= self.max_concurrent_updates
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,206 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+JSONResult = Union[bool, Dict[str, Any], List[Dict[str, Any]]]
+
+# Чем меньше число, тем раньше запрос получает токен из общего бюджета
+PRIORITY_INTERACTIVE = 0
+PRIORITY_TEXT = 1
+PRIORITY_MEDIA = 2
+# Рассылки: только когда нет ничего срочнее
+PRIORITY_BULK = 3
+
+# answerCallbackQuery и служебные вызовы не расходуют лимиты на сообщения и идут без очереди
+_UNLIMITED_ENDPOINTS = frozenset({"answerCallbackQuery", "answerInlineQuery"})
+_INTERACTIVE_ENDPOINTS = frozenset(
+    {"editMessageText", "editMessageCaption", "editMessageReplyMarkup", "deleteMessage"}
+)
+_MEDIA_ENDPOINTS = frozenset(
+    {"sendPhoto", "sendMediaGroup", "sendDocument", "sendVideo", "editMessageMedia"}
+)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> float:
+        # 0 — токен взят; иначе сколько секунд ждать до следующего токена
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self._tokens >= self.capacity
+
+
+class SendScheduler(BaseRateLimiter[Dict[str, int]]):
+    def __init__(
+        self,
+        overall_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+    ) -> None:
+        self._overall = TokenBucket(overall_rate, overall_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._group_rate = group_rate
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._max_retries = max_retries
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self.waiting_for_chat = 0
+        self.requests = 0
+        self.retries = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+        for _, _, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                self._chats = {key: b for key, b in self._chats.items() if not b.full}
+            group = isinstance(chat_id, str) or chat_id < 0
+            if group:
+                bucket = TokenBucket(self._group_rate, 1)
+            else:
+                bucket = TokenBucket(self._chat_rate, self._chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire_chat(self, chat_id: Union[int, str]) -> None:
+        bucket = self._chat_bucket(chat_id)
+        self.waiting_for_chat += 1
+        try:
+            while True:
+                delay = bucket.take()
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting_for_chat -= 1
+
+    async def _acquire_overall(self, priority: int) -> None:
+        if not self._queue and time.monotonic() >= self._paused_until and not self._overall.take():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self) -> None:
+        while self._queue:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            delay = self._overall.take()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+
+    @staticmethod
+    def _priority(endpoint: str) -> int:
+        if endpoint in _MEDIA_ENDPOINTS:
+            return PRIORITY_MEDIA
+        if endpoint in _INTERACTIVE_ENDPOINTS:
+            return PRIORITY_INTERACTIVE
+        return PRIORITY_TEXT
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, JSONResult]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, int]],
+    ) -> JSONResult:
+        chat_id = data.get("chat_id")
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        limited = chat_id is not None and endpoint not in _UNLIMITED_ENDPOINTS
+        # rate_limit_args={"priority": ..., "max_retries": ...} переопределяет значения по умолчанию
+        options = rate_limit_args or {}
+        max_retries = options.get("max_retries", self._max_retries)
+        priority = options.get("priority", self._priority(endpoint))
+        self.requests += 1
+
+        attempt = 0
+        while True:
+            if limited:
+                started = time.monotonic()
+                await self._acquire_chat(chat_id)
+                await self._acquire_overall(priority)
+                waited = time.monotonic() - started
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt == max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = float(exc.retry_after)
+                logger.warning("%s: RetryAfter %.1f с, повтор %d", endpoint, delay, attempt)
+                # Флуд-контроль Telegram общий для бота — придерживаем всю очередь
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                await asyncio.sleep(delay)
+
+    @property
+    def queue_depth(self) -> int:
+        # Запросы, ждущие токена из общего бюджета
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "waiting_for_chat": self.waiting_for_chat,
+            "requests": self.requests,
+            "retries": self.retries,
+            "wait_total": self.wait_total,
+            "wait_max": self.wait_max,
+        }
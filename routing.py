@@ -0,0 +1,54 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class Route(NamedTuple):
+    handler: Handler
+    args: Tuple[Any, ...]
+    # Шаблон маршрута для метрик и логов, например «guide:<section>:<slug>»
+    label: str
+
+
+class Router:
+    def __init__(self, default: Handler, *args: Any, label: str = "unknown") -> None:
+        self._exact: Dict[str, Route] = {}
+        self._prefix: Dict[str, Route] = {}
+        self._default = Route(default, args, label)
+
+    def add(self, data: str, handler: Handler, *args: Any, label: Optional[str] = None) -> None:
+        if data in self._exact:
+            raise ValueError(f"Дублирующийся callback_data: {data}")
+        # Telegram не принимает callback_data длиннее 64 байт
+        if len(data.encode()) > 64:
+            raise ValueError(f"callback_data длиннее 64 байт: {data}")
+        self._exact[data] = Route(handler, args, label or data)
+
+    def add_prefix(self, prefix: str, handler: Handler, *args: Any, label: Optional[str] = None) -> None:
+        # Запасной обработчик для «prefix:<что угодно>», если точного маршрута нет
+        if not prefix.endswith(":"):
+            raise ValueError(f"Префикс должен оканчиваться на ':': {prefix}")
+        self._prefix[prefix] = Route(handler, args, label or prefix + "*")
+
+    def lookup(self, data: str) -> Optional[Route]:
+        return self._exact.get(data)
+
+    def resolve(self, data: str) -> Route:
+        route = self._exact.get(data)
+        if route is not None:
+            return route
+        prefix, sep, _ = data.rpartition(":")
+        return self._prefix.get(prefix + sep, self._default)
+
+    def validate(self, keyboards: Iterable[InlineKeyboardMarkup]) -> None:
+        missing: List[str] = []
+        for keyboard in keyboards:
+            for row in keyboard.inline_keyboard:
+                for button in row:
+                    data = button.callback_data
+                    if isinstance(data, str) and data not in self._exact:
+                        missing.append(data)
+        if missing:
+            raise RuntimeError(f"Нет обработчиков для callback_data: {', '.join(missing)}")
@@ -0,0 +1,61 @@
+import functools
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from telegram import InlineKeyboardMarkup
+from telegram.constants import MessageLimit, ParseMode
+
+from markup import MarkupError, check, text_length
+
+
+@dataclass(frozen=True)
+class Screen:
+    text: str
+    markup: Optional[InlineKeyboardMarkup] = None
+    parse_mode: Optional[str] = ParseMode.HTML
+    photo: Optional[str] = None
+
+    @functools.cached_property
+    def fits_caption(self) -> bool:
+        # Влезает ли текст в подпись к фото; считается один раз на экран, а не на каждое нажатие
+        return text_length(self.text, self.parse_mode) <= MessageLimit.CAPTION_LENGTH
+
+
+class ScreenRegistry:
+    def __init__(self) -> None:
+        self._screens: Dict[str, Screen] = {}
+        self._frozen = False
+
+    def add(self, key: str, screen: Screen) -> None:
+        if self._frozen:
+            raise RuntimeError("Реестр экранов уже заморожен")
+        if key in self._screens:
+            raise ValueError(f"Дублирующийся экран: {key}")
+        # Фото-экран уходит подписью к фото, у неё свой лимит
+        limit = MessageLimit.CAPTION_LENGTH if screen.photo else MessageLimit.MAX_TEXT_LENGTH
+        try:
+            check(screen.text, limit, screen.parse_mode)
+        except MarkupError as exc:
+            raise MarkupError(f"Экран {key}: {exc}") from exc
+        self._screens[key] = screen
+
+    def freeze(self) -> "ScreenRegistry":
+        self._frozen = True
+        return self
+
+    def __getitem__(self, key: str) -> Screen:
+        return self._screens[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._screens
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._screens)
+
+    def screens(self) -> Iterator[Screen]:
+        return iter(self._screens.values())
+
+    def markups(self) -> Iterator[InlineKeyboardMarkup]:
+        for screen in self._screens.values():
+            if screen.markup is not None:
+                yield screen.markup
@@ -0,0 +1,186 @@
+import bisect
+import functools
+import heapq
+import itertools
+import re
+from typing import AbstractSet, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Полнотекстовый поиск по местам для inline-режима. Индекс строится один раз:
+# термы — нормализованные основы слов (нижний регистр, ё → е, грубое отсечение окончаний),
+# запрос ищется по точному совпадению и префиксу основы, а при опечатке — по похожим
+# термам через триграммы словаря. Все слова запроса должны найтись в месте.
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+_FOLD = str.maketrans({"ё": "е"})
+
+# Окончания, от длинных к коротким; основа не короче _MIN_STEM букв
+_ENDINGS = tuple(
+    sorted(
+        (
+            "иями ями ами ого его ому ему ыми ими ией иях ах ях ам ям ов ев ой ей ий ый ое ее "
+            "ые ие ую юю ая яя ом ем ью ия а я о е ы и у ю ь"
+        ).split(),
+        key=len,
+        reverse=True,
+    )
+)
+_MIN_STEM = 4
+
+# Сколько термов словаря берётся на одно слово запроса (префикс «т» совпал бы со всеми)
+_MAX_EXPANSIONS = 64
+_FUZZY_THRESHOLD = 0.45
+_PREFIX_FACTOR = 0.9
+_FUZZY_FACTOR = 0.8
+
+
+def _stem(token: str) -> str:
+    for ending in _ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= _MIN_STEM:
+            return token[: -len(ending)]
+    return token
+
+
+def terms(text: str) -> List[str]:
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower().translate(_FOLD))]
+
+
+# (вес, include, exclude): документы группы — объединение include за вычетом exclude
+_Tier = Tuple[float, Tuple[FrozenSet[int], ...], Tuple[FrozenSet[int], ...]]
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f" {term} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _intersect(tiers: List[_Tier]) -> AbstractSet[int]:
+    # Начинаем с самой маленькой группы, дальше множество только сужается: каждая операция стоит
+    # не больше размера уже найденного
+    tiers = sorted(tiers, key=lambda tier: sum(map(len, tier[1])))
+    docs: AbstractSet[int] = frozenset()
+    for n, (_, include, exclude) in enumerate(tiers):
+        if n == 0:
+            docs = include[0] if len(include) == 1 else frozenset().union(*include)
+        elif len(include) == 1:
+            docs = docs & include[0]
+        else:
+            docs = frozenset().union(*(docs & part for part in include))
+        for part in exclude:
+            if not docs:
+                break
+            docs = docs - part
+        if not docs:
+            break
+    return docs
+
+
+class SearchIndex:
+    def __init__(self, cache_size: int = 4096) -> None:
+        self._keys: List[Hashable] = []
+        # терм → {номер документа: вес}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._vocab: List[str] = []
+        # терм → [(вес, документы)] по убыванию веса
+        self._tiers: Dict[str, List[Tuple[float, FrozenSet[int]]]] = {}
+        self._grams: Dict[str, List[str]] = {}
+        self._frozen = False
+        # Inline-запросы приходят на каждое нажатие клавиши, одинаковые префиксы повторяются
+        self.search = functools.lru_cache(maxsize=cache_size)(self._search)
+
+    def add(self, key: Hashable, fields: Iterable[Tuple[str, float]]) -> None:
+        if self._frozen:
+            raise RuntimeError("Индекс уже собран")
+        doc = len(self._keys)
+        self._keys.append(key)
+        for text, weight in fields:
+            for term in terms(text):
+                postings = self._postings.setdefault(term, {})
+                postings[doc] = max(postings.get(doc, 0.0), weight)
+
+    def freeze(self) -> "SearchIndex":
+        self._vocab = sorted(self._postings)
+        for term, postings in self._postings.items():
+            groups: Dict[float, Set[int]] = {}
+            for doc, weight in postings.items():
+                groups.setdefault(weight, set()).add(doc)
+            self._tiers[term] = [(weight, frozenset(groups[weight])) for weight in sorted(groups, reverse=True)]
+        for term in self._vocab:
+            for gram in _trigrams(term):
+                self._grams.setdefault(gram, []).append(term)
+        self._frozen = True
+        return self
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        # Термы словаря, подходящие под слово запроса, с множителем уверенности:
+        # точное совпадение, продолжение префикса, затем похожие по триграммам (опечатки, другие окончания)
+        matches: Dict[str, float] = {}
+        pos = bisect.bisect_left(self._vocab, term)
+        while pos < len(self._vocab) and len(matches) < _MAX_EXPANSIONS:
+            candidate = self._vocab[pos]
+            if not candidate.startswith(term):
+                break
+            matches[candidate] = 1.0 if candidate == term else _PREFIX_FACTOR
+            pos += 1
+        if len(term) < 3:
+            return list(matches.items())
+        grams = _trigrams(term)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        for candidate, count in shared.items():
+            similarity = count / max(len(grams) + len(candidate) - count, 1)
+            if similarity >= _FUZZY_THRESHOLD and candidate not in matches:
+                matches[candidate] = similarity * _FUZZY_FACTOR
+        return heapq.nlargest(_MAX_EXPANSIONS, matches.items(), key=lambda item: item[1])
+
+    def _token_tiers(self, matches: List[Tuple[str, float]]) -> List[_Tier]:
+        # Документы, где нашлось слово запроса, разбитые на непересекающиеся группы по лучшему весу.
+        # Группа не собирается в одно множество: её документы — объединение include без документов
+        # из exclude (там группы выше). На частых словах объединения стоили бы проход по всему каталогу.
+        if len(matches) == 1:
+            term, factor = matches[0]
+            return [(weight * factor, (docs,), ()) for weight, docs in self._tiers[term]]
+        by_score: Dict[float, List[FrozenSet[int]]] = {}
+        for term, factor in matches:
+            for weight, docs in self._tiers[term]:
+                by_score.setdefault(weight * factor, []).append(docs)
+        tiers: List[_Tier] = []
+        higher: Tuple[FrozenSet[int], ...] = ()
+        for score in sorted(by_score, reverse=True):
+            include = tuple(by_score[score])
+            tiers.append((score, include, higher))
+            higher += include
+        return tiers
+
+    def _search(self, query: str, limit: int = 20) -> Tuple[Hashable, ...]:
+        expanded = [self._expand(term) for term in dict.fromkeys(terms(query))]
+        if not expanded or not all(expanded):
+            return ()
+        # Всё считается пересечениями множеств, без прохода по документам в Python:
+        # веса дискретны, поэтому группы документов перебираются от лучшей суммы к худшей,
+        # пока не наберётся limit результатов.
+        per_token = [self._token_tiers(matches) for matches in expanded]
+        start = (0,) * len(per_token)
+        heap = [(-sum(tiers[0][0] for tiers in per_token), start)]
+        visited = {start}
+        found: List[int] = []
+        while heap and len(found) < limit:
+            _, combo = heapq.heappop(heap)
+            docs = _intersect([per_token[i][j] for i, j in enumerate(combo)])
+            if docs:
+                found.extend(sorted(itertools.islice(docs, limit - len(found))))
+            for i in range(len(combo)):
+                if combo[i] + 1 < len(per_token[i]):
+                    nxt = combo[:i] + (combo[i] + 1,) + combo[i + 1 :]
+                    if nxt not in visited:
+                        visited.add(nxt)
+                        total = sum(per_token[t][j][0] for t, j in enumerate(nxt))
+                        heapq.heappush(heap, (-total, nxt))
+        return tuple(self._keys[doc] for doc in found)
+
+    def keys(self, limit: Optional[int] = None) -> List[Hashable]:
+        return self._keys[:limit]
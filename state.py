@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+# Состояние пользователей (сохранённые места, отметки «был здесь», последний экран, маршрут)
+# живёт в context.user_data. PTB раз в update_interval отдаёт изменившиеся записи сюда;
+# они складываются в память и пишутся в SQLite одной транзакцией в отдельном потоке,
+# так что обработчики диска не ждут. При остановке flush дописывает всё, что осталось.
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(BASE_DIR, "state.sqlite3"))
+
+
+class UserState(dict):
+    # context.user_data. Перед записью PTB копирует каждую изменившуюся запись через deepcopy прямо
+    # в event loop; значения здесь — строки и списки строк, так что хватает копии на один уровень вглубь
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[Any, Any]:
+        return {key: value.copy() if isinstance(value, (list, dict)) else value for key, value in self.items()}
+
+
+def _dump(data: Dict[Any, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+class SQLiteUserState(BasePersistence):
+    def __init__(
+        self, db_path: str = STATE_DB_PATH, update_interval: float = 1, shard: Optional[Tuple[int, int]] = None
+    ) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db_path = db_path
+        # (номер, всего) — при нескольких процессах-обработчиках каждый читает только своих пользователей:
+        # обновления личного чата приходят в процесс user_id % всего
+        self.shard = shard
+        # Соединение открывается и используется только из рабочих потоков, по одной записи за раз
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        # user_id → JSON последней записанной версии: PTB помечает изменившимся любого, кто что-то
+        # прислал, а переписывать строку стоит, только если данные действительно поменялись
+        self._stored: Dict[int, str] = {}
+        # user_id → данные для записи (PTB уже отдаёт копию), None — удалить
+        self._dirty: Dict[int, Optional[Dict[Any, Any]]] = {}
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.unchanged = 0
+        self.failures = 0
+        # Записи чужих пользователей, которые процесс не сохранил
+        self.foreign = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # В WAL synchronous=NORMAL не портит базу при сбое, а теряет лишь последние транзакции
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_state ("
+                "user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _read_all(self) -> Dict[int, str]:
+        if self.shard is None:
+            return dict(self._connect().execute("SELECT user_id, data FROM user_state"))
+        index, count = self.shard
+        # Остаток в SQLite берёт знак делимого, а маршрутизация — питоновский неотрицательный
+        return dict(
+            self._connect().execute(
+                "SELECT user_id, data FROM user_state WHERE ((user_id % ?) + ?) % ? = ?",
+                (count, count, count, index),
+            )
+        )
+
+    def _write(self, batch: Dict[int, Optional[Dict[Any, Any]]]) -> Tuple[int, int]:
+        # Сериализация и сравнение — тоже здесь, в рабочем потоке, а не в event loop
+        changed: Dict[int, str] = {}
+        dropped = []
+        for user_id, data in batch.items():
+            if data is None:
+                dropped.append(user_id)
+                continue
+            payload = _dump(data)
+            if self._stored.get(user_id) != payload:
+                changed[user_id] = payload
+        unchanged = len(batch) - len(changed) - len(dropped)
+        if not changed and not dropped:
+            return 0, unchanged
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT INTO user_state (user_id, data, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                [(user_id, payload, now) for user_id, payload in changed.items()],
+            )
+            conn.executemany("DELETE FROM user_state WHERE user_id = ?", [(user_id,) for user_id in dropped])
+        self._stored.update(changed)
+        for user_id in dropped:
+            self._stored.pop(user_id, None)
+        return len(changed) + len(dropped), unchanged
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def get_user_data(self) -> Dict[int, UserState]:
+        self._stored = await asyncio.to_thread(self._read_all)
+        logger.info("Состояние пользователей загружено: %d записей", len(self._stored))
+        return {user_id: UserState(json.loads(data)) for user_id, data in self._stored.items()}
+
+    def _owns(self, user_id: int) -> bool:
+        # Нажатия в группе приходят в процесс группы, а не пользователя: там у него пустые или устаревшие
+        # данные, и запись перетёрла бы то, что хранит процесс его личного чата
+        return self.shard is None or user_id % self.shard[1] == self.shard[0]
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        if not self._owns(user_id):
+            self.foreign += 1
+            return
+        if not data and user_id not in self._stored and user_id not in self._dirty:
+            # Пустые записи тех, кто только открыл меню, не храним
+            self.unchanged += 1
+            return
+        self._dirty[user_id] = data
+        self._schedule()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if not self._owns(user_id):
+            return
+        self._dirty[user_id] = None
+        self._schedule()
+
+    def _schedule(self) -> None:
+        # PTB вызывает update_user_data для всех изменившихся пользователей через gather:
+        # одна задача на пачку, запись начинается, когда пачка собрана
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        await asyncio.sleep(0)
+        await self._flush_dirty()
+
+    async def _flush_dirty(self) -> None:
+        async with self._lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            started = time.perf_counter()
+            try:
+                written, unchanged = await asyncio.to_thread(self._write, batch)
+            except sqlite3.Error as exc:
+                # Пачка вернётся в следующую запись, если её не вытеснили более новые данные
+                self.failures += 1
+                for user_id, data in batch.items():
+                    self._dirty.setdefault(user_id, data)
+                logger.error("Не удалось записать состояние %d пользователей: %s", len(batch), exc)
+                return
+            elapsed = time.perf_counter() - started
+            self.flushes += 1
+            self.rows_written += written
+            self.unchanged += unchanged
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._flush_dirty()
+        if self._dirty:
+            logger.error("Состояние %d пользователей не сохранено при остановке", len(self._dirty))
+        await asyncio.to_thread(self._close)
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._stored),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "unchanged": self.unchanged,
+            "failures": self.failures,
+            "foreign": self.foreign,
+            "pending": self.pending,
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 1),
+        }
+
+    # Остальные данные PTB (bot_data, chat_data, разговоры, callback_data) не хранятся
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Any, Any]:
+        return {}
+
+    async def update_conversation(self, name: str, key: Any, new_state: Optional[object]) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
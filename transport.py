@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from telegram.error import NetworkError, TimedOut
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from metrics import BotMetrics
+
+# Транспорт к Bot API из трёх пулов соединений: long-poll getUpdates, лёгкие вызовы (ответы на нажатия,
+# правки, сообщения, фото по file_id) и загрузки файлов. Многомегабайтная загрузка занимает соединение
+# на секунды; в общем пуле короткие вызовы ждали бы за ней, а в своём — нет. Число одновременных
+# запросов в пуле ограничено семафором того же размера, что и пул httpx: время ожидания слота и есть
+# ожидание соединения, его видно в метриках. Небольшие пулы вместо одного на 256 соединений ещё и
+# дешевле для httpcore, который на каждый запрос перебирает все соединения пула.
+
+logger = logging.getLogger(__name__)
+
+# Повторяются только запросы, не дошедшие до сервера: иначе сообщение могло бы уйти дважды
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout)
+_RETRY_DELAY = 0.2
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    size: int
+    connect_timeout: float
+    read_timeout: float
+    write_timeout: float
+    pool_timeout: float
+    retries: int
+
+    def from_env(self, name: str) -> "PoolSettings":
+        # HTTP_<ПУЛ>_<ПАРАМЕТР>, например HTTP_MEDIA_WRITE_TIMEOUT=120
+        overrides: Dict[str, Any] = {}
+        for field in fields(self):
+            raw = os.getenv(f"HTTP_{name.upper()}_{field.name.upper()}")
+            if raw:
+                overrides[field.name] = field.type(raw)
+        return replace(self, **overrides)
+
+
+# getUpdates ходит по одному запросу; read_timeout PTB сам увеличивает на время long-poll
+UPDATES = PoolSettings(
+    size=1, connect_timeout=5.0, read_timeout=5.0, write_timeout=5.0, pool_timeout=1.0, retries=3
+)
+LIGHT = PoolSettings(
+    size=32, connect_timeout=5.0, read_timeout=10.0, write_timeout=10.0, pool_timeout=10.0, retries=2
+)
+MEDIA = PoolSettings(
+    size=8, connect_timeout=5.0, read_timeout=30.0, write_timeout=60.0, pool_timeout=60.0, retries=1
+)
+
+
+class _KeepAliveHTTPXRequest(HTTPXRequest):
+    # HTTPXRequest не даёт задать срок жизни простаивающего соединения (в httpx по умолчанию 5 с):
+    # после паузы в нажатиях каждый запрос заново открывал бы TCP и TLS
+    def __init__(self, keepalive_expiry: float, **kwargs: Any) -> None:
+        self._keepalive_expiry = keepalive_expiry
+        super().__init__(**kwargs)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = self._client_kwargs["limits"]
+        self._client_kwargs["limits"] = httpx.Limits(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=self._keepalive_expiry,
+        )
+        return super()._build_client()
+
+
+class PooledRequest(BaseRequest):
+    def __init__(
+        self,
+        name: str,
+        settings: PoolSettings,
+        metrics: BotMetrics,
+        http_version: str = "1.1",
+        keepalive_expiry: float = 60,
+    ) -> None:
+        self.name = name
+        self.settings = settings
+        self._metrics = metrics
+        self._http = _KeepAliveHTTPXRequest(
+            keepalive_expiry,
+            connection_pool_size=settings.size,
+            connect_timeout=settings.connect_timeout,
+            read_timeout=settings.read_timeout,
+            write_timeout=settings.write_timeout,
+            media_write_timeout=settings.write_timeout,
+            pool_timeout=settings.pool_timeout,
+            http_version=http_version,
+        )
+        self._slots = asyncio.Semaphore(settings.size)
+        self.in_use = 0
+        self.waiting = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self._http.read_timeout
+
+    async def initialize(self) -> None:
+        await self._http.initialize()
+
+    async def shutdown(self) -> None:
+        await self._http.shutdown()
+
+    async def _acquire(self, pool_timeout: Optional[float]) -> None:
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), pool_timeout)
+        except asyncio.TimeoutError:
+            self._metrics.pool_timeouts.inc(self.name)
+            raise TimedOut(
+                f"Пул {self.name}: все {self.settings.size} соединений заняты дольше {pool_timeout} с, "
+                "запрос не отправлен"
+            ) from None
+        finally:
+            self.waiting -= 1
+        self._metrics.pool_wait.observe(time.perf_counter() - started, self.name)
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: Any = BaseRequest.DEFAULT_NONE,
+        write_timeout: Any = BaseRequest.DEFAULT_NONE,
+        connect_timeout: Any = BaseRequest.DEFAULT_NONE,
+        pool_timeout: Any = BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        if pool_timeout is BaseRequest.DEFAULT_NONE:
+            pool_timeout = self.settings.pool_timeout
+        await self._acquire(pool_timeout)
+        self.in_use += 1
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return await self._http.do_request(
+                        url,
+                        method,
+                        request_data=request_data,
+                        read_timeout=read_timeout,
+                        write_timeout=write_timeout,
+                        connect_timeout=connect_timeout,
+                        pool_timeout=pool_timeout,
+                    )
+                except NetworkError as exc:
+                    if attempt >= self.settings.retries or not isinstance(exc.__cause__, _NOT_SENT):
+                        raise
+                    attempt += 1
+                    self._metrics.http_retries.inc(self.name, type(exc.__cause__).__name__)
+                    logger.warning("Пул %s: %s, повтор %d", self.name, exc, attempt)
+                    await asyncio.sleep(_RETRY_DELAY * attempt)
+        finally:
+            self.in_use -= 1
+            self._slots.release()
+
+
+class SplitRequest(BaseRequest):
+    # Запросы с файлами — в пул загрузок, остальное — в пул лёгких вызовов
+    def __init__(self, light: PooledRequest, media: PooledRequest) -> None:
+        self.light = light
+        self.media = media
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.light.read_timeout
+
+    async def initialize(self) -> None:
+        await asyncio.gather(self.light.initialize(), self.media.initialize())
+
+    async def shutdown(self) -> None:
+        await asyncio.gather(self.light.shutdown(), self.media.shutdown())
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: Any = BaseRequest.DEFAULT_NONE,
+        write_timeout: Any = BaseRequest.DEFAULT_NONE,
+        connect_timeout: Any = BaseRequest.DEFAULT_NONE,
+        pool_timeout: Any = BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        pool = self.media if request_data is not None and request_data.contains_files else self.light
+        return await pool.do_request(
+            url,
+            method,
+            request_data=request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+        )
+
+
+class Transport:
+    def __init__(self, updates: PooledRequest, light: PooledRequest, media: PooledRequest) -> None:
+        self.updates = updates
+        self.light = light
+        self.media = media
+        # Для ApplicationBuilder.request(); getUpdates идёт через get_updates_request(updates)
+        self.messages = SplitRequest(light, media)
+
+    @classmethod
+    def from_env(cls, metrics: BotMetrics) -> "Transport":
+        # HTTP2=1 — HTTP/2 для лёгких вызовов и загрузок (нужен python-telegram-bot[http2]);
+        # getUpdates — один запрос за раз, ему мультиплексирование ни к чему
+        http_version = "2" if os.getenv("HTTP2") == "1" else "1.1"
+        keepalive = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+        return cls(
+            updates=PooledRequest("updates", UPDATES.from_env("updates"), metrics, "1.1", keepalive),
+            light=PooledRequest("light", LIGHT.from_env("light"), metrics, http_version, keepalive),
+            media=PooledRequest("media", MEDIA.from_env("media"), metrics, http_version, keepalive),
+        )
+
+    def pools(self) -> Tuple[PooledRequest, ...]:
+        return self.updates, self.light, self.media
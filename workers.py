@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+import tornado.web
+from telegram import Bot, Update
+from telegram.ext import Application
+from tornado.httpserver import HTTPServer
+
+# Несколько процессов-обработчиков за одним webhook. Фронт принимает обновления от Telegram,
+# достаёт chat_id прямо из JSON (как update_chat_id, только без сборки Update) и пересылает тело
+# обновления в процесс chat_id % N через Unix-сокет. Все обновления одного чата попадают в один
+# процесс, а там PerChatUpdateProcessor обрабатывает их по очереди — как в однопроцессном режиме.
+
+logger = logging.getLogger(__name__)
+
+# Кадр в сокете: длина тела (4 байта, big-endian) и JSON обновления как его прислал Telegram
+_FRAME = struct.Struct(">I")
+
+# Сколько ждать, пока обработчик соберёт Application и откроет сокет
+_CONNECT_TIMEOUT = 120
+
+
+def route_chat_id(update: Dict[str, Any]) -> int:
+    # Чат сообщения, а где его нет (inline-запросы, нажатия под inline-сообщениями) — пользователь;
+    # в личном чате это одно и то же число
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat is not None:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user is not None:
+            return user["id"]
+    return 0
+
+
+class WorkerPool:
+    def __init__(self, count: int, command: Sequence[str], env: Optional[Dict[str, str]] = None) -> None:
+        self.count = count
+        self.command = list(command)
+        self.env = dict(os.environ if env is None else env)
+        self._dir = tempfile.mkdtemp(prefix="bot-workers-")
+        self._processes: List[asyncio.subprocess.Process] = []
+        self._writers: List[asyncio.StreamWriter] = []
+        self.forwarded = [0] * count
+
+    def _socket(self, index: int) -> str:
+        return os.path.join(self._dir, f"worker-{index}.sock")
+
+    async def start(self) -> None:
+        for index in range(self.count):
+            env = dict(
+                self.env,
+                BOT_MODE="worker",
+                BOT_WORKERS=str(self.count),
+                BOT_WORKER_INDEX=str(index),
+                BOT_WORKER_SOCKET=self._socket(index),
+            )
+            self._processes.append(await asyncio.create_subprocess_exec(*self.command, env=env))
+        for index in range(self.count):
+            self._writers.append(await self._connect(index))
+        logger.info("Обработчики готовы: %d", self.count)
+
+    async def _connect(self, index: int) -> asyncio.StreamWriter:
+        process = self._processes[index]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _CONNECT_TIMEOUT
+        while True:
+            if process.returncode is not None:
+                raise RuntimeError(f"Обработчик {index} завершился при запуске с кодом {process.returncode}")
+            try:
+                _, writer = await asyncio.open_unix_connection(self._socket(index))
+                return writer
+            except (FileNotFoundError, ConnectionRefusedError):
+                if loop.time() > deadline:
+                    raise RuntimeError(f"Обработчик {index} не открыл сокет за {_CONNECT_TIMEOUT} с")
+                await asyncio.sleep(0.1)
+
+    async def forward(self, body: bytes) -> None:
+        index = route_chat_id(json.loads(body)) % self.count
+        writer = self._writers[index]
+        writer.write(_FRAME.pack(len(body)) + body)
+        # Обработчик не успевает — ответ Telegram задерживается, и тот сам сбавляет темп
+        await writer.drain()
+        self.forwarded[index] += 1
+
+    async def wait_exit(self) -> int:
+        # Номер первого завершившегося обработчика
+        waits = [asyncio.ensure_future(process.wait()) for process in self._processes]
+        try:
+            done, _ = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in waits:
+                task.cancel()
+        return waits.index(next(iter(done)))
+
+    async def stop(self) -> None:
+        for writer in self._writers:
+            writer.close()
+        for process in self._processes:
+            if process.returncode is None:
+                process.send_signal(signal.SIGTERM)
+        # Каждый дописывает состояние пользователей и дожидается своих заданий
+        await asyncio.gather(*(process.wait() for process in self._processes))
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+class _WebhookHandler(tornado.web.RequestHandler):
+    SUPPORTED_METHODS = ("POST",)
+
+    def initialize(self, pool: WorkerPool, secret: str) -> None:
+        self.pool = pool
+        self.secret = secret
+
+    async def post(self) -> None:
+        if self.request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+            raise tornado.web.HTTPError(403)
+        try:
+            await self.pool.forward(self.request.body)
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            logger.warning("Непонятное обновление от Telegram: %s", exc)
+            raise tornado.web.HTTPError(400)
+        except ConnectionError as exc:
+            # Обработчик упал; фронт остановится, а Telegram повторит доставку после перезапуска
+            logger.error("Обработчик недоступен: %s", exc)
+            raise tornado.web.HTTPError(503)
+
+
+def _log_request(handler: tornado.web.RequestHandler) -> None:
+    if handler.get_status() >= 400:
+        logger.warning("webhook: %d %s", handler.get_status(), handler.request.remote_ip)
+
+
+async def serve_front(
+    bot: Bot,
+    pool: WorkerPool,
+    listen: str,
+    port: int,
+    url_path: str,
+    webhook_url: str,
+    secret: str,
+    allowed_updates: Sequence[str],
+    drop_pending_updates: bool,
+) -> bool:
+    # False — один из обработчиков завершился сам: фронт останавливает остальных и выходит с ошибкой,
+    # перезапуск целиком — дело systemd/docker
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await pool.start()
+    except BaseException:
+        await pool.stop()
+        raise
+    app = tornado.web.Application(
+        [(rf"/{url_path}/?", _WebhookHandler, {"pool": pool, "secret": secret})],
+        log_function=_log_request,
+    )
+    server = HTTPServer(app, xheaders=True)
+    server.listen(port, listen)
+    async with bot:
+        # Webhook ставится, когда все обработчики уже слушают: ожидающие обновления сразу есть кому разобрать
+        await bot.set_webhook(
+            webhook_url,
+            secret_token=secret,
+            allowed_updates=list(allowed_updates),
+            drop_pending_updates=drop_pending_updates,
+        )
+    logger.info("Фронт принимает обновления на %s:%d/%s", listen, port, url_path)
+    exited = asyncio.ensure_future(pool.wait_exit())
+    stopping = asyncio.ensure_future(stop.wait())
+    await asyncio.wait([exited, stopping], return_when=asyncio.FIRST_COMPLETED)
+    crashed = exited.done()
+    if crashed:
+        logger.error("Обработчик %d завершился — останавливаем остальных", exited.result())
+    else:
+        exited.cancel()
+    server.stop()
+    await server.close_all_connections()
+    await pool.stop()
+    logger.info("Переслано обновлений по обработчикам: %s", pool.forwarded)
+    return not crashed
+
+
+async def serve_worker(application: Application, socket_path: str) -> None:
+    # Жизненный цикл как у run_polling/run_webhook, только обновления приходят от фронта
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async def receive(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                (size,) = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+                data = json.loads(await reader.readexactly(size))
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Фронт закрыл соединение — он останавливается, останавливаемся и мы
+            stop.set()
+        finally:
+            writer.close()
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    server = await asyncio.start_unix_server(receive, path=socket_path)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)